@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+Requests served here are routed with ASGI_ROOT_URLCONF (config.urls_asgi), so
+the read-only catalog endpoints run as native async views.
 """
 
 import os
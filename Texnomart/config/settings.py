@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -43,9 +44,9 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'django_filters',
     'rest_framework',
-    'rest_framework_simplejwt',
-
-
+    # rest_framework_simplejwt is left out on purpose: it has no models, and
+    # loading it as an app imports django.test at boot. main.authentication
+    # and main.urls import it on first use.
 ]
 
 
@@ -53,6 +54,8 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'main.middleware.MetricsMiddleware',
+    'main.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,11 +63,43 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.middleware.ASGIURLConfMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
+# Requests served through config.asgi use the async catalog views.
+ASGI_ROOT_URLCONF = 'config.urls_asgi'
+# Let async views run independent queries on separate threads/connections.
+ASYNC_CATALOG_CONCURRENT_QUERIES = True
+
+# Latest comments embedded in product payloads; the rest are paged at
+# product/<id>/comments/.
+COMMENT_PREVIEW_SIZE = 3
+
+# Rows read and serialized per chunk by ?stream=json|ndjson list responses (main.streaming).
+STREAMING_LIST_CHUNK_SIZE = 500
 
+# Like/unlike taps (main.likes) are buffered per process, coalesced per
+# (user, product) and written in bulk every LIKE_BUFFER_FLUSH_INTERVAL
+# seconds, or once LIKE_BUFFER_MAX_PENDING are waiting.
+LIKE_BUFFER_ASYNC = True
+LIKE_BUFFER_FLUSH_INTERVAL = 1.0
+LIKE_BUFFER_MAX_PENDING = 10000
 
+# Per-view request metrics (main.metrics), served at /metrics. Only a
+# METRICS_SAMPLE_RATE fraction of requests is measured; 0 turns it off.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 0.1))
+METRICS_SLOW_REQUEST_SECONDS = 1.0
+METRICS_SLOW_SQL_LIMIT = 50
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
+
+# In-process cache of credential -> user for token, API key and JWT auth
+# (main.authentication). Cleared locally by signals; other processes see
+# key rotation or deactivation within the TTL.
+AUTH_CACHE_TTL = 60
+AUTH_CACHE_MAX_SIZE = 10000
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),  # Adjust as needed
@@ -94,8 +129,9 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'main.authentication.CachedJWTAuthentication',
+        'main.authentication.CachedTokenAuthentication',
+        'main.authentication.APIKeyAuthentication',
         'rest_framework.authentication.SessionAuthentication',
 
     ],
@@ -122,6 +158,60 @@ DATABASES = {
     }
 }
 
+# Read replicas (main.replicas). GET requests to the catalog list/detail views
+# read from a random reachable alias in DATABASE_REPLICAS; a replica that fails
+# to connect is skipped for REPLICA_RETRY_SECONDS. After a request writes, its
+# client reads from the primary for REPLICA_PIN_SECONDS (REPLICA_PIN_COOKIE, and
+# the user id for token/API key clients). Responses built from a replica are
+# cached for at most REPLICA_CACHE_TIMEOUT.
+#
+# For local testing, DATABASE_REPLICA_PATHS=/tmp/replica.sqlite3 (comma
+# separated) adds read-only SQLite copies of the primary; refresh them with
+# `manage.py sync_sqlite_replicas`.
+DATABASE_REPLICA_PATHS = [Path(path).resolve() for path in os.environ.get('DATABASE_REPLICA_PATHS', '').split(',') if path]
+DATABASE_REPLICAS = [f'replica{number}' for number in range(1, len(DATABASE_REPLICA_PATHS) + 1)]
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'{path.as_uri()}?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    }
+    for alias, path in zip(DATABASE_REPLICAS, DATABASE_REPLICA_PATHS)
+})
+DATABASE_ROUTERS = ['main.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = 'db_pin'
+REPLICA_RETRY_SECONDS = 30
+REPLICA_CACHE_TIMEOUT = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory per process by default; set REDIS_URL to share the cache between workers.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+# Product search: 'auto' uses SQLite FTS5 when the index table exists and the
+# in-process Python index otherwise; 'fts5' or 'python' force one of them.
+SEARCH_BACKEND = 'auto'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -153,7 +243,6 @@ USE_I18N = True
 
 USE_TZ = True
 
-import os
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
@@ -162,6 +251,34 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 STATIC_URL = 'static/'
 
+# Uploads are stored under content-hashed names (main.storage) and served by
+# main.media.serve_media. Set MEDIA_OFFLOAD to 'x-accel-redirect' (nginx, with
+# an internal location at MEDIA_ACCEL_PREFIX) or 'x-sendfile' to let the web
+# server send the bytes.
+STORAGES = {
+    'default': {'BACKEND': 'main.storage.HashedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_CACHE_MAX_AGE = 60 * 60
+MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD') or None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Resized JPEG/WebP derivatives of uploaded images, rendered by
+# main.thumbnails in a process pool after the upload commits.
+THUMBNAIL_DIR = 'thumbnails'
+THUMBNAIL_CACHE_DIR = 'thumbnails/.by-hash'
+THUMBNAIL_WIDTHS = (160, 320, 640)
+THUMBNAIL_FORMATS = ('webp', 'jpg')
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+
+# Snapshots of deleted products/categories, written as gzipped JSON Lines
+# segments by main.archive in a background thread.
+DELETED_ITEMS_DIR = BASE_DIR / 'deleted_items'
+DELETED_ITEMS_ASYNC = True
+DELETED_ITEMS_FLUSH_INTERVAL = 2.0
+DELETED_ITEMS_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
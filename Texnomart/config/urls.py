@@ -17,7 +17,9 @@ Including another URLconf
 from django.contrib import admin
 from django.conf import settings
 from django.urls import path, include
-from django.conf.urls.static import static
+
+from main.media import serve_media
+from main.metrics import metrics_view
 
 
 
@@ -25,10 +27,10 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('texnomart-uz/', include('main.urls')),
+    path(f'{settings.MEDIA_URL.strip("/")}/<path:path>', serve_media, name='media'),
+    path('metrics', metrics_view, name='metrics'),
 
 
 
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
@@ -0,0 +1,14 @@
+"""
+URL configuration used for requests served through config.asgi.
+
+Identical to config.urls except that main's read-only catalog endpoints
+resolve to the async views (see main.async_urls).
+"""
+from django.urls import path, include
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('texnomart-uz/', include('main.async_urls')),
+    *(pattern for pattern in wsgi_urlpatterns if str(pattern.pattern) != 'texnomart-uz/'),
+]
@@ -1,2 +0,0 @@
-# __init__.py
-default_app_config = 'main.apps.YourAppConfig'  # Make sure this matches your app structure
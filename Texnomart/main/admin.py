@@ -4,8 +4,10 @@ from .models import Category, Product, Image, AttributeKey, AttributeValue, Prod
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'slug')
+    list_display = ('id', 'title', 'slug', 'parent')
     search_fields = ('title', 'slug')
+    # Materialized paths sort each department directly above its subcategories.
+    ordering = ('path',)
     prepopulated_fields = {'slug': ('title',)}
 
 
@@ -5,4 +5,5 @@ class MainConfig(AppConfig):
     name = 'main'
 
     def ready(self):
-        import main.signals
\ No newline at end of file
+        import main.signals
+        import main.metrics
\ No newline at end of file
@@ -0,0 +1,141 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.fields.files import FieldFile
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, FieldFile):
+            return o.name or None
+        if isinstance(o, datetime):
+            # DjangoJSONEncoder drops microseconds; keep them for exact restores.
+            return o.isoformat()
+        return super().default(o)
+
+
+def snapshot(instance, item_type):
+    data = {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+    return {
+        'type': item_type,
+        'id': instance.pk,
+        'deleted_at': datetime.now(timezone.utc).isoformat(),
+        'data': data,
+    }
+
+
+class DeletedItemArchiver:
+    """
+    Collects snapshots of deleted rows and appends them to gzip-compressed
+    JSON Lines segments from a background thread.
+
+    Each process writes its own segment (the pid is part of the name) and
+    starts a new one once it grows past DELETED_ITEMS_SEGMENT_MAX_BYTES.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._segment = None
+
+    @property
+    def directory(self):
+        return Path(settings.DELETED_ITEMS_DIR)
+
+    def archive(self, instance, item_type):
+        self._queue.put(snapshot(instance, item_type))
+        self._schedule()
+
+    def archive_many(self, instances, item_type):
+        for instance in instances:
+            self._queue.put(snapshot(instance, item_type))
+        self._schedule()
+
+    def _schedule(self):
+        if not settings.DELETED_ITEMS_ASYNC:
+            self.flush()
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None:
+                atexit.register(self.flush)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='deleted-item-archiver', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.DELETED_ITEMS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush deleted item archive')
+
+    def flush(self):
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not records:
+            return 0
+
+        lines = ''.join(json.dumps(record, cls=SnapshotEncoder, ensure_ascii=False) + '\n' for record in records)
+        with self._write_lock:
+            try:
+                with gzip.open(self._segment_path(), 'at', encoding='utf-8') as segment:
+                    segment.write(lines)
+            except OSError:
+                for record in records:
+                    self._queue.put(record)
+                raise
+        return len(records)
+
+    def _segment_path(self):
+        max_bytes = settings.DELETED_ITEMS_SEGMENT_MAX_BYTES
+        if (self._segment is None or self._segment.parent != self.directory
+                or (self._segment.exists() and self._segment.stat().st_size >= max_bytes)):
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+            self._segment = self.directory / f'deleted-{stamp}-{os.getpid()}.jsonl.gz'
+        return self._segment
+
+
+def read_archive(directory=None):
+    """Yield archived records oldest segment first, including legacy ``<type>_<id>.json`` files."""
+    directory = Path(directory or settings.DELETED_ITEMS_DIR)
+    if not directory.exists():
+        return
+    for path in sorted(directory.glob('*.json')):
+        item_type, _, item_id = path.stem.rpartition('_')
+        with open(path, encoding='utf-8') as legacy:
+            data = json.load(legacy)
+        yield {'type': item_type, 'id': data.get('id', item_id), 'deleted_at': None, 'data': data}
+    for path in sorted(directory.glob('*.jsonl.gz')):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as segment:
+                for line in segment:
+                    if line.strip():
+                        yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile):
+            # A worker killed mid-write leaves a truncated last member.
+            logger.warning('Skipping truncated archive segment %s', path)
+
+
+archiver = DeletedItemArchiver()
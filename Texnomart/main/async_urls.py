@@ -0,0 +1,25 @@
+from django.urls import path
+
+from . import urls
+from .async_views import route_reads, AsyncProductListView, AsyncProductDetailView, AsyncCategoryListView, \
+    AsyncCategoryTreeView, AsyncCategoryProductListView, AsyncAttributeKeyListView, AsyncAttributeValueListView
+
+ASYNC_VIEWS = {
+    'all-products': AsyncProductListView,
+    'all-categories': AsyncCategoryListView,
+    'category-tree': AsyncCategoryTreeView,
+    'category-products': AsyncCategoryProductListView,
+    'product-detail': AsyncProductDetailView,
+    'all-attribute-keys': AsyncAttributeKeyListView,
+    'all-attribute-values': AsyncAttributeValueListView,
+}
+
+# main.urls with reads on the catalog routes served by their async twins;
+# writes still reach the DRF views. Same paths, names and order. Used by
+# config.urls_asgi.
+urlpatterns = [
+    path(str(pattern.pattern), route_reads(ASYNC_VIEWS[pattern.name].as_view(), pattern.callback),
+         name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
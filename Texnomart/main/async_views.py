@@ -0,0 +1,219 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .cache import acached_response, category_ns, product_ns, CATEGORIES
+from .categories import aget_category_tree
+from .filters import ProductFilter, CategoryFilter
+from .likes import aget_liked_product_ids
+from .models import Category, Product, Comment, Image, AttributeKey, AttributeValue
+from .pagination import KeysetPagination, IdKeysetPagination
+from .replicas import apinned, read_queryset, use_replica
+from .streaming import achunks, serialized_rows, stream_format, streaming_response
+from .serializers import CategorySerializer, ProductSerializer, ProductListSerializer, AttributeKeySerializer, \
+    AttributeValueSerializer
+
+
+class JSONResponse(HttpResponse):
+    def __init__(self, data=None, status=200):
+        super().__init__(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def attach_prefetched(instance, name, objects):
+    """Store ``objects`` as if ``prefetch_related(name)`` had loaded them."""
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    instance.__dict__.setdefault('_prefetched_objects_cache', {})[name] = queryset
+
+
+async def fetch_all(*querysets):
+    """
+    Evaluate independent querysets concurrently.
+
+    With ASYNC_CATALOG_CONCURRENT_QUERIES each one runs on its own worker
+    thread (and therefore its own connection); otherwise they share the
+    thread-sensitive executor and run one after another.
+    """
+    if not settings.ASYNC_CATALOG_CONCURRENT_QUERIES:
+        return [[obj async for obj in queryset] for queryset in querysets]
+
+    def evaluate(queryset):
+        close_old_connections()
+        try:
+            return list(queryset)
+        finally:
+            close_old_connections()
+
+    return await asyncio.gather(*(sync_to_async(evaluate, thread_sensitive=False)(queryset)
+                                  for queryset in querysets))
+
+
+def route_reads(async_view, sync_view):
+    """
+    URL callback that sends GET/HEAD to ``async_view`` and every other
+    method (writes, OPTIONS) to the DRF ``sync_view`` serving the same URL
+    under WSGI.
+    """
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+
+    view.view_class = async_view.view_class
+    # DRF views enforce CSRF for session auth themselves.
+    return csrf_exempt(view)
+
+
+class AsyncCatalogView(View):
+    """
+    Read-only catalog endpoint for ASGI deployments.
+
+    Responses match the DRF views at the same URLs; DRF authentication only
+    runs (in a thread) when the request carries credentials. With
+    DATABASE_REPLICAS they read from a replica unless the client is pinned
+    to the primary after a write (main.replicas).
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.drf_request = Request(request, authenticators=[auth() for auth in
+                                                           api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            if settings.DATABASE_REPLICAS and not await apinned(request, await self.get_user()):
+                use_replica()
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return JSONResponse({'detail': exc.detail}, status=exc.status_code)
+
+    async def get_user(self):
+        request = self.drf_request._request
+        if ('HTTP_AUTHORIZATION' not in request.META and 'HTTP_X_API_KEY' not in request.META
+                and settings.SESSION_COOKIE_NAME not in request.COOKIES):
+            return AnonymousUser()
+        return await sync_to_async(lambda: self.drf_request.user)()
+
+    def serializer_context(self):
+        return {'request': self.drf_request}
+
+    async def listing(self, queryset, pagination_class, serialize):
+        """The list response: streamed for ``?stream=json|ndjson``, otherwise paginated as usual."""
+        file_format = stream_format(self.drf_request.query_params)
+        if file_format is not None:
+            return streaming_response(achunks(read_queryset(queryset), serialize), file_format)
+        return JSONResponse(await self.paginated(queryset, pagination_class, serialize))
+
+    async def paginated(self, queryset, pagination_class, serialize):
+        paginator = pagination_class()
+        page = await paginator.apaginate_queryset(queryset, self.drf_request, view=self)
+        # Serializers may load the attribute name tables, which queries the database.
+        if page is None:
+            return await sync_to_async(serialize)([obj async for obj in queryset])
+        return paginator.get_paginated_data(await sync_to_async(serialize)(page))
+
+
+class AsyncProductListView(AsyncCatalogView):
+    async def get(self, request):
+        filterset = ProductFilter(request.GET, queryset=Product.objects.with_related(), request=self.drf_request)
+        if not filterset.is_valid():
+            return JSONResponse(filterset.errors, status=400)
+        context = self.serializer_context()
+        context['liked_product_ids'] = await aget_liked_product_ids(await self.get_user())
+        # ?is_liked= resolves the user's liked ids, which may query.
+        queryset = await sync_to_async(lambda: filterset.qs)()
+        return await self.listing(
+            queryset, KeysetPagination,
+            lambda products: serialized_rows(ProductSerializer(products, many=True, context=context)),
+        )
+
+
+class AsyncProductDetailView(AsyncCatalogView):
+    async def get(self, request, product_id):
+        async def build():
+            try:
+                product = await Product.objects.aget(id=product_id)
+            except Product.DoesNotExist:
+                return HttpResponse(status=404)
+            # Comments and images do not depend on each other; attributes come from attribute_data.
+            latest_comments = Comment.objects.filter(product_id=product_id).order_by('-created_at', '-pk')
+            comments, images = await fetch_all(
+                latest_comments[:settings.COMMENT_PREVIEW_SIZE],
+                Image.objects.filter(product_id=product_id),
+            )
+            product.comment_preview = comments
+            attach_prefetched(product, 'images', images)
+            data = await sync_to_async(lambda: ProductSerializer(product, context=self.serializer_context()).data)()
+            return data, product.updated_at
+
+        liked = product_id in await aget_liked_product_ids(await self.get_user())
+        return await acached_response(self.drf_request, [product_ns(product_id)], build, variant=int(liked),
+                                      personalize=lambda data: {**data, 'users_like': liked},
+                                      response_class=JSONResponse)
+
+
+class AsyncCategoryListView(AsyncCatalogView):
+    async def get(self, request):
+        async def build():
+            filterset = CategoryFilter(request.GET, queryset=Category.objects.select_related('parent'),
+                                       request=self.drf_request)
+            if not filterset.is_valid():
+                return JSONResponse(filterset.errors, status=400)
+            categories = [category async for category in filterset.qs]
+            context = {**self.serializer_context(), 'category_tree': await aget_category_tree()}
+            return CategorySerializer(categories, many=True, context=context).data, None
+
+        return await acached_response(self.drf_request, [CATEGORIES], build, response_class=JSONResponse)
+
+
+class AsyncCategoryTreeView(AsyncCatalogView):
+    async def get(self, request):
+        async def build():
+            return (await aget_category_tree()).nested(), None
+
+        return await acached_response(self.drf_request, [CATEGORIES], build, response_class=JSONResponse)
+
+
+class AsyncCategoryProductListView(AsyncCatalogView):
+    async def get(self, request, category_slug):
+        tree = await aget_category_tree()
+        category = tree.by_slug.get(category_slug)
+
+        async def build():
+            queryset = tree.filter_products(Product.objects.with_primary_image(), category_slug)
+            data = await self.paginated(
+                queryset, KeysetPagination,
+                lambda products: ProductListSerializer(products, many=True, context=self.serializer_context()).data,
+            )
+            return data, None
+
+        subtree = tree.subtree_ids(category['id']) if category else []
+        return await acached_response(self.drf_request, [CATEGORIES, *map(category_ns, subtree)], build,
+                                      response_class=JSONResponse)
+
+
+class AsyncAttributeKeyListView(AsyncCatalogView):
+    async def get(self, request):
+        return await self.listing(
+            AttributeKey.objects.all(), IdKeysetPagination,
+            lambda keys: serialized_rows(AttributeKeySerializer(keys, many=True)),
+        )
+
+
+class AsyncAttributeValueListView(AsyncCatalogView):
+    async def get(self, request):
+        return await self.listing(
+            AttributeValue.objects.all(), IdKeysetPagination,
+            lambda values: serialized_rows(AttributeValueSerializer(values, many=True)),
+        )
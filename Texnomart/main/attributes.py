@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Product, ProductAttribute, AttributeKey, AttributeValue
+
+# Other processes only learn about renames through this TTL; the process
+# that saves a key/value updates its table immediately via signals.
+NAMES_TTL = 60
+
+
+class NameTable:
+    """
+    Process-local ``id <-> name`` table for an interned name model
+    (AttributeKey/AttributeValue). Loaded in one query on first use.
+    """
+
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        self._lock = threading.Lock()
+        self._names = None
+        self._ids = None
+        self._loaded_at = 0.0
+        # Ids still unknown after a reload: not looked up again until the table expires.
+        self._missing = set()
+
+    def _load(self):
+        names = dict(self.model.objects.values_list('pk', self.field))
+        with self._lock:
+            self._names = names
+            self._ids = {name: pk for pk, name in names.items()}
+            self._loaded_at = time.monotonic()
+
+    def _table(self):
+        if self._names is None or time.monotonic() - self._loaded_at > NAMES_TTL:
+            self._load()
+            with self._lock:
+                self._missing = set()
+        return self._names
+
+    def name(self, pk):
+        if pk is None:
+            return None
+        names = self._table()
+        if pk not in names and pk not in self._missing:
+            # Maybe created by another process since we loaded; a stale id costs one reload, not one per lookup.
+            self._load()
+            names = self._names
+            if pk not in names:
+                with self._lock:
+                    self._missing.add(pk)
+        return names.get(pk)
+
+    def intern(self, name):
+        """Return the id for ``name``, creating the row if needed."""
+        self._table()
+        pk = self._ids.get(name)
+        if pk is None:
+            try:
+                with transaction.atomic():
+                    pk = self.model.objects.get_or_create(**{self.field: name})[0].pk
+            except IntegrityError:
+                pk = self.model.objects.get(**{self.field: name}).pk
+            self.set(pk, name)
+        return pk
+
+    def set(self, pk, name):
+        with self._lock:
+            if self._names is not None:
+                old = self._names.get(pk)
+                if old is not None and self._ids.get(old) == pk:
+                    del self._ids[old]
+                self._names[pk] = name
+                self._ids[name] = pk
+            self._missing.discard(pk)
+
+    def discard(self, pk):
+        with self._lock:
+            if self._names is not None:
+                name = self._names.pop(pk, None)
+                if name is not None and self._ids.get(name) == pk:
+                    del self._ids[name]
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+            self._ids = None
+            self._missing = set()
+
+
+keys = NameTable(AttributeKey, 'key_name')
+values = NameTable(AttributeValue, 'value_name')
+
+
+def format_timestamp(value):
+    # Same output as DRF's DateTimeField, so blob-rendered attributes match the serializer.
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def attribute_entry(attribute):
+    """Compact blob entry: ``[key_id, value_id, created_at, updated_at]``; names come from the tables."""
+    return [attribute.attr_key_id, attribute.attr_value_id,
+            format_timestamp(attribute.created_at), format_timestamp(attribute.updated_at)]
+
+
+def render_attributes(data):
+    return [
+        {'created_at': created_at, 'updated_at': updated_at,
+         'key_id': key_id, 'key_name': keys.name(key_id),
+         'value_id': value_id, 'value_name': values.name(value_id)}
+        for key_id, value_id, created_at, updated_at in data or ()
+    ]
+
+
+def refresh_attribute_data(product_ids, batch_size=1000):
+    """Rewrite ``Product.attribute_data`` for ``product_ids`` from their ProductAttribute rows."""
+    product_ids = list(dict.fromkeys(pk for pk in product_ids if pk is not None))
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        blobs = defaultdict(list)
+        attributes = (ProductAttribute.objects.filter(product_id__in=chunk).order_by('pk')
+                      .only('product_id', 'attr_key_id', 'attr_value_id', 'created_at', 'updated_at'))
+        for attribute in attributes:
+            blobs[attribute.product_id].append(attribute_entry(attribute))
+        products = [Product(pk=pk, attribute_data=blobs.get(pk, [])) for pk in chunk]
+        Product.objects.bulk_update(products, ['attribute_data'])
@@ -0,0 +1,127 @@
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+
+from .models import APIKey
+
+
+class IdentityCache:
+    """
+    Process-local TTL + LRU map from a credential to what authenticating it
+    returned. Entries are indexed by user id so signals can drop every
+    credential of a user when their key, token or account changes; other
+    processes notice within AUTH_CACHE_TTL.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, user_id, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, user_id, value):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + settings.AUTH_CACHE_TTL, user_id, value)
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > settings.AUTH_CACHE_MAX_SIZE:
+                self._remove(next(iter(self._entries)))
+
+    def forget_user(self, user_id):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[1]]
+
+
+tokens = IdentityCache()
+api_keys = IdentityCache()
+jwt_users = IdentityCache()
+CACHES = (tokens, api_keys, jwt_users)
+
+
+def forget_user(user_id):
+    for identities in CACHES:
+        identities.forget_user(user_id)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """DRF token auth that only queries ``Token`` + ``User`` on a cache miss."""
+    identities = tokens
+
+    def authenticate_credentials(self, key):
+        cached = self.identities.get(key)
+        if cached is not None:
+            user, token = cached
+            # Every request gets its own copy, so per-request changes never leak.
+            return copy.copy(user), token
+        user, token = super().authenticate_credentials(key)
+        self.identities.put(key, user.pk, (user, token))
+        return copy.copy(user), token
+
+
+class APIKeyAuthentication(CachedTokenAuthentication):
+    """
+    Authenticate with the user's APIKey, sent as ``X-API-Key: <key>`` or
+    ``Authorization: Api-Key <key>``.
+    """
+    keyword = 'Api-Key'
+    model = APIKey
+    identities = api_keys
+
+    def authenticate(self, request):
+        key = request.META.get('HTTP_X_API_KEY')
+        if key:
+            return self.authenticate_credentials(key)
+        return super().authenticate(request)
+
+
+class CachedJWTAuthentication(BaseAuthentication):
+    """
+    simplejwt's JWTAuthentication, resolving the token's user from the
+    identity cache (main.jwt_auth). simplejwt is imported by the first
+    request that carries an Authorization header, not at worker boot.
+    """
+
+    def authenticate(self, request):
+        if not get_authorization_header(request):
+            return None
+        return jwt_backend().authenticate(request)
+
+    def authenticate_header(self, request):
+        return jwt_backend().authenticate_header(request)
+
+
+@functools.cache
+def jwt_backend():
+    from .jwt_auth import CachedJWTBackend
+    return CachedJWTBackend()
@@ -0,0 +1,266 @@
+import io
+import itertools
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import urls
+from .catalog_data import PASSWORD, generate_catalog
+from .metrics import begin_sample, end_sample
+from .models import Category, Product
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Case:
+    """
+    One request against a named route of main.urls. ``kwargs``/``data`` may
+    be callables taking the iteration number; they run before the clock
+    starts, so throwaway rows they create are not measured.
+    """
+
+    def __init__(self, url_name, method='get', query='', kwargs=None, data=None, client='anonymous',
+                 content_type='application/json', setup=None, max_iterations=None):
+        self.url_name = url_name
+        self.method = method
+        self.query = query
+        self.kwargs = kwargs
+        self.data = data
+        self.client = client
+        self.content_type = content_type
+        self.setup = setup
+        self.label = f'{method.upper()} {url_name}{" ?" + query if query else ""}'
+        self.max_iterations = max_iterations
+
+    def prepare(self, iteration):
+        if self.setup:
+            self.setup()
+        kwargs = self.kwargs(iteration) if callable(self.kwargs) else self.kwargs or {}
+        data = self.data(iteration) if callable(self.data) else self.data
+        path = reverse(self.url_name, kwargs=kwargs) + (f'?{self.query}' if self.query else '')
+        return path, data
+
+    def send(self, client, path, data):
+        if self.method == 'get':
+            return client.get(path)
+        if self.content_type is None:
+            return client.post(path, data)
+        body = json.dumps(data) if data is not None else ''
+        return client.generic(self.method.upper(), path, data=body, content_type=self.content_type)
+
+
+class CatalogBenchmark:
+    """
+    Hit every route of main.urls through the test client and record, per
+    case, status codes, SQL queries per request, latency percentiles and the
+    peak Python memory allocated while serving one request.
+
+    Destructive routes get a throwaway row per iteration. By default the
+    cache is cleared before every request so numbers reflect cold reads;
+    pass ``warm=True`` to measure cached responses instead.
+    """
+
+    def __init__(self, iterations=30, warm=False):
+        self.iterations = iterations
+        self.warm = warm
+        self.counter = itertools.count()
+
+    def fixtures(self):
+        self.category = Category.objects.order_by('pk').first()
+        self.product = Product.objects.order_by('pk').first()
+        if self.category is None or self.product is None:
+            raise ValueError('The benchmark needs at least one category and product; run generate_catalog first.')
+        self.admin = User.objects.filter(username='bench-admin').first() or User.objects.create_superuser(
+            'bench-admin', 'admin@example.com', PASSWORD)
+        self.clients = {name: Client(HTTP_ACCEPT='application/json') for name in ('anonymous', 'admin', 'session')}
+        self.clients['admin'].force_login(self.admin)
+        response = self.clients['anonymous'].post(reverse('token_obtain'),
+                                                  {'username': 'bench-admin', 'password': PASSWORD})
+        self.refresh_token = response.json().get('refresh')
+
+    def throwaway_category(self, _):
+        return {'category_slug': Category.objects.create(title=f'Throwaway {next(self.counter)}').slug}
+
+    def throwaway_product(self, _):
+        product = Product.objects.create(name='Throwaway', category=self.category, description='', price=1)
+        return {'product_id': product.pk}
+
+    def throwaway_products(self, _, count=20):
+        products = Product.objects.bulk_create([
+            Product(name='Throwaway', category=self.category, description='', price=1) for _ in range(count)
+        ])
+        return {'ids': [product.pk for product in products]}
+
+    def throwaway_categories(self, iteration):
+        return {'slugs': [self.throwaway_category(iteration)['category_slug']]}
+
+    def import_file(self, iteration):
+        rows = '\n'.join(f'bench-import-{iteration}-{n},Imported {n},{self.category.slug},{n * 1000}'
+                         for n in range(20))
+        upload = io.BytesIO(f'sku,name,category,price\n{rows}\n'.encode())
+        upload.name = 'products.csv'
+        return {'file': upload, 'file_format': 'csv'}
+
+    def product_payload(self, iteration):
+        return {'name': f'Updated {iteration}', 'description': 'benchmark', 'price': 1000 + iteration,
+                'category': self.category.pk}
+
+    def cases(self):
+        product = {'product_id': self.product.pk}
+        return [
+            Case('all-products'),
+            Case('all-products', query='page_size=20'),
+            Case('all-products', query='page_size=20&ordering=price&price_min=100000'),
+            Case('all-products', query='page_size=20&attr=RAM:16GB&attr=Color:Black'),
+            Case('all-products', query='page_size=20&ordering=-like_count'),
+            Case('all-products', query='stream=json'),
+            Case('all-products', query='stream=ndjson'),
+            Case('product-facets'),
+            Case('product-facets', query=f'category={self.category.slug}'),
+            Case('search-products', query='q=smart+phone'),
+            Case('search-products', query='q=sam&prefix=1'),
+            Case('all-categories'),
+            Case('category-tree'),
+            Case('category-products', kwargs={'category_slug': self.category.slug}),
+            Case('category-products', kwargs={'category_slug': self.category.slug}, query='page_size=20'),
+            Case('add-category', 'post', data=lambda i: {'title': f'Bench category {next(self.counter)}'}),
+            Case('delete-category', 'delete', kwargs=self.throwaway_category),
+            Case('edit-category', kwargs={'slug': self.category.slug}),
+            Case('edit-category', 'patch', kwargs={'slug': self.category.slug},
+                 data={'title': self.category.title}),
+            Case('product-detail', kwargs=product),
+            Case('product-comments', kwargs=product),
+            Case('product-comments', kwargs=product, query='ordering=-rating&page_size=50'),
+            Case('product-like', 'post', kwargs=product, client='admin'),
+            Case('product-like', 'delete', kwargs=product, client='admin'),
+            Case('product-detail', 'put', kwargs=product, data=self.product_payload),
+            Case('product-detail', 'delete', kwargs=self.throwaway_product),
+            Case('edit-product', kwargs={'id': self.product.pk}),
+            Case('edit-product', 'put', kwargs={'id': self.product.pk}, data=self.product_payload),
+            Case('delete-product', 'delete', kwargs=self.throwaway_product),
+            Case('import-products', 'post', data=self.import_file, client='admin', content_type=None),
+            Case('export-products', query='file_format=jsonl', client='admin', max_iterations=3),
+            Case('bulk-update-prices', 'post', client='admin',
+                 data={'filter': {'category': self.category.slug}, 'mode': 'percent', 'value': 0}),
+            Case('bulk-reassign-category', 'post', client='admin',
+                 data={'filter': {'category': self.category.slug}, 'category': self.category.slug}),
+            Case('bulk-delete-products', 'post', data=self.throwaway_products, client='admin'),
+            Case('bulk-delete-categories', 'post', data=self.throwaway_categories, client='admin'),
+            Case('all-attribute-keys'),
+            Case('all-attribute-values', query='page_size=50'),
+            Case('all-attribute-values', query='stream=json'),
+            Case('token-auth', 'post', data={'username': 'bench-admin', 'password': PASSWORD}),
+            Case('token_obtain', 'post', data={'username': 'bench-admin', 'password': PASSWORD}),
+            Case('token_refresh', 'post', data=lambda i: {'refresh': self.refresh_token}),
+            Case('login', 'post', data={'username': 'bench-admin', 'password': PASSWORD}),
+            Case('logout', 'post', client='session',
+                 setup=lambda: self.clients['session'].force_login(self.admin)),
+        ]
+
+    def run(self):
+        with override_settings(METRICS_SAMPLE_RATE=0):
+            self.fixtures()
+            cases = self.cases()
+            results = {case.label: self.measure(case) for case in cases}
+        covered = {case.url_name for case in cases}
+        skipped = sorted(pattern.name for pattern in urls.urlpatterns if pattern.name and pattern.name not in covered)
+        return {'iterations': self.iterations, 'warm': self.warm, 'results': results, 'skipped': skipped}
+
+    def measure(self, case):
+        timings, queries, statuses = [], [], set()
+        iterations = min(self.iterations, case.max_iterations or self.iterations)
+        for iteration in range(iterations):
+            elapsed, sample, status, _ = self.send(case, iteration)
+            timings.append(elapsed * 1000)
+            queries.append(sample.queries)
+            statuses.add(status)
+
+        # A separate, untimed pass: tracing allocations slows requests down.
+        peak = self.send(case, iterations, trace_memory=True)[3]
+
+        return {
+            'url_name': case.url_name,
+            'method': case.method.upper(),
+            'status': sorted(statuses),
+            'requests': iterations,
+            'queries_mean': round(statistics.fmean(queries), 2),
+            'queries_max': max(queries),
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def send(self, case, iteration, trace_memory=False):
+        path, data = case.prepare(iteration)
+        if not self.warm:
+            cache.clear()
+        if trace_memory:
+            tracemalloc.start()
+        token, sample = begin_sample()
+        peak = None
+        try:
+            started = time.perf_counter()
+            response = case.send(self.clients[case.client], path, data)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+        finally:
+            end_sample(token)
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        return elapsed, sample, response.status_code, peak
+
+
+def list_memory(sizes, formats=('buffered', 'json', 'ndjson'), url_name='all-products'):
+    """
+    Peak memory of one full, unpaginated ``url_name`` request per format
+    (``buffered`` is the regular rendered response, the others ``?stream=``)
+    as the catalog is grown to each of ``sizes`` products.
+    """
+    bench = CatalogBenchmark(iterations=1)
+    rows = []
+    with override_settings(METRICS_SAMPLE_RATE=0):
+        for size in sorted(sizes):
+            missing = size - Product.objects.count()
+            if missing > 0:
+                generate_catalog(categories=2, products=missing, users=0, likes=0, comments=1, images=1)
+            bench.fixtures()
+            for file_format in formats:
+                case = Case(url_name, query='' if file_format == 'buffered' else f'stream={file_format}')
+                elapsed, sample, status, peak = bench.send(case, 0, trace_memory=True)
+                rows.append({'products': Product.objects.count(), 'format': file_format, 'status': status,
+                             'queries': sample.queries, 'seconds': round(elapsed, 3),
+                             'peak_memory_kb': round(peak / 1024, 1)})
+    return rows
+
+
+def compare(baseline, current, threshold=0.2):
+    """Rows of ``(label, field, old, new, regressed)`` for cases present in both result sets."""
+    rows = []
+    for label, new in current['results'].items():
+        old = baseline.get('results', {}).get(label)
+        if old is None:
+            continue
+        for field in ('queries_mean', 'p50_ms', 'p99_ms', 'peak_memory_kb'):
+            before, after = old.get(field), new.get(field)
+            if before is None or after is None:
+                continue
+            if field == 'queries_mean':
+                regressed = after > before
+            else:
+                regressed = before > 0 and (after - before) / before > threshold
+            rows.append((label, field, before, after, regressed))
+    return rows
@@ -0,0 +1,391 @@
+import csv
+import io
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+from pathlib import Path
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .archive import archiver
+from .attributes import keys, values, refresh_attribute_data
+from .cache import CATALOG, CATEGORIES, bump_versions
+from .facets import rebuild_facets
+from .likes import invalidate_liked_product_ids
+from .search import index_products, remove_products
+from .thumbnails import schedule as schedule_thumbnails
+from .models import Category, Product, Image, Comment, Order, AttributeKey, AttributeValue, ProductAttribute, \
+    ProductFacet
+
+FORMATS = ('csv', 'jsonl')
+EXPORT_FIELDS = ['sku', 'name', 'category', 'description', 'price', 'image', 'images', 'attributes']
+UPDATE_FIELDS = ['name', 'category', 'description', 'price', 'image', 'updated_at']
+# Left alone on existing products when the feed has no such column.
+OPTIONAL_FIELDS = ('description', 'image')
+PRICE_MODES = ('absolute', 'percent')
+
+# Every table with a cascading foreign key to Product, children before
+# parents; delete_products() clears them without Django's per-row collector.
+PRODUCT_DEPENDENTS = (
+    ProductFacet,
+    ProductAttribute,
+    Image,
+    Comment,
+    Order,
+    Product.users_like.through,
+)
+
+
+def read_rows(stream, file_format):
+    """Stream dict rows from a text file object without loading it whole."""
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def split_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split('|') if item.strip()]
+    return list(value)
+
+
+def split_attributes(value):
+    if isinstance(value, dict):
+        return list(value.items())
+    pairs = []
+    for item in split_list(value):
+        key, sep, val = item.partition(':')
+        if sep:
+            pairs.append((key.strip(), val.strip()))
+    return pairs
+
+
+class ImportReport:
+    def __init__(self, skipped=0):
+        self.started = time.monotonic()
+        self.skipped = skipped
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'failed': len(self.errors),
+            'errors': self.errors[:50],
+            'seconds': round(time.monotonic() - self.started, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+class ProductImporter:
+    """
+    Upsert products (matched by ``sku``) with their images and attributes.
+
+    Category slugs and attribute key/value names are resolved through
+    dictionaries loaded once up front; each batch is written with
+    bulk_create/bulk_update inside its own transaction. When a checkpoint
+    path is given, the number of committed rows is stored after every batch
+    so an interrupted import can resume where it stopped.
+    """
+
+    def __init__(self, batch_size=1000, checkpoint=None, create_categories=True):
+        self.batch_size = batch_size
+        self.checkpoint = Path(checkpoint) if checkpoint else None
+        self.create_categories = create_categories
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.keys = self._name_map(AttributeKey, 'key_name')
+        self.values = self._name_map(AttributeValue, 'value_name')
+
+    @staticmethod
+    def _name_map(model, field):
+        names = {}
+        for pk, name in model.objects.order_by('-pk').values_list('pk', field):
+            names[name] = pk
+        return names
+
+    def read_checkpoint(self):
+        if self.checkpoint and self.checkpoint.exists():
+            return json.loads(self.checkpoint.read_text()).get('rows', 0)
+        return 0
+
+    def write_checkpoint(self, rows):
+        if self.checkpoint:
+            self.checkpoint.write_text(json.dumps({'rows': rows}))
+
+    def run(self, rows, resume=False):
+        skip = self.read_checkpoint() if resume else 0
+        report = ImportReport(skipped=skip)
+        rows = enumerate(rows, start=1)
+        if skip:
+            rows = islice(rows, skip, None)
+
+        done = skip
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                self.write_batch(batch, report)
+            done = batch[-1][0]
+            self.write_checkpoint(done)
+            bump_versions(CATALOG, CATEGORIES)
+        return report
+
+    def write_batch(self, batch, report):
+        parsed = []
+        for line, row in batch:
+            try:
+                parsed.append({'line': line, **self.parse(row)})
+            except (KeyError, TypeError, ValueError) as exc:
+                report.errors.append({'row': line, 'error': str(exc)})
+        report.processed += len(batch)
+
+        self.resolve_categories(parsed)
+        for row in parsed:
+            if row['category'] not in self.categories:
+                report.errors.append({'row': row['line'], 'error': f'Unknown category {row["category"]!r}'})
+        parsed = [row for row in parsed if row['category'] in self.categories]
+        if not parsed:
+            return
+        # The last row for a SKU wins within a batch.
+        parsed = list({row['sku'] or ('row', index): row for index, row in enumerate(parsed)}.values())
+        self.resolve_attributes(parsed)
+
+        now = timezone.now()
+        existing = dict(Product.objects.filter(sku__in=[row['sku'] for row in parsed if row['sku']])
+                        .values_list('sku', 'id'))
+        to_create, to_update = [], []
+        # Existing products are updated per combination of supplied columns.
+        updates = defaultdict(list)
+        for row in parsed:
+            product = Product(
+                id=existing.get(row['sku']), sku=row['sku'], name=row['name'],
+                category_id=self.categories[row['category']], description=row['description'] or '',
+                price=row['price'], image=row['image'] or '', updated_at=now,
+            )
+            row['product'] = product
+            if product.id:
+                to_update.append(product)
+                updates[tuple(field for field in UPDATE_FIELDS
+                              if field not in OPTIONAL_FIELDS or row[field] is not None)].append(product)
+            else:
+                to_create.append(product)
+
+        Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+        for fields, products in updates.items():
+            Product.objects.bulk_update(products, fields, batch_size=self.batch_size)
+        report.created += len(to_create)
+        report.updated += len(to_update)
+
+        self.sync_images(parsed, [product.id for product in to_update])
+        self.sync_attributes(parsed, [product.id for product in to_update])
+        index_products([row['product'].id for row in parsed])
+        # bulk writes skip post_save, so queue the derivatives here as well.
+        schedule_thumbnails([row['image'] for row in parsed] + [name for row in parsed for name in row['images'] or ()])
+
+    def parse(self, row):
+        name = (row.get('name') or '').strip()
+        category = (row.get('category') or '').strip()
+        if not name or not category:
+            raise ValueError('name and category are required')
+        return {
+            'sku': (row.get('sku') or '').strip() or None,
+            'name': name,
+            'category': category,
+            # None means "column not supplied": leave existing rows alone.
+            'description': (row['description'] or '') if 'description' in row else None,
+            'price': float(row['price']),
+            'image': (row['image'] or '') if 'image' in row else None,
+            'images': split_list(row['images']) if 'images' in row else None,
+            'attributes': split_attributes(row['attributes']) if 'attributes' in row else None,
+        }
+
+    def resolve_categories(self, parsed):
+        missing = {row['category'] for row in parsed} - self.categories.keys()
+        if not missing or not self.create_categories:
+            return
+        slugs = {name: slugify(name) or name for name in missing}
+        Category.objects.bulk_create([Category(title=name, slug=slug) for name, slug in slugs.items()],
+                                     ignore_conflicts=True)
+        # bulk_create skips Category.save(), which sets the materialized path.
+        Category.objects.filter(slug__in=slugs.values(), path='').rebuild_paths()
+        ids = dict(Category.objects.filter(slug__in=slugs.values()).values_list('slug', 'id'))
+        self.categories.update((name, ids[slug]) for name, slug in slugs.items() if slug in ids)
+
+    def resolve_attributes(self, parsed):
+        for model, field, names, table, position in ((AttributeKey, 'key_name', self.keys, keys, 0),
+                                                     (AttributeValue, 'value_name', self.values, values, 1)):
+            missing = {pair[position] for row in parsed for pair in row['attributes'] or ()} - names.keys()
+            if missing:
+                # Names are unique; a concurrent import may have created some of them already.
+                model.objects.bulk_create([model(**{field: name}) for name in missing], ignore_conflicts=True)
+                names.update(model.objects.filter(**{f'{field}__in': missing}).values_list(field, 'pk'))
+                table.invalidate()
+
+    def sync_images(self, parsed, updated_ids):
+        rows = [row for row in parsed if row['images'] is not None]
+        ids = set(updated_ids) & {row['product'].id for row in rows}
+        current = set(Image.objects.filter(product_id__in=ids).values_list('product_id', 'image'))
+        wanted, new = set(), []
+        for row in rows:
+            product_id = row['product'].id
+            for position, name in enumerate(row['images']):
+                wanted.add((product_id, name))
+                if (product_id, name) not in current:
+                    new.append(Image(product_id=product_id, image=name, is_primary=position == 0))
+        for product_id, name in current - wanted:
+            Image.objects.filter(product_id=product_id, image=name).delete()
+        Image.objects.bulk_create(new, batch_size=self.batch_size)
+
+    def sync_attributes(self, parsed, updated_ids):
+        rows = [row for row in parsed if row['attributes'] is not None]
+        ids = set(updated_ids) & {row['product'].id for row in rows}
+        current = set(ProductAttribute.objects.filter(product_id__in=ids)
+                      .values_list('product_id', 'attr_key_id', 'attr_value_id'))
+        wanted, new = set(), []
+        for row in rows:
+            product_id = row['product'].id
+            for key, value in row['attributes']:
+                triple = (product_id, self.keys[key], self.values[value])
+                wanted.add(triple)
+                if triple not in current:
+                    new.append(ProductAttribute(product_id=product_id, attr_key_id=triple[1], attr_value_id=triple[2]))
+        for product_id, key_id, value_id in current - wanted:
+            ProductAttribute.objects.filter(product_id=product_id, attr_key_id=key_id, attr_value_id=value_id).delete()
+        ProductAttribute.objects.bulk_create(new, batch_size=self.batch_size)
+        # bulk_create skips post_save, so index the new rows and rewrite the blobs here.
+        rebuild_facets([attribute.pk for attribute in new], batch_size=self.batch_size)
+        refresh_attribute_data([row['product'].id for row in rows], batch_size=self.batch_size)
+
+
+def export_queryset():
+    return Product.objects.select_related('category').prefetch_related('images').order_by('pk')
+
+
+def export_row(product):
+    return {
+        'sku': product.sku,
+        'name': product.name,
+        'category': product.category.slug,
+        'description': product.description,
+        'price': product.price,
+        'image': product.image.name or '',
+        'images': [image.image.name for image in product.images.all() if image.image],
+        'attributes': {keys.name(key_id): values.name(value_id)
+                       for key_id, value_id, *_ in product.attribute_data
+                       if key_id is not None and value_id is not None},
+    }
+
+
+def export_lines(file_format, queryset=None, chunk_size=2000):
+    """Yield the export one line at a time; memory stays at one chunk of products."""
+    queryset = export_queryset() if queryset is None else queryset
+    if file_format == 'jsonl':
+        for product in queryset.iterator(chunk_size=chunk_size):
+            yield json.dumps(export_row(product), ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(EXPORT_FIELDS)
+    for product in queryset.iterator(chunk_size=chunk_size):
+        row = export_row(product)
+        row['images'] = '|'.join(row['images'])
+        row['attributes'] = '|'.join(f'{key}:{value}' for key, value in row['attributes'].items())
+        yield line([row[field] if row[field] is not None else '' for field in EXPORT_FIELDS])
+
+
+def update_prices(queryset, mode, value):
+    """
+    Set every price in ``queryset`` to ``value`` (``absolute``) or change it
+    by ``value`` percent (``percent``) with a single UPDATE.
+    Returns the number of products updated.
+    """
+    price = Value(float(value)) if mode == 'absolute' else F('price') * (1 + value / 100)
+    with transaction.atomic():
+        updated = queryset.order_by().update(price=price, updated_at=timezone.now())
+    # Prices are not part of the search index or facets; only cached responses change.
+    bump_versions(CATALOG, CATEGORIES)
+    return updated
+
+
+def reassign_category(queryset, category):
+    """Move every product in ``queryset`` to ``category`` with a single UPDATE; returns the count."""
+    with transaction.atomic():
+        ids = list(queryset.order_by().values_list('pk', flat=True))
+        updated = Product.objects.filter(pk__in=ids).update(category=category, updated_at=timezone.now())
+    index_products(ids)
+    bump_versions(CATALOG, CATEGORIES)
+    return updated
+
+
+def _raw_delete(queryset):
+    # No signals and no collector: one DELETE statement.
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_products(queryset):
+    """
+    Delete the products in ``queryset`` and their dependent rows with one
+    DELETE per table instead of Django's per-object cascade and signals.
+    Snapshots are archived in one batch once the transaction commits.
+    Returns ``{model label: rows deleted}``.
+    """
+    with transaction.atomic():
+        products = list(queryset.order_by('pk'))
+        ids = [product.pk for product in products]
+        counts = {Product._meta.label: 0}
+        if ids:
+            liked_by = set(Product.users_like.through.objects.filter(product_id__in=ids)
+                           .values_list('user_id', flat=True))
+            for model in PRODUCT_DEPENDENTS:
+                counts[model._meta.label] = _raw_delete(model.objects.filter(product_id__in=ids))
+            counts[Product._meta.label] = _raw_delete(Product.objects.filter(pk__in=ids))
+            transaction.on_commit(lambda: archiver.archive_many(products, 'product'))
+            transaction.on_commit(lambda: invalidate_liked_product_ids(liked_by))
+    remove_products(ids)
+    bump_versions(CATALOG, CATEGORIES)
+    return counts
+
+
+def delete_categories(queryset):
+    """
+    delete_products() for whole categories and their subcategories: the
+    products go first, then the categories themselves.
+    """
+    with transaction.atomic():
+        categories = list(queryset.with_descendants().order_by('pk'))
+        ids = [category.pk for category in categories]
+        counts = delete_products(Product.objects.filter(category_id__in=ids))
+        counts[Category._meta.label] = _raw_delete(Category.objects.filter(pk__in=ids)) if ids else 0
+        if categories:
+            transaction.on_commit(lambda: archiver.archive_many(categories, 'category'))
+    bump_versions(CATALOG, CATEGORIES)
+    return counts
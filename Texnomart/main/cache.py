@@ -0,0 +1,131 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .replicas import cache_timeout
+
+# Version namespaces. Every cached response is keyed by the global CATALOG
+# version plus the namespaces it depends on; bumping any of them orphans the
+# old entries, which then simply expire.
+CATALOG = 'catalog'
+CATEGORIES = 'categories'
+
+
+def product_ns(product_id):
+    return f'product:{product_id}'
+
+
+def category_ns(category_id):
+    return f'category:{category_id}'
+
+
+def _version_key(namespace):
+    return f'catalog-version:{namespace}'
+
+
+def get_versions(namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # Versions are timestamps, so a counter lost to eviction never
+        # comes back with a value an old entry was stored under.
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, None)
+        found.update(cache.get_many(missing))
+    return [found.get(key, 0) for key in keys]
+
+
+async def aget_versions(namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time()
+        for key in missing:
+            await cache.aadd(key, now, None)
+        found.update(await cache.aget_many(missing))
+    return [found.get(key, 0) for key in keys]
+
+
+def bump_versions(*namespaces):
+    now = time.time()
+    cache.set_many({_version_key(namespace): now for namespace in namespaces}, None)
+
+
+def _response_key(request, versions):
+    raw = '|'.join([request.build_absolute_uri(), *map(repr, versions)])
+    return 'catalog-response:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _make_entry(result, versions):
+    data, updated_at = result
+    last_modified = max([*versions, updated_at.timestamp() if updated_at else 0])
+    return {'data': data, 'last_modified': int(last_modified)}
+
+
+def _conditional_response(request, key, entry, variant, personalize, response_class):
+    etag = f'"{key[-32:]}{variant}"'
+    response = get_conditional_response(request, etag=etag, last_modified=entry['last_modified'])
+    if response is None:
+        data = entry['data']
+        response = response_class(personalize(data) if personalize else data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    return response
+
+
+def cached_response(request, namespaces, build, variant='', personalize=None):
+    """
+    Serve ``build()`` from the cache, honouring If-None-Match/If-Modified-Since.
+
+    ``build`` returns ``(data, updated_at)`` or a ready Response (e.g. a 404),
+    which is passed through uncached. ``variant`` distinguishes per-user
+    representations in the ETag and ``personalize`` patches them into the
+    shared cached payload.
+    """
+    versions = get_versions((CATALOG, *namespaces))
+    key = _response_key(request, versions)
+
+    entry = cache.get(key)
+    if entry is None:
+        result = build()
+        if isinstance(result, Response):
+            return result
+        entry = _make_entry(result, versions)
+        cache.set(key, entry, cache_timeout(settings.CATALOG_CACHE_TIMEOUT))
+    return _conditional_response(request, key, entry, variant, personalize, Response)
+
+
+async def acached_response(request, namespaces, build, variant='', personalize=None, response_class=Response):
+    """cached_response() for async views: ``build`` is a coroutine function and may return an HttpResponse."""
+    versions = await aget_versions((CATALOG, *namespaces))
+    key = _response_key(request, versions)
+
+    entry = await cache.aget(key)
+    if entry is None:
+        result = await build()
+        if isinstance(result, HttpResponseBase):
+            return result
+        entry = _make_entry(result, versions)
+        await cache.aset(key, entry, cache_timeout(settings.CATALOG_CACHE_TIMEOUT))
+    return _conditional_response(request, key, entry, variant, personalize, response_class)
+
+
+class CachedListMixin:
+    """Cache ListAPIView responses under ``get_cache_namespaces()``."""
+
+    def get_cache_namespaces(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            return super(CachedListMixin, self).list(request, *args, **kwargs).data, None
+        return cached_response(request, self.get_cache_namespaces(), build)
@@ -0,0 +1,132 @@
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .attributes import keys as key_names, values as value_names, refresh_attribute_data
+from .cache import CATALOG, CATEGORIES, bump_versions
+from .facets import rebuild_facets
+from .models import Category, Product, Image, Comment, ProductAttribute
+from .search import get_backend
+
+WORDS = ('apple samsung xiaomi artel lg philips bosch phone smartphone laptop tablet fridge washer '
+         'television monitor headphones speaker charger cable black white silver titanium pro max mini '
+         'ultra smart wireless bluetooth gaming kitchen vacuum camera watch').split()
+
+# EAV keys and the values each one draws from.
+ATTRIBUTES = {
+    'Brand': ['Apple', 'Samsung', 'Xiaomi', 'Artel', 'LG', 'Philips', 'Bosch'],
+    'Color': ['Black', 'White', 'Silver', 'Blue', 'Red', 'Titanium'],
+    'RAM': ['4GB', '6GB', '8GB', '12GB', '16GB', '32GB'],
+    'Storage': ['64GB', '128GB', '256GB', '512GB', '1TB'],
+    'Warranty': ['6 months', '1 year', '2 years', '3 years'],
+    'Screen': ['6.1"', '6.7"', '13.3"', '15.6"', '55"', '65"'],
+    'Power': ['20W', '65W', '100W', '1200W', '2000W'],
+    'Country': ['China', 'Korea', 'Uzbekistan', 'Vietnam', 'Germany'],
+}
+PASSWORD = 'benchmark'
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def generate_catalog(categories=20, products=10000, images=3, attributes=5, comments=3, users=100, likes=10,
+                     seed=0, batch_size=2000):
+    """
+    Fill the database with a synthetic catalog using bulk inserts only.
+
+    Per-product counts vary around the given averages (0..2x) so pages and
+    facets are uneven, as in real data. bulk_create skips signals, so rating
+    aggregates, attribute blobs, facets, the search index and cache versions
+    are rebuilt once at the end. Returns the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    created = {}
+
+    with transaction.atomic():
+        offset = Category.objects.count()
+        new_categories = [Category(title=f'{word.title()} {offset + i}', slug=f'{word}-{offset + i}')
+                          for i, word in enumerate(rng.choices(WORDS, k=categories))]
+        # A quarter are departments; the rest are their subcategories.
+        roots = Category.objects.bulk_create(new_categories[:max(1, categories // 4)])
+        for category in new_categories[len(roots):]:
+            category.parent_id = rng.choice(roots).pk
+        Category.objects.bulk_create(new_categories[len(roots):])
+        category_ids = [category.pk for category in new_categories]
+        Category.objects.filter(pk__in=category_ids).rebuild_paths()
+        created['categories'] = len(category_ids)
+
+        password = make_password(PASSWORD)
+        offset = User.objects.count()
+        user_ids = [user.pk for user in User.objects.bulk_create(
+            [User(username=f'bench{offset + i}', password=password) for i in range(users)], batch_size=batch_size
+        )]
+        created['users'] = len(user_ids)
+
+        keys = _names(key_names, ATTRIBUTES)
+        values = _names(value_names, {name for names in ATTRIBUTES.values() for name in names})
+
+        product_ids = []
+        for batch in chunked(range(products), batch_size):
+            product_ids.extend(product.pk for product in Product.objects.bulk_create([
+                Product(name=' '.join(rng.sample(WORDS, 3)).title(), description=' '.join(rng.choices(WORDS, k=30)),
+                        category_id=rng.choice(category_ids), price=rng.randint(50, 30000) * 1000)
+                for _ in batch
+            ]))
+        created['products'] = len(product_ids)
+
+        created['images'] = _bulk(Image, batch_size, (
+            Image(product_id=product_id, image=f'image/product/bench/{product_id}-{n}.jpg', is_primary=n == 0)
+            for product_id in product_ids for n in range(rng.randint(0, 2 * images))
+        ))
+        created['attributes'] = _bulk(ProductAttribute, batch_size, (
+            ProductAttribute(product_id=product_id, attr_key_id=keys[key],
+                             attr_value_id=values[rng.choice(ATTRIBUTES[key])])
+            for product_id in product_ids
+            for key in rng.sample(list(ATTRIBUTES), min(len(ATTRIBUTES), rng.randint(0, 2 * attributes)))
+        ))
+        created['comments'] = _bulk(Comment, batch_size, (
+            Comment(product_id=product_id, user_id=rng.choice(user_ids) if user_ids else None,
+                    message=' '.join(rng.choices(WORDS, k=12)), rating=rng.randint(1, 5))
+            for product_id in product_ids for _ in range(rng.randint(0, 2 * comments))
+        ))
+        Like = Product.users_like.through
+        created['likes'] = _bulk(Like, batch_size, (
+            Like(user_id=user_id, product_id=product_id)
+            for user_id in user_ids
+            for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(0, 2 * likes)))
+        ))
+
+        if product_ids:
+            Product.objects.filter(pk__gte=product_ids[0]).rebuild_rating_aggregates()
+            Product.objects.filter(pk__gte=product_ids[0]).rebuild_like_counts()
+            refresh_attribute_data(product_ids, batch_size=batch_size)
+    rebuild_facets(batch_size=batch_size)
+    get_backend().rebuild()
+    bump_versions(CATALOG, CATEGORIES)
+    return created
+
+
+def _bulk(model, batch_size, objects):
+    total = 0
+    for batch in chunked(objects, batch_size):
+        model.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def _names(table, names):
+    """Map each of ``names`` to a row id of ``table``'s model, creating only the names that are missing."""
+    model, field = table.model, table.field
+    existing = dict(model.objects.filter(**{f'{field}__in': names}).values_list(field, 'pk'))
+    created = model.objects.bulk_create([model(**{field: name}) for name in sorted(set(names) - existing.keys())])
+    existing.update((getattr(obj, field), obj.pk) for obj in created)
+    # bulk_create skips the signals that keep the name table current.
+    for obj in created:
+        table.set(obj.pk, getattr(obj, field))
+    return existing
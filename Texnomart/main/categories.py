@@ -0,0 +1,113 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import CATALOG, CATEGORIES, aget_versions, get_versions
+from .models import PATH_SEPARATOR, Category
+
+TREE_FIELDS = ('pk', 'parent_id', 'title', 'slug')
+
+# (versions, tree) last built by this process; rebuilt when CATEGORIES moves on.
+_snapshot = None
+
+
+class CategoryTree:
+    """
+    Immutable snapshot of the category hierarchy, built from
+    ``(id, parent_id, title, slug)`` rows. Breadcrumbs, subtrees and the
+    nested tree are answered from memory; materialized paths are derived
+    from the parent links, matching Category.path.
+    """
+
+    def __init__(self, rows):
+        self.nodes = {pk: {'id': pk, 'title': title, 'slug': slug, 'parent': parent_id}
+                      for pk, parent_id, title, slug in rows}
+        self.by_slug = {node['slug']: node for node in self.nodes.values()}
+        children = defaultdict(list)
+        for node in sorted(self.nodes.values(), key=lambda node: (node['title'], node['id'])):
+            children[node['parent']].append(node['id'])
+        # A plain dict: the tree is shared between threads and must not grow on lookups.
+        self.children = dict(children)
+
+        self.paths = {}
+        stack = [(pk, '') for pk in self.children.get(None, ())]
+        while stack:
+            pk, prefix = stack.pop()
+            self.paths[pk] = path = f'{prefix}{pk}{PATH_SEPARATOR}'
+            stack.extend((child, path) for child in self.children.get(pk, ()))
+
+    def ancestors(self, pk):
+        """Ids from the root down to ``pk`` (inclusive)."""
+        return [int(segment) for segment in self.paths[pk].split(PATH_SEPARATOR)[:-1]]
+
+    def breadcrumbs(self, pk):
+        return [{'id': ancestor, 'title': self.nodes[ancestor]['title'], 'slug': self.nodes[ancestor]['slug']}
+                for ancestor in self.ancestors(pk)]
+
+    def subtree_ids(self, pk):
+        ids, stack = [], [pk]
+        while stack:
+            pk = stack.pop()
+            ids.append(pk)
+            stack.extend(self.children.get(pk, ()))
+        return ids
+
+    def filter_products(self, queryset, slug):
+        """``queryset`` narrowed to category ``slug`` and its subcategories (empty for an unknown slug)."""
+        category = self.by_slug.get(slug)
+        if category is None:
+            return queryset.none()
+        if category['id'] not in self.children:
+            # A leaf: filtering on category_id keeps the (category, price/created_at) indexes usable for ordering.
+            return queryset.filter(category_id=category['id'])
+        return queryset.in_category(self.paths[category['id']])
+
+    def nested(self, parent=None):
+        """``[{id, title, slug, children: [...]}, ...]`` below ``parent`` (the roots by default), by title."""
+        return [{'id': pk, 'title': self.nodes[pk]['title'], 'slug': self.nodes[pk]['slug'],
+                 'children': self.nested(pk)} for pk in self.children.get(parent, ())]
+
+
+def _tree_key(versions):
+    return 'category-tree:' + ':'.join(map(repr, versions))
+
+
+def _rows():
+    # Always from the primary: a lagging replica must not be cached under the new version.
+    return Category.objects.using(DEFAULT_DB_ALIAS).order_by().values_list(*TREE_FIELDS)
+
+
+def _remember(versions, rows):
+    global _snapshot
+    tree = CategoryTree(rows)
+    _snapshot = (versions, tree)
+    return tree
+
+
+def get_category_tree():
+    """The current CategoryTree: from this process, else the shared cache, else one query."""
+    versions = get_versions((CATALOG, CATEGORIES))
+    snapshot = _snapshot
+    if snapshot is not None and snapshot[0] == versions:
+        return snapshot[1]
+    key = _tree_key(versions)
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(_rows())
+        cache.set(key, rows, settings.CATALOG_CACHE_TIMEOUT)
+    return _remember(versions, rows)
+
+
+async def aget_category_tree():
+    versions = await aget_versions((CATALOG, CATEGORIES))
+    snapshot = _snapshot
+    if snapshot is not None and snapshot[0] == versions:
+        return snapshot[1]
+    key = _tree_key(versions)
+    rows = await cache.aget(key)
+    if rows is None:
+        rows = [row async for row in _rows()]
+        await cache.aset(key, rows, settings.CATALOG_CACHE_TIMEOUT)
+    return _remember(versions, rows)
@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+from django.db.models import Count
+
+from .models import ProductAttribute, ProductFacet
+
+
+def facet_for(attribute):
+    if attribute.product_id is None or attribute.attr_key is None or attribute.attr_value is None:
+        return None
+    return ProductFacet(attribute_id=attribute.pk, product_id=attribute.product_id,
+                        key=attribute.attr_key.key_name or '', value=attribute.attr_value.value_name or '')
+
+
+def sync_facet(attribute):
+    facet = facet_for(attribute)
+    if facet is None:
+        ProductFacet.objects.filter(attribute_id=attribute.pk).delete()
+        return
+    ProductFacet.objects.update_or_create(
+        attribute_id=attribute.pk,
+        defaults={'product_id': facet.product_id, 'key': facet.key, 'value': facet.value},
+    )
+
+
+def rebuild_facets(attribute_ids=None, batch_size=1000):
+    """Recreate the facet rows for ``attribute_ids`` (all attributes when None)."""
+    attributes = ProductAttribute.objects.select_related('attr_key', 'attr_value')
+    facets = ProductFacet.objects.all()
+    if attribute_ids is not None:
+        attributes = attributes.filter(pk__in=attribute_ids)
+        facets = facets.filter(attribute_id__in=attribute_ids)
+    facets.delete()
+    batch = []
+    for attribute in attributes.iterator(chunk_size=batch_size):
+        facet = facet_for(attribute)
+        if facet is not None:
+            batch.append(facet)
+        if len(batch) >= batch_size:
+            ProductFacet.objects.bulk_create(batch)
+            batch = []
+    ProductFacet.objects.bulk_create(batch)
+
+
+def parse_facet_terms(terms):
+    """Group ``["RAM:16GB", "Color:Black", "Color:White"]`` into ``{key: [values]}``."""
+    grouped = defaultdict(list)
+    for term in terms:
+        key, sep, value = term.partition(':')
+        if sep and key.strip() and value.strip():
+            grouped[key.strip()].append(value.strip())
+    return grouped
+
+
+def filter_by_facets(queryset, terms):
+    # Values of the same key are alternatives; different keys must all match.
+    for key, values in parse_facet_terms(terms).items():
+        matching = ProductFacet.objects.filter(key=key, value__in=values).values('product_id')
+        queryset = queryset.filter(pk__in=matching)
+    return queryset
+
+
+def facet_counts(queryset):
+    """Count products per key/value over ``queryset`` in a single grouped query."""
+    rows = (ProductFacet.objects.filter(product__in=queryset.order_by().values('pk'))
+            .values('key', 'value').annotate(count=Count('product', distinct=True)).order_by('key', 'value'))
+    counts = defaultdict(list)
+    for row in rows:
+        counts[row['key']].append({'value': row['value'], 'count': row['count']})
+    return counts
@@ -1,16 +1,33 @@
 import django_filters
+from .categories import get_category_tree
+from .facets import filter_by_facets
+from .likes import get_liked_product_ids
 from .models import Product, Category
 
 
 class ProductFilter(django_filters.FilterSet):
     price_min = django_filters.NumberFilter(field_name="price", lookup_expr='gte')
     price_max = django_filters.NumberFilter(field_name="price", lookup_expr='lte')
-    category = django_filters.CharFilter(field_name="category__slug", lookup_expr='exact')
+    category = django_filters.CharFilter(method='filter_category', label='Category slug (includes subcategories)')
+    ordering = django_filters.OrderingFilter(fields=('price', 'created_at', 'like_count'))
+    attr = django_filters.CharFilter(method='filter_attributes', label='Key:Value (repeatable)')
+    is_liked = django_filters.BooleanFilter(method='filter_liked', label='Liked by the requesting user')
 
     class Meta:
         model = Product
         fields = ['category', 'price_min', 'price_max', 'is_liked']
 
+    def filter_category(self, queryset, name, value):
+        return get_category_tree().filter_products(queryset, value)
+
+    def filter_attributes(self, queryset, name, value):
+        terms = self.data.getlist(name) if hasattr(self.data, 'getlist') else [value]
+        return filter_by_facets(queryset, terms)
+
+    def filter_liked(self, queryset, name, value):
+        liked = get_liked_product_ids(getattr(self.request, 'user', None))
+        return queryset.filter(pk__in=liked) if value else queryset.exclude(pk__in=liked)
+
 
 class CategoryFilter(django_filters.FilterSet):
     class Meta:
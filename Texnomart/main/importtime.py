@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+
+# Seconds a fresh worker may spend importing Django, the apps and the URLconf
+# before it can serve its first request.
+BOOT_TIME_BUDGET = 1.0
+
+# What a worker does before its first request: build the WSGI handler
+# (django.setup(), middleware) and resolve the URLconf.
+BOOT_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+print('\\n'.join(sorted(sys.modules)))
+'''
+
+
+def profile_boot():
+    """
+    Boot a worker in a fresh interpreter under ``-X importtime``.
+
+    Returns ``(seconds, modules, imports)``: the wall-clock boot time, the
+    set of modules loaded by then and ``[(module, self_us, cumulative_us)]``
+    for every module imported along the way.
+    """
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT], cwd=settings.BASE_DIR,
+                            env=env, capture_output=True, text=True, check=True)
+    seconds, *modules = result.stdout.split()
+    return float(seconds), set(modules), parse_importtime(result.stderr)
+
+
+def parse_importtime(output):
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def module_group(name, app_modules=None):
+    """The installed app ``name`` belongs to, else 'django', 'stdlib' or its top-level package."""
+    if app_modules is None:
+        app_modules = sorted((config.name for config in apps.get_app_configs()), key=len, reverse=True)
+    for app_module in app_modules:
+        if name == app_module or name.startswith(app_module + '.'):
+            return app_module
+    top = name.partition('.')[0]
+    if top == 'django':
+        return 'django'
+    if top in sys.stdlib_module_names or top.startswith('_'):
+        return 'stdlib'
+    return top
+
+
+def aggregate(imports):
+    """Sum the self time of ``imports`` per module_group(), slowest first: ``[(group, modules, self_us)]``."""
+    app_modules = sorted((config.name for config in apps.get_app_configs()), key=len, reverse=True)
+    totals = defaultdict(lambda: [0, 0])
+    for name, self_us, _ in imports:
+        total = totals[module_group(name, app_modules)]
+        total[0] += 1
+        total[1] += self_us
+    return sorted(((group, count, self_us) for group, (count, self_us) in totals.items()),
+                  key=lambda row: row[2], reverse=True)
@@ -0,0 +1,24 @@
+import copy
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .authentication import jwt_users
+
+
+class CachedJWTBackend(JWTAuthentication):
+    """JWT auth that resolves the token's user from the identity cache instead of a query per request."""
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        user = jwt_users.get(user_id) if user_id is not None else None
+        if user is None:
+            user = super().get_user(validated_token)
+            jwt_users.put(user_id, user.pk, user)
+        elif jwt_settings.CHECK_REVOKE_TOKEN and (
+                validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)):
+            raise exceptions.AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return copy.copy(user)
@@ -0,0 +1,190 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+
+from .cache import aget_versions, bump_versions, category_ns, get_versions, product_ns
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+LIKED_IDS_TIMEOUT = 60 * 60
+
+
+def liked_ns(user_id):
+    return f'liked:{user_id}'
+
+
+def liked_ids_cache_key(user_id, version):
+    # Versioned like the response cache: a read that started before an
+    # invalidation stores under the old version and cannot undo it.
+    return f'liked-products:{user_id}:{version!r}'
+
+
+def _liked_ids_queryset(user_id):
+    # Always from the primary: buffered taps never pin the client, and a
+    # lagging replica's set would stay cached for LIKED_IDS_TIMEOUT.
+    return Product.users_like.through.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id) \
+        .values_list('product_id', flat=True)
+
+
+def get_liked_product_ids(user):
+    """Return the set of product ids ``user`` has liked, cached per user, with buffered taps applied."""
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    key = liked_ids_cache_key(user.pk, *get_versions([liked_ns(user.pk)]))
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(_liked_ids_queryset(user.pk))
+        cache.set(key, ids, LIKED_IDS_TIMEOUT)
+    return like_buffer.overlay(user.pk, ids)
+
+
+async def aget_liked_product_ids(user):
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    key = liked_ids_cache_key(user.pk, *await aget_versions([liked_ns(user.pk)]))
+    ids = await cache.aget(key)
+    if ids is None:
+        ids = frozenset([product_id async for product_id in _liked_ids_queryset(user.pk)])
+        await cache.aset(key, ids, LIKED_IDS_TIMEOUT)
+    return like_buffer.overlay(user.pk, ids)
+
+
+def invalidate_liked_product_ids(user_ids):
+    bump_versions(*map(liked_ns, user_ids))
+
+
+def refresh_like_counts(product_ids):
+    """Recount ``like_count`` for ``product_ids`` and, once committed, expire the cached responses showing it."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    Product.objects.filter(pk__in=product_ids).rebuild_like_counts()
+    category_ids = set(Product.objects.filter(pk__in=product_ids).values_list('category_id', flat=True))
+    # After the commit: bumped earlier, a reader could cache the old counts under the new versions.
+    namespaces = [*map(product_ns, product_ids), *map(category_ns, category_ids)]
+    transaction.on_commit(lambda: bump_versions(*namespaces))
+
+
+def write_likes(intents):
+    """
+    Apply ``{user_id: {product_id: liked}}`` to the users_like through table
+    with one bulk INSERT and one DELETE, then recount the touched products.
+    Intents for users or products deleted in the meantime are dropped.
+    """
+    Like = Product.users_like.through
+    with transaction.atomic():
+        user_ids = set(User.objects.filter(pk__in=list(intents)).values_list('pk', flat=True))
+        product_ids = set(Product.objects.filter(
+            pk__in={product_id for user_intents in intents.values() for product_id in user_intents}
+        ).values_list('pk', flat=True))
+
+        likes, unlikes = [], Q()
+        for user_id in user_ids:
+            targets = [(product_id, value) for product_id, value in intents[user_id].items()
+                       if product_id in product_ids]
+            liked = [product_id for product_id, value in targets if value]
+            unliked = [product_id for product_id, value in targets if not value]
+            likes.extend(Like(user_id=user_id, product_id=product_id) for product_id in liked)
+            if unliked:
+                unlikes |= Q(user_id=user_id, product_id__in=unliked)
+        Like.objects.bulk_create(likes, ignore_conflicts=True)
+        if unlikes:
+            Like.objects.filter(unlikes).delete()
+        refresh_like_counts(product_ids)
+    invalidate_liked_product_ids(user_ids)
+
+
+class LikeBuffer:
+    """
+    Pending like/unlike taps, written to the database by write_likes() from
+    a background thread every LIKE_BUFFER_FLUSH_INTERVAL seconds (or as soon
+    as LIKE_BUFFER_MAX_PENDING are waiting).
+
+    Only the last tap per (user, product) is kept, so toggling during a sale
+    costs at most one row change per flush. Taps are process-local: this
+    process's readers see them at once through overlay(), others after the
+    flush, and taps still pending when the process is killed are lost.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._flushing = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, user_id, product_id, liked):
+        with self._lock:
+            intents = self._pending.setdefault(user_id, {})
+            if product_id not in intents:
+                self._size += 1
+            intents[product_id] = liked
+            size = self._size
+        if not settings.LIKE_BUFFER_ASYNC or size >= settings.LIKE_BUFFER_MAX_PENDING:
+            self.flush()
+        else:
+            self._start()
+
+    def overlay(self, user_id, ids):
+        """``ids`` (the user's liked products in the database) with their unwritten taps applied."""
+        with self._lock:
+            if user_id not in self._pending and user_id not in self._flushing:
+                return ids
+            intents = {**self._flushing.get(user_id, {}), **self._pending.get(user_id, {})}
+        return frozenset((ids - intents.keys()) | {product_id for product_id, liked in intents.items() if liked})
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._size = self._pending, {}, 0
+                # Still overlaid until the cached liked ids have been invalidated.
+                self._flushing = batch
+            if not batch:
+                return 0
+            try:
+                write_likes(batch)
+            except Exception:
+                with self._lock:
+                    # Taps recorded while the write failed are newer and win.
+                    for user_id, intents in batch.items():
+                        self._pending[user_id] = {**intents, **self._pending.get(user_id, {})}
+                    self._size = sum(len(intents) for intents in self._pending.values())
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+            return sum(len(intents) for intents in batch.values())
+
+    def _start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None:
+                atexit.register(self.flush)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='like-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.LIKE_BUFFER_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered likes')
+            finally:
+                # This thread's connections; the next flush opens fresh ones.
+                connections.close_all()
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,78 @@
+import json
+import resource
+import subprocess
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from main.benchmark import CatalogBenchmark, compare
+from main.catalog_data import generate_catalog
+from main.management.commands.generate_catalog import add_catalog_arguments, catalog_options
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic catalog in a throwaway test database and benchmark every route in '
+            'main.urls: queries per request, latency percentiles and peak memory. Results go to JSON '
+            'and can be compared with an earlier run.')
+
+    def add_arguments(self, parser):
+        add_catalog_arguments(parser, products=5000)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warm', action='store_true', help='Keep the response cache between requests.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON file from an earlier run to compare against.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative latency/memory increase reported as a regression.')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as scratch, \
+                    override_settings(DELETED_ITEMS_DIR=scratch, DELETED_ITEMS_ASYNC=False, MEDIA_ROOT=scratch):
+                started = time.perf_counter()
+                created = generate_catalog(**catalog_options(options))
+                generate_seconds = time.perf_counter() - started
+                report = CatalogBenchmark(iterations=max(options['iterations'], 1), warm=options['warm']).run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report.update({
+            'revision': git_revision(),
+            'catalog': created,
+            'generate_seconds': round(generate_seconds, 2),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        })
+        self.print_report(report)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.print_comparison(compare(json.load(baseline), report, options['threshold']))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    def print_report(self, report):
+        self.stdout.write(f'{"case":<70} {"status":>9} {"queries":>7} {"p50 ms":>8} {"p99 ms":>8} {"peak KB":>9}')
+        for label, row in report['results'].items():
+            status = ','.join(map(str, row['status']))
+            self.stdout.write(f'{label[:70]:<70} {status:>9} {row["queries_mean"]:>7} {row["p50_ms"]:>8} '
+                              f'{row["p99_ms"]:>8} {row["peak_memory_kb"]:>9}')
+        if report['skipped']:
+            self.stdout.write(self.style.WARNING(f'Routes without a benchmark case: {", ".join(report["skipped"])}'))
+
+    def print_comparison(self, rows):
+        regressions = [row for row in rows if row[4]]
+        for label, field, before, after, _ in regressions:
+            self.stdout.write(self.style.ERROR(f'REGRESSION {label} {field}: {before} -> {after}'))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f'No regressions across {len(rows)} compared values'))
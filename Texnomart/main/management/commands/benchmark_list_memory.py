@@ -0,0 +1,36 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from main.benchmark import list_memory
+
+
+class Command(BaseCommand):
+    help = ('Measure the peak memory of one unpaginated product list request, rendered as usual and streamed '
+            'with ?stream=json|ndjson, as a throwaway test database grows. Streamed responses should stay flat.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000],
+                            help='Catalog sizes (products) to measure at.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as scratch, \
+                    override_settings(DELETED_ITEMS_DIR=scratch, DELETED_ITEMS_ASYNC=False, MEDIA_ROOT=scratch,
+                                      THUMBNAIL_ASYNC=False):
+                rows = list_memory(options['sizes'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f'{"products":>9} {"format":<9} {"status":>6} {"queries":>7} {"seconds":>8} {"peak KB":>10}')
+        for row in rows:
+            self.stdout.write(f'{row["products"]:>9} {row["format"]:<9} {row["status"]:>6} {row["queries"]:>7} '
+                              f'{row["seconds"]:>8} {row["peak_memory_kb"]:>10}')
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(rows, output, indent=2)
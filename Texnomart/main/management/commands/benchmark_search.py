@@ -0,0 +1,87 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from main.catalog_data import WORDS
+from main.models import Category, Product
+from main.search import FTS5Backend, InMemoryBackend, fts5_available
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Measure product search latency per backend against growing synthetic catalogs. '
+            'Runs in a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = self.run(rng, sorted(options['sizes']), options['queries'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for row in results:
+            self.stdout.write(
+                f"{row['backend']:>6} {row['products']:>8} products  index {row['index_seconds']:7.2f}s  "
+                f"p50 {row['p50_ms']:7.2f}ms  p95 {row['p95_ms']:7.2f}ms  p99 {row['p99_ms']:7.2f}ms"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def run(self, rng, sizes, query_count):
+        categories = Category.objects.bulk_create(
+            [Category(title=f'{word.title()} {i}', slug=f'{word}-{i}') for i, word in enumerate(WORDS[:12])]
+        )
+        Category.objects.filter(pk__in=[category.pk for category in categories]).rebuild_paths()
+        backends = [InMemoryBackend()]
+        if fts5_available():
+            backends.insert(0, FTS5Backend())
+
+        results = []
+        for size in sizes:
+            missing = size - Product.objects.count()
+            Product.objects.bulk_create([
+                Product(name=' '.join(rng.sample(WORDS, 3)), description=' '.join(rng.choices(WORDS, k=20)),
+                        category=rng.choice(categories), price=rng.randint(1, 10000))
+                for _ in range(missing)
+            ], batch_size=2000)
+
+            queries = [(' '.join(rng.sample(WORDS, rng.randint(1, 2))), rng.random() < 0.5)
+                       for _ in range(query_count)]
+            for backend in backends:
+                started = time.perf_counter()
+                backend.rebuild()
+                index_seconds = time.perf_counter() - started
+
+                timings = []
+                for query, prefix in queries:
+                    if prefix:
+                        query = query[:max(2, len(query) - 3)]
+                    started = time.perf_counter()
+                    backend.search(query, prefix=prefix, limit=20)
+                    timings.append((time.perf_counter() - started) * 1000)
+                results.append({
+                    'backend': backend.name,
+                    'products': size,
+                    'queries': query_count,
+                    'index_seconds': round(index_seconds, 3),
+                    'mean_ms': round(statistics.mean(timings), 3),
+                    'p50_ms': round(percentile(timings, 0.50), 3),
+                    'p95_ms': round(percentile(timings, 0.95), 3),
+                    'p99_ms': round(percentile(timings, 0.99), 3),
+                })
+        return results
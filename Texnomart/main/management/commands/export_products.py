@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from main.bulk import FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Stream all products (with images and attributes) to CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (defaults to stdout).')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['format'], chunk_size=options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
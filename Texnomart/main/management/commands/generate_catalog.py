@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.catalog_data import generate_catalog
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic catalog (categories, products, images, attributes, comments, likes).'
+
+    def add_arguments(self, parser):
+        add_catalog_arguments(parser)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = generate_catalog(**catalog_options(options))
+        summary = ', '.join(f'{count} {name}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary} in {time.perf_counter() - started:.1f}s'))
+
+
+def add_catalog_arguments(parser, products=10000):
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--products', type=int, default=products)
+    parser.add_argument('--images', type=int, default=3, help='Average images per product.')
+    parser.add_argument('--attributes', type=int, default=5, help='Average attributes per product.')
+    parser.add_argument('--comments', type=int, default=3, help='Average comments per product.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--likes', type=int, default=10, help='Average liked products per user.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=2000)
+
+
+def catalog_options(options):
+    return {name: options[name] for name in ('categories', 'products', 'images', 'attributes', 'comments', 'users',
+                                             'likes', 'seed', 'batch_size')}
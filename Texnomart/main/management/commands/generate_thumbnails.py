@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Category, Product, Image
+from main.thumbnails import generate, missing
+
+
+class Command(BaseCommand):
+    help = 'Render missing thumbnail/WebP derivatives for every stored category, product and gallery image.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist.')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Category, Product, Image):
+            names.update(model.objects.exclude(image='').exclude(image=None).values_list('image', flat=True))
+
+        rendered = failed = 0
+        for name in sorted(names):
+            if not options['force'] and not missing(name):
+                continue
+            try:
+                if generate(name):
+                    rendered += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'{name}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Rendered derivatives for {rendered} images ({failed} failed)'))
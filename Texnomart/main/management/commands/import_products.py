@@ -0,0 +1,36 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from main.bulk import FORMATS, ProductImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import products (with images and attributes) from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--checkpoint', help='Checkpoint file (defaults to <path>.checkpoint).')
+        parser.add_argument('--resume', action='store_true', help='Skip the rows committed by a previous run.')
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help='Reject rows whose category slug does not exist instead of creating it.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+
+        importer = ProductImporter(batch_size=options['batch_size'], checkpoint=checkpoint,
+                                   create_categories=not options['no_create_categories'])
+        with open(path, newline='', encoding='utf-8') as stream:
+            report = importer.run(read_rows(stream, file_format), resume=options['resume'])
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        self.stdout.write(json.dumps(report.as_dict(), indent=2, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.processed} rows at {report.rows_per_second:.0f} rows/sec'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importtime import BOOT_TIME_BUDGET, aggregate, profile_boot
+
+
+class Command(BaseCommand):
+    help = ('Boot a worker (WSGI handler and URLconf) in a fresh interpreter under -X importtime and report '
+            'the import cost per installed app, Django, the standard library and other packages.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Boots to measure; the fastest is reported.')
+        parser.add_argument('--top', type=int, default=10, help='Also list the N slowest single modules.')
+        parser.add_argument('--budget', type=float, default=BOOT_TIME_BUDGET,
+                            help='Fail when the fastest boot takes longer than this many seconds.')
+
+    def handle(self, *args, **options):
+        seconds, modules, imports = min((profile_boot() for _ in range(max(options['runs'], 1))),
+                                        key=lambda run: run[0])
+
+        self.stdout.write(f'{"group":<32} {"modules":>7} {"self ms":>9}')
+        for group, count, self_us in aggregate(imports):
+            self.stdout.write(f'{group:<32} {count:>7} {self_us / 1000:>9.1f}')
+        if options['top']:
+            self.stdout.write(f'\n{"module":<48} {"self ms":>9} {"cumul ms":>9}')
+            for name, self_us, cumulative_us in sorted(imports, key=lambda row: row[1], reverse=True)[:options['top']]:
+                self.stdout.write(f'{name:<48} {self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}')
+
+        summary = f'Boot took {seconds:.3f}s with {len(modules)} modules loaded (budget {options["budget"]:.3f}s).'
+        if seconds > options['budget']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
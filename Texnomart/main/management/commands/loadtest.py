@@ -0,0 +1,146 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+
+from main.models import Category, Product
+
+PREFIX = '/texnomart-uz/'
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed):
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'p50_ms': round(percentile(ms, 50), 2),
+        'p99_ms': round(percentile(ms, 99), 2),
+        'mean_ms': round(statistics.fmean(ms), 2) if ms else 0.0,
+        'rps': round((len(latencies) + errors) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare p50/p99 latency of the catalog read endpoints between the WSGI and ASGI stacks. '
+            'Against running servers with --wsgi-url/--asgi-url, or in-process through the Django '
+            'handlers when no URLs are given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', help='Base URL of a WSGI deployment, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--asgi-url', help='Base URL of an ASGI deployment, e.g. http://127.0.0.1:8001')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and stack.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to hit (repeatable). Defaults to the catalog read endpoints.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        if bool(options['wsgi_url']) != bool(options['asgi_url']):
+            raise CommandError('Pass both --wsgi-url and --asgi-url, or neither for an in-process run.')
+        paths = options['paths'] or self.default_paths()
+        total, concurrency = max(options['requests'], 1), max(options['concurrency'], 1)
+
+        if options['wsgi_url']:
+            stacks = {
+                'wsgi': lambda path: self.run_http(options['wsgi_url'] + path, total, concurrency),
+                'asgi': lambda path: self.run_http(options['asgi_url'] + path, total, concurrency),
+            }
+        else:
+            stacks = {
+                'wsgi': lambda path: self.run_wsgi(path, total, concurrency),
+                'asgi': lambda path: async_to_sync(self.run_asgi)(path, total, concurrency),
+            }
+
+        results = {}
+        self.stdout.write(f'{"endpoint":<45} {"stack":<5} {"p50 ms":>8} {"p99 ms":>8} {"rps":>8} {"errors":>6}')
+        for path in paths:
+            results[path] = {}
+            for name, run in stacks.items():
+                stats = run(path)
+                results[path][name] = stats
+                self.stdout.write(f'{path:<45} {name:<5} {stats["p50_ms"]:>8} {stats["p99_ms"]:>8} '
+                                  f'{stats["rps"]:>8} {stats["errors"]:>6}')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'requests': total, 'concurrency': concurrency, 'results': results}, output, indent=2)
+
+    def default_paths(self):
+        paths = [PREFIX, f'{PREFIX}categories/', f'{PREFIX}attribute-key/?page_size=50']
+        category = Category.objects.order_by('pk').values_list('slug', flat=True).first()
+        if category:
+            paths.append(f'{PREFIX}category/{category}/?page_size=20')
+        product_id = Product.objects.order_by('pk').values_list('pk', flat=True).first()
+        if product_id:
+            paths.append(f'{PREFIX}product/detail/{product_id}/')
+        return paths
+
+    @staticmethod
+    def run_http(url, total, concurrency):
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                return time.perf_counter() - started, response.status >= 400
+            except (urllib.error.URLError, OSError):
+                return time.perf_counter() - started, True
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(fetch, range(total)))
+        return summarize([latency for latency, failed in samples if not failed],
+                         sum(failed for _, failed in samples), time.perf_counter() - started)
+
+    @staticmethod
+    def run_wsgi(path, total, concurrency):
+        # A thread per concurrent client, as a threaded WSGI server would use.
+        local = threading.local()
+
+        def fetch(_):
+            client = getattr(local, 'client', None) or Client()
+            local.client = client
+            started = time.perf_counter()
+            status = client.get(path).status_code
+            return time.perf_counter() - started, status >= 400
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            samples = [fetch(i) for i in range(total)]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(fetch, range(total)))
+        return summarize([latency for latency, failed in samples if not failed],
+                         sum(failed for _, failed in samples), time.perf_counter() - started)
+
+    @staticmethod
+    async def run_asgi(path, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch():
+            async with semaphore:
+                started = time.perf_counter()
+                status = (await client.get(path)).status_code
+                return time.perf_counter() - started, status >= 400
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(fetch() for _ in range(total)))
+        return summarize([latency for latency, failed in samples if not failed],
+                         sum(failed for _, failed in samples), time.perf_counter() - started)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute Product.comment_count, rating_sum and rating_count from the comment table.'
+
+    def handle(self, *args, **options):
+        updated = Product.objects.rebuild_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} products'))
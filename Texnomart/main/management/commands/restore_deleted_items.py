@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.archive import read_archive
+from main.models import PATH_SEPARATOR, Category, Product
+
+# Restore order: parents before the rows that reference them (and parent
+# categories before their subcategories, see depth()).
+MODELS = {'category': Category, 'product': Product}
+
+
+def depth(item):
+    (item_type, pk), record = item
+    return record['data'].get('path', '').count(PATH_SEPARATOR), item_type, pk
+
+
+class Command(BaseCommand):
+    help = 'Recreate deleted categories and products from the deleted item archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=list(MODELS), help='Only restore items of this type.')
+        parser.add_argument('--id', type=int, action='append', dest='ids', help='Only restore this id (repeatable).')
+        parser.add_argument('--dir', help='Archive directory (defaults to DELETED_ITEMS_DIR).')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        latest = {}
+        for record in read_archive(options['dir']):
+            item_type, item_id = record['type'], int(record['id'])
+            if item_type not in MODELS:
+                continue
+            if options['type'] and item_type != options['type']:
+                continue
+            if options['ids'] and item_id not in options['ids']:
+                continue
+            latest[item_type, item_id] = record
+
+        restored = 0
+        with transaction.atomic():
+            for item_type, model in MODELS.items():
+                for (record_type, pk), record in sorted(latest.items(), key=depth):
+                    if record_type == item_type and self.restore(model, pk, record['data'], options['dry_run']):
+                        restored += 1
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        verb = 'Would restore' if options['dry_run'] else 'Restored'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {restored} items'))
+
+    def restore(self, model, pk, data, dry_run):
+        if model.objects.filter(pk=pk).exists():
+            self.stdout.write(f'Skipping {model.__name__} {pk}: already exists')
+            return False
+
+        fields = {field.attname for field in model._meta.concrete_fields}
+        data = {key: value for key, value in data.items() if key in fields}
+        if model is Category:
+            if Category.objects.filter(slug=data.get('slug')).exists():
+                self.stderr.write(f'Skipping category {pk}: slug {data.get("slug")!r} is taken')
+                return False
+            if data.get('parent_id') and not Category.objects.filter(pk=data['parent_id']).exists():
+                self.stderr.write(f'Skipping category {pk}: parent {data["parent_id"]} does not exist')
+                return False
+        if model is Product:
+            if not Category.objects.filter(pk=data.get('category_id')).exists():
+                self.stderr.write(f'Skipping product {pk}: category {data.get("category_id")} does not exist')
+                return False
+            # Comments, likes and attribute rows were deleted with the product.
+            data.update(comment_count=0, rating_sum=0, rating_count=0, like_count=0, attribute_data=[])
+
+        created_at = data.pop('created_at', None)
+        data.pop('updated_at', None)
+        model(**data).save(force_insert=True)
+        if created_at:
+            model.objects.filter(pk=pk).update(created_at=created_at)
+        if dry_run:
+            self.stdout.write(f'Would restore {model.__name__} {pk}')
+        return True
@@ -0,0 +1,35 @@
+import os
+import sqlite3
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the SQLite primary database over the SQLite replicas in DATABASE_REPLICA_PATHS '
+            '(or the given paths), standing in for replication in local testing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Replica files to write instead of DATABASE_REPLICA_PATHS.')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('The primary database is not SQLite.')
+        paths = [Path(path).resolve() for path in options['paths']] or settings.DATABASE_REPLICA_PATHS
+        if not paths:
+            raise CommandError('No replica paths; set DATABASE_REPLICA_PATHS or pass them as arguments.')
+
+        primary.ensure_connection()
+        for path in paths:
+            # Back up next to the replica and swap it in, so readers never see a half-written file.
+            partial = path.with_name(path.name + '.partial')
+            target = sqlite3.connect(partial)
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            os.replace(partial, path)
+            self.stdout.write(self.style.SUCCESS(f'Copied {primary.settings_dict["NAME"]} to {path}'))
@@ -0,0 +1,195 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('main.metrics.slow')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_current = contextvars.ContextVar('request_sample', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value, as Prometheus expects."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((label, list(counts), total) for label, (counts, total) in self._series.items())
+        for label, counts, total in series:
+            running = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                running += count
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound}"}} {running}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {running}')
+        return lines
+
+
+REQUEST_DURATION = Histogram('catalog_request_duration_seconds', 'Wall time per request.', DURATION_BUCKETS)
+DB_QUERIES = Histogram('catalog_db_queries', 'SQL queries per request.', QUERY_BUCKETS)
+DB_DURATION = Histogram('catalog_db_duration_seconds', 'Time spent in SQL per request.', DURATION_BUCKETS)
+SERIALIZE_DURATION = Histogram('catalog_serialize_duration_seconds',
+                               'DRF view and render time per request, excluding SQL.', DURATION_BUCKETS)
+RESPONSE_SIZE = Histogram('catalog_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZE_DURATION, RESPONSE_SIZE)
+
+
+class RequestSample:
+    __slots__ = ('started', 'queries', 'db_time', 'serialize_time', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = None
+        self.statements = []
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if len(self.statements) < settings.METRICS_SLOW_SQL_LIMIT:
+            self.statements.append((duration, sql))
+
+    def add_serialize_time(self, duration):
+        self.serialize_time = (self.serialize_time or 0.0) + max(duration, 0.0)
+
+
+def current_sample():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.add_query(sql, time.perf_counter() - started)
+
+
+def install(connection):
+    # Permanent and cheap: without an active sample it is a single ContextVar lookup.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(install_on_connect)
+
+
+def begin_sample():
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+    sample = RequestSample()
+    return _current.set(sample), sample
+
+
+def end_sample(token):
+    _current.reset(token)
+
+
+def record_sample(request, response, sample):
+    duration = time.perf_counter() - sample.started
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name if match else None) or 'unmatched'
+
+    REQUEST_DURATION.observe(view, duration)
+    DB_QUERIES.observe(view, sample.queries)
+    DB_DURATION.observe(view, sample.db_time)
+    if sample.serialize_time is not None:
+        SERIALIZE_DURATION.observe(view, sample.serialize_time)
+    if not response.streaming:
+        RESPONSE_SIZE.observe(view, len(response.content))
+    elif response.has_header('Content-Length'):
+        RESPONSE_SIZE.observe(view, int(response['Content-Length']))
+
+    threshold = settings.METRICS_SLOW_REQUEST_SECONDS
+    if threshold is not None and duration >= threshold:
+        statements = sorted(sample.statements, key=lambda statement: -statement[0])
+        logger.warning(
+            'Slow request %s %s (%s): %.3fs, %d queries in %.3fs\n%s',
+            request.method, request.get_full_path(), view, duration, sample.queries, sample.db_time,
+            '\n'.join(f'  {statement_time * 1000:.1f}ms  {sql}' for statement_time, sql in statements),
+        )
+
+
+class MetricsMixin:
+    """
+    For DRF views: time from the end of ``initial()`` (auth, throttling)
+    until the response is rendered, minus SQL, as serialization time.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        sample = _current.get()
+        if sample is not None:
+            self._metrics_mark = (time.perf_counter(), sample.db_time)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        sample = _current.get()
+        mark = getattr(self, '_metrics_mark', None)
+        if sample is None or mark is None:
+            return response
+        started, db_time = mark
+        sample.add_serialize_time(time.perf_counter() - started - (sample.db_time - db_time))
+
+        render = getattr(response, 'render', None)
+        if render is not None and not getattr(response, 'is_rendered', True):
+            def timed_render():
+                render_started, render_db = time.perf_counter(), sample.db_time
+                try:
+                    return render()
+                finally:
+                    sample.add_serialize_time(time.perf_counter() - render_started - (sample.db_time - render_db))
+            response.render = timed_render
+        return response
+
+
+def exposition():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's histograms."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,121 @@
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from . import replicas
+from .metrics import begin_sample, end_sample, record_sample
+
+
+class ASGIURLConfMiddleware:
+    """Route requests that arrive through ASGI with ASGI_ROOT_URLCONF instead of ROOT_URLCONF."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.route(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.route(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def route(request):
+        if isinstance(request, ASGIRequest) and settings.ASGI_ROOT_URLCONF:
+            request.urlconf = settings.ASGI_ROOT_URLCONF
+
+
+class MetricsMiddleware:
+    """
+    Record duration, SQL count/time, serialization time and response size
+    for a METRICS_SAMPLE_RATE fraction of requests, per resolved view name.
+
+    Unsampled requests cost one random() call. SQL is counted through a
+    connection execute wrapper that reads the sample from a ContextVar, so
+    queries run by async views on other threads are attributed as well.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        token, sample = begin_sample()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_sample(token)
+        record_sample(request, response, sample)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        token, sample = begin_sample()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_sample(token)
+        record_sample(request, response, sample)
+        return response
+
+    @staticmethod
+    def sampled():
+        rate = settings.METRICS_SAMPLE_RATE
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track per request whether it wrote to the database (main.replicas), and
+    pin clients that did to the primary for REPLICA_PIN_SECONDS. A no-op
+    without DATABASE_REPLICAS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        token, routing = replicas.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.end_request(token)
+        return replicas.remember_writes(request, response, routing)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        token, routing = replicas.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.end_request(token)
+        if not routing.wrote:
+            return response
+        # request.user may still be a lazy session lookup.
+        return await sync_to_async(replicas.remember_writes)(request, response, routing)
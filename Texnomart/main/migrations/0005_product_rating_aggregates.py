@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def rebuild_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    Comment = apps.get_model('main', 'Comment')
+    comments = Comment.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        comment_count=Coalesce(Subquery(comments.annotate(n=Count('pk')).values('n')), 0),
+        rating_sum=Coalesce(Subquery(comments.annotate(s=Sum('rating')).values('s')), 0),
+        rating_count=Coalesce(Subquery(comments.annotate(n=Count('rating')).values('n')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_alter_product_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(rebuild_rating_aggregates, migrations.RunPython.noop),
+    ]
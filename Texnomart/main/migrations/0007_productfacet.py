@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_facets(apps, schema_editor):
+    ProductAttribute = apps.get_model('main', 'ProductAttribute')
+    ProductFacet = apps.get_model('main', 'ProductFacet')
+    attributes = ProductAttribute.objects.filter(
+        product__isnull=False, attr_key__isnull=False, attr_value__isnull=False,
+    ).values_list('pk', 'product_id', 'attr_key__key_name', 'attr_value__value_name')
+    ProductFacet.objects.bulk_create([
+        ProductFacet(attribute_id=pk, product_id=product_id, key=key or '', value=value or '')
+        for pk, product_id, key, value in attributes.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_product_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('value', models.CharField(max_length=255)),
+                ('attribute', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='facet', to='main.productattribute')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'value', 'product'], name='main_produc_key_6b6364_idx'), models.Index(fields=['product', 'key', 'value'], name='main_produc_product_eb6cc3_idx')],
+            },
+        ),
+        migrations.RunPython(build_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+TABLE = 'main_product_search'
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 only exists on SQLite; other databases use the in-process index in main.search.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            f"name, description, category, attributes, "
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        return
+
+    Product = apps.get_model('main', 'Product')
+    ProductAttribute = apps.get_model('main', 'ProductAttribute')
+    values = defaultdict(list)
+    for product_id, value in ProductAttribute.objects.values_list('product_id', 'attr_value__value_name'):
+        if value:
+            values[product_id].append(value)
+    rows = [
+        (pk, name, description, category or '', ' '.join(values[pk]))
+        for pk, name, description, category in Product.objects.values_list(
+            'pk', 'name', 'description', 'category__title')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, description, category, attributes) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_productfacet'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:59
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=main.storage.HashedUploadTo('image/category')),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='file',
+            field=models.FileField(blank=True, null=True, upload_to=main.storage.HashedUploadTo('image/comments', field='file')),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=main.storage.HashedUploadTo('image/product')),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=main.storage.HashedUploadTo('image/product')),
+        ),
+    ]
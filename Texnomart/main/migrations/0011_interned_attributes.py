@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def dedupe_names(apps, schema_editor):
+    # Keep the lowest id for every name and point ProductAttribute rows at it.
+    ProductAttribute = apps.get_model('main', 'ProductAttribute')
+    for model_name, field, fk in (('AttributeKey', 'key_name', 'attr_key'),
+                                  ('AttributeValue', 'value_name', 'attr_value')):
+        model = apps.get_model('main', model_name)
+        canonical, duplicates = {}, defaultdict(list)
+        for pk, name in model.objects.order_by('pk').values_list('pk', field):
+            if name in canonical:
+                duplicates[canonical[name]].append(pk)
+            else:
+                canonical[name] = pk
+        for keep, others in duplicates.items():
+            ProductAttribute.objects.filter(**{f'{fk}_id__in': others}).update(**{f'{fk}_id': keep})
+            model.objects.filter(pk__in=others).delete()
+
+
+def timestamp(value):
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def fill_attribute_data(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    ProductAttribute = apps.get_model('main', 'ProductAttribute')
+    blobs = defaultdict(list)
+    for product_id, key_id, value_id, created_at, updated_at in ProductAttribute.objects.filter(
+            product__isnull=False).order_by('pk').values_list(
+            'product_id', 'attr_key_id', 'attr_value_id', 'created_at', 'updated_at'):
+        blobs[product_id].append([key_id, value_id, timestamp(created_at), timestamp(updated_at)])
+    Product.objects.bulk_update([Product(pk=pk, attribute_data=data) for pk, data in blobs.items()],
+                                ['attribute_data'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_hashed_upload_names'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='attributekey',
+            name='key_name',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='attributevalue',
+            name='value_name',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='attribute_data',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(fill_attribute_data, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:31
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def rebuild_like_counts(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    likes = Product.users_like.through.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(like_count=Coalesce(Subquery(likes.annotate(n=Count('pk')).values('n')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_comment_product_rating_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_liked_price_idx',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='is_liked',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='like_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(rebuild_like_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['like_count', 'id'], name='product_like_count_id_idx'),
+        ),
+    ]
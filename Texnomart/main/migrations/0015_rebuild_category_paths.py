@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def rebuild_paths(apps, schema_editor):
+    # Categories bulk-created by the importer after 0014 were left without a path.
+    Category = apps.get_model('main', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    paths = {}
+
+    def path_of(pk):
+        if pk not in paths:
+            parent_id = parents[pk]
+            paths[pk] = (path_of(parent_id) if parent_id else '') + f'{pk}/'
+        return paths[pk]
+
+    changed = [category for category in Category.objects.only('pk', 'path') if category.path != path_of(category.pk)]
+    for category in changed:
+        category.path = paths[category.pk]
+    Category.objects.bulk_update(changed, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_category_tree'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_paths, migrations.RunPython.noop),
+    ]
@@ -1,45 +1,224 @@
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, Concat, RowNumber, Substr
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .storage import HashedUploadTo
+
+
+# Materialized paths are the ids from the root down to a category, each
+# followed by PATH_SEPARATOR: "1/5/12/".
+PATH_SEPARATOR = '/'
+
+
+def subtree_bounds(path):
+    """``(low, high)``: exactly ``path`` and the paths below it sort in ``[low, high)``."""
+    if not path:
+        # '' would become a range over every unset path; rebuild_paths() first.
+        raise ValueError('Category path is not set.')
+    # Every path ends with the separator, and nothing outside the subtree sorts
+    # between it and the character after it.
+    return path, path[:-1] + chr(ord(PATH_SEPARATOR) + 1)
+
+
+class CategoryQuerySet(models.QuerySet):
+    def subtree(self, path):
+        """The category with materialized ``path`` and its descendants, as one range on the path index."""
+        low, high = subtree_bounds(path)
+        return self.filter(path__gte=low, path__lt=high)
+
+    def with_descendants(self):
+        """These categories and every category below them."""
+        ranges = Q(pk__in=[])
+        for low, high in map(subtree_bounds, self.values_list('path', flat=True)):
+            ranges |= Q(path__gte=low, path__lt=high)
+        return Category.objects.filter(ranges)
+
+    def rebuild_paths(self):
+        """Recompute ``path`` from the parent links, e.g. after bulk_create (which skips save())."""
+        parents = dict(Category.objects.values_list('pk', 'parent_id'))
+        paths = {}
+
+        def path_of(pk):
+            if pk not in paths:
+                parent_id = parents[pk]
+                paths[pk] = (path_of(parent_id) if parent_id else '') + f'{pk}{PATH_SEPARATOR}'
+            return paths[pk]
+
+        categories = list(self.only('pk', 'path'))
+        changed = [category for category in categories if category.path != path_of(category.pk)]
+        for category in changed:
+            category.path = paths[category.pk]
+        Category.objects.bulk_update(changed, ['path'])
+        return len(changed)
+
 
 class Category(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
-    image = models.ImageField(upload_to='image/category/%Y/%m/%d/', null=True, blank=True)
-
+    image = models.ImageField(upload_to=HashedUploadTo('image/category'), null=True, blank=True)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    # Materialized path (see PATH_SEPARATOR), kept in step with ``parent`` by save().
+    path = models.CharField(max_length=255, blank=True, default='', editable=False)
+
+    objects = CategoryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Subtree ranges (CategoryQuerySet.subtree, ProductQuerySet.in_category).
+            models.Index(fields=['path'], name='category_path_idx'),
+        ]
+
+    def lineage(self):
+        """This category and its ancestors, walking the parent links (not ``path``)."""
+        category = self
+        while category is not None:
+            yield category
+            category = category.parent if category.parent_id else None
+
+    def placed_under(self, parent):
+        """True when ``parent`` is this category or one of its descendants."""
+        return self.pk is not None and parent is not None and any(c.pk == self.pk for c in parent.lineage())
+
+    def clean(self):
+        if self.parent_id and self.placed_under(self.parent):
+            raise ValidationError({'parent': 'A category cannot be placed under itself or its descendants.'})
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        super(Category, self).save(*args, **kwargs)
+        with transaction.atomic():
+            if self.parent_id and self.placed_under(self.parent):
+                raise ValueError('A category cannot be placed under itself or its descendants.')
+            # The stored path, not the in-memory one, which may be stale.
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() \
+                if self.pk is not None else None
+            if self.pk is not None:
+                self.path = self._path_under_parent()
+                if kwargs.get('update_fields') is not None and old_path is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'path'}
+            super(Category, self).save(*args, **kwargs)
+            path = self._path_under_parent()
+            if path != self.path:
+                # Just inserted: the id is only known now.
+                Category.objects.filter(pk=self.pk).update(path=path)
+                self.path = path
+            if old_path and old_path != path:
+                # Moved: carry the descendants along.
+                Category.objects.subtree(old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                )
+
+    def _path_under_parent(self):
+        parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).get() \
+            if self.parent_id else ''
+        return f'{parent_path}{self.pk}{PATH_SEPARATOR}'
 
     def __str__(self):
         return self.title
 
 
+class ProductQuerySet(models.QuerySet):
+    def in_category(self, path):
+        """Products of the category with materialized ``path`` and all its descendants, in one query."""
+        low, high = subtree_bounds(path)
+        return self.filter(category__path__gte=low, category__path__lt=high)
+
+    def with_related(self):
+        """Load everything ProductSerializer reads in a fixed number of queries."""
+        # Attributes are rendered from ``attribute_data``, so they need no prefetch.
+        return self.with_comment_preview().prefetch_related('images')
+
+    def with_comment_preview(self, size=None):
+        """
+        Prefetch each product's latest ``size`` (COMMENT_PREVIEW_SIZE) comments
+        into ``comment_preview`` with one windowed query for the whole page.
+        """
+        size = settings.COMMENT_PREVIEW_SIZE if size is None else size
+        latest = Comment.objects.annotate(
+            position=Window(RowNumber(), partition_by=F('product_id'),
+                            order_by=[F('created_at').desc(), F('pk').desc()]),
+        ).filter(position__lte=size).order_by('-created_at', '-pk')
+        return self.prefetch_related(Prefetch('comments', queryset=latest, to_attr='comment_preview'))
+
+    def with_primary_image(self):
+        """Prefetch each product's primary image(s) into ``primary_images`` with one extra query."""
+        return self.prefetch_related(
+            Prefetch('images', queryset=Image.objects.filter(is_primary=True).order_by('pk'), to_attr='primary_images')
+        )
+
+    def rebuild_rating_aggregates(self):
+        """Recompute the denormalized comment/rating columns in one UPDATE."""
+        comments = Comment.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        return self.update(
+            comment_count=Coalesce(Subquery(comments.annotate(n=Count('pk')).values('n')), 0),
+            rating_sum=Coalesce(Subquery(comments.annotate(s=Sum('rating')).values('s')), 0),
+            rating_count=Coalesce(Subquery(comments.annotate(n=Count('rating')).values('n')), 0),
+        )
+
+    def rebuild_like_counts(self):
+        """Recompute the denormalized like_count column in one UPDATE."""
+        likes = self.model.users_like.through.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        return self.update(like_count=Coalesce(Subquery(likes.annotate(n=Count('pk')).values('n')), 0))
+
+
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     description = models.TextField()
-    image = models.ImageField(upload_to='image/product/%Y/%m/%d/', null=True, blank=True)
+    image = models.ImageField(upload_to=HashedUploadTo('image/product'), null=True, blank=True)
     price = models.FloatField()
-    is_liked = models.BooleanField(default=False)
     users_like = models.ManyToManyField(User, related_name='liked_products', blank=True)
+    # Rows in users_like, kept in step by main.likes (buffered likes) and signals.
+    like_count = models.IntegerField(default=0)
     comment_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    # ``[[key_id, value_id, created_at, updated_at], ...]`` mirrored from ProductAttribute by signals
+    # (see main.attributes); names are looked up in the process-local key/value tables.
+    attribute_data = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Category pages filtered/sorted by price (ProductFilter, keyset pagination).
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['category', 'created_at'], name='product_category_created_idx'),
+            # Catalog-wide price ranges and (price, id) / (created_at, id) keyset pages.
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            # ?ordering=-like_count ("most liked") keyset pages.
+            models.Index(fields=['like_count', 'id'], name='product_like_count_id_idx'),
+        ]
+
+    @property
+    def avg_rating(self):
+        if not self.rating_count:
+            return 0
+        return self.rating_sum / self.rating_count
+
     def __str__(self):
         return self.name
 
 
 class Image(models.Model):
-    image = models.ImageField(upload_to='image/product/%Y/%m/%d/', null=True, blank=True)
+    image = models.ImageField(upload_to=HashedUploadTo('image/product'), null=True, blank=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, related_name='images')
     is_primary = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'is_primary'], name='image_product_primary_idx'),
+        ]
+
 
 
 
@@ -73,7 +252,7 @@ class Comment(models.Model):
         FIVE = 5
 
     message = models.TextField(null=True, blank=True)
-    file = models.FileField(upload_to='image/comments/%Y/%m/%d/', null=True, blank=True)
+    file = models.FileField(upload_to=HashedUploadTo('image/comments', field='file'), null=True, blank=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='comments')
     rating = models.PositiveSmallIntegerField(choices=RatingChoices.choices, default=RatingChoices.ZERO.value,
@@ -82,13 +261,20 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='comment_product_created_idx'),
+            # ?ordering=rating on the per-product comments endpoint.
+            models.Index(fields=['product', 'rating'], name='comment_product_rating_idx'),
+        ]
+
     def __str__(self):
         return self.message
 
 
 
 class AttributeKey(models.Model):
-    key_name = models.CharField(max_length=255, null=True, blank=True)
+    key_name = models.CharField(max_length=255, unique=True, null=True, blank=True)
 
 
     def __str__(self):
@@ -96,7 +282,7 @@ class AttributeKey(models.Model):
 
 
 class AttributeValue(models.Model):
-    value_name = models.CharField(max_length=255, null=True, blank=True)
+    value_name = models.CharField(max_length=255, unique=True, null=True, blank=True)
 
     def __str__(self):
         return self.value_name
@@ -110,6 +296,23 @@ class ProductAttribute(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+class ProductFacet(models.Model):
+    """Denormalized copy of a ProductAttribute's names, indexed for attribute filters and facet counts."""
+    attribute = models.OneToOneField(ProductAttribute, on_delete=models.CASCADE, related_name='facet')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='facets')
+    key = models.CharField(max_length=255)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'value', 'product']),
+            models.Index(fields=['product', 'key', 'value']),
+        ]
+
+    def __str__(self):
+        return f'{self.key}:{self.value}'
+
+
 
 from django.db import models
 from django.contrib.auth.models import User
@@ -125,5 +328,10 @@ class APIKey(models.Model):
             self.key = secrets.token_hex(20)
         super().save(*args, **kwargs)
 
+    def rotate(self):
+        """Replace the key; the old one stops authenticating immediately in this process."""
+        self.key = secrets.token_hex(20)
+        self.save(update_fields=['key'])
+
     def __str__(self):
         return f'{self.user.username} - {self.key}'
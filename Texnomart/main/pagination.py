@@ -0,0 +1,168 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination ordered by ``(<field>, id)``.
+
+    Every page is a single ``WHERE (field, id) > (last_field, last_id) LIMIT n``
+    query, so the cost does not grow with the page depth the way OFFSET does.
+    Pagination is opt-in: without ``cursor`` or ``page_size`` in the query
+    string the view returns the plain, unpaginated list, unless
+    ``paginate_by_default`` is set. Nullable ordering fields sort their
+    NULLs last in either direction.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    ordering_fields = ('created_at', 'price', 'like_count')
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+    paginate_by_default = False
+    nullable = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request):
+        """The sliced queryset for the requested page, or None when pagination was not asked for."""
+        params = request.query_params
+        if (not self.paginate_by_default and self.cursor_query_param not in params
+                and self.page_size_query_param not in params):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        self.field = self.ordering.lstrip('-')
+        self.descending = self.ordering.startswith('-')
+        self.nullable = self.field != 'id' and queryset.model._meta.get_field(self.field).null
+
+        queryset = queryset.order_by(*self.get_order_by())
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.seek(*position))
+
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_param, self.default_ordering)
+        if ordering.lstrip('-') in (*self.ordering_fields, 'id'):
+            return ordering
+        return self.default_ordering
+
+    def get_order_by(self):
+        prefix = '-' if self.descending else ''
+        if self.field == 'id':
+            return [f'{prefix}id']
+        if self.nullable:
+            # Only for nullable fields: NULLS LAST would keep SQLite off the indexes of the others.
+            field = F(self.field)
+            return [field.desc(nulls_last=True) if self.descending else field.asc(nulls_last=True), f'{prefix}id']
+        return [f'{prefix}{self.field}', f'{prefix}id']
+
+    def seek(self, value, pk):
+        op = 'lt' if self.descending else 'gt'
+        if self.field == 'id':
+            return Q(**{f'id__{op}': pk})
+        if value is None:
+            # Already inside the trailing NULLs.
+            return Q(**{f'{self.field}__isnull': True, f'id__{op}': pk})
+        # The leading inclusive bound lets the (field, id) index start the range
+        # at the cursor instead of scanning from the first row.
+        seek = Q(**{f'{self.field}__{op}e': value}) & (Q(**{f'{self.field}__{op}': value}) | Q(**{f'id__{op}': pk}))
+        if self.nullable:
+            seek |= Q(**{f'{self.field}__isnull': True})
+        return seek
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        value = getattr(last, self.field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(value, last.pk))
+
+    def encode_cursor(self, value, pk):
+        payload = json.dumps([self.ordering, value, pk], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            ordering, value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if ordering != self.ordering:
+                raise ValueError
+            if self.field != 'id' and value is not None:
+                value = model._meta.get_field(self.field).to_python(value)
+            return value, int(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class IdKeysetPagination(KeysetPagination):
+    ordering_fields = ()
+    default_ordering = 'id'
+
+
+class CommentKeysetPagination(KeysetPagination):
+    ordering_fields = ('created_at', 'rating')
+    paginate_by_default = True
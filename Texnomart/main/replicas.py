@@ -0,0 +1,162 @@
+import contextvars
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_current = contextvars.ContextVar('read_routing', default=None)
+
+# alias -> time.monotonic() after which a replica that failed to connect is tried again.
+_retry_at = {}
+
+
+class ReadRouting:
+    """Per-request routing state; shared (not copied) by the threads an async view runs queries on."""
+    __slots__ = ('use_replica', 'alias', 'wrote')
+
+    def __init__(self):
+        self.use_replica = False
+        self.alias = None
+        self.wrote = False
+
+    def read_alias(self):
+        if not self.use_replica or self.wrote:
+            return DEFAULT_DB_ALIAS
+        if self.alias is None:
+            # One replica per request, so every read sees the same snapshot.
+            candidates = list(settings.DATABASE_REPLICAS)
+            random.shuffle(candidates)
+            self.alias = next((alias for alias in candidates if available(alias)), DEFAULT_DB_ALIAS)
+        return self.alias
+
+
+def available(alias):
+    """Connect to ``alias``; a replica that cannot be reached is skipped for REPLICA_RETRY_SECONDS."""
+    if _retry_at.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        _retry_at[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        return False
+    _retry_at.pop(alias, None)
+    return True
+
+
+def reset_failures():
+    _retry_at.clear()
+
+
+def begin_request():
+    routing = ReadRouting()
+    return _current.set(routing), routing
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def served_by_replica():
+    routing = _current.get()
+    return routing is not None and routing.alias not in (None, DEFAULT_DB_ALIAS) and not routing.wrote
+
+
+def cache_timeout(timeout):
+    """
+    Cache timeout for a response built in this request. Data read from a
+    replica may lag the primary, so it is not kept past REPLICA_CACHE_TIMEOUT.
+    """
+    return min(timeout, settings.REPLICA_CACHE_TIMEOUT) if served_by_replica() else timeout
+
+
+def read_queryset(queryset):
+    """
+    Bind ``queryset`` to the database this request reads from. Streamed
+    bodies are evaluated after the request, when routing has already ended.
+    """
+    routing = _current.get()
+    return queryset if routing is None else queryset.using(routing.read_alias())
+
+
+def pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pinned(request, user=None):
+    """True while the client of ``request`` must read its own writes from the primary."""
+    if settings.REPLICA_PIN_COOKIE in request.COOKIES:
+        return True
+    return user is not None and user.is_authenticated and cache.get(pin_key(user.pk)) is not None
+
+
+async def apinned(request, user=None):
+    if settings.REPLICA_PIN_COOKIE in request.COOKIES:
+        return True
+    return user is not None and user.is_authenticated and await cache.aget(pin_key(user.pk)) is not None
+
+
+def use_replica():
+    routing = _current.get()
+    if routing is not None:
+        routing.use_replica = True
+
+
+def remember_writes(request, response, routing):
+    """
+    After a request that wrote, pin its client to the primary for
+    REPLICA_PIN_SECONDS: by cookie, and by user id for clients that
+    authenticate with a token or API key and drop cookies.
+    """
+    if not routing.wrote:
+        return response
+    seconds = settings.REPLICA_PIN_SECONDS
+    response.set_cookie(settings.REPLICA_PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        cache.set(pin_key(user.pk), True, seconds)
+    return response
+
+
+class ReplicaRouter:
+    """
+    Send reads to a replica in DATABASE_REPLICAS while a view has called
+    use_replica() (see ReplicaReadMixin) and the request has not written;
+    everything else, and every write, goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is None:
+            return None
+        alias = routing.read_alias()
+        # None keeps Django's default of reading related objects where their instance came from.
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaReadMixin:
+    """For DRF catalog views: serve safe requests from a replica unless the client is pinned."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (settings.DATABASE_REPLICAS and request.method in SAFE_METHODS
+                and not pinned(request, request.user)):
+            use_replica()
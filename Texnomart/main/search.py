@@ -0,0 +1,239 @@
+import bisect
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Product, ProductAttribute
+
+TABLE = 'main_product_search'
+COLUMNS = ('name', 'description', 'category', 'attributes')
+# BM25 column weights, in COLUMNS order: a hit in the name outranks one in the description.
+WEIGHTS = (10.0, 1.0, 3.0, 2.0)
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def documents(product_ids=None, chunk_size=2000):
+    """Yield ``(product_id, name, description, category, attributes)`` for indexing."""
+    products = Product.objects.order_by('pk').values_list('pk', 'name', 'description', 'category__title')
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+
+    chunk = []
+    for row in products.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_attributes(chunk)
+            chunk = []
+    yield from _with_attributes(chunk)
+
+
+def _with_attributes(rows):
+    if not rows:
+        return
+    values = defaultdict(list)
+    attributes = (ProductAttribute.objects.filter(product_id__in=[row[0] for row in rows])
+                  .values_list('product_id', 'attr_value__value_name'))
+    for product_id, value in attributes:
+        if value:
+            values[product_id].append(value)
+    for pk, name, description, category in rows:
+        yield pk, name, description, category or '', ' '.join(values[pk])
+
+
+class FTS5Backend:
+    """SQLite FTS5 virtual table keyed by product id (rowid), ranked with bm25()."""
+
+    name = 'fts5'
+
+    def index(self, docs):
+        rows = list(docs)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, {", ".join(COLUMNS)}) VALUES (%s, %s, %s, %s, %s)', rows
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        batch = []
+        for doc in documents():
+            batch.append(doc)
+            if len(batch) >= 2000:
+                self.index(batch)
+                batch = []
+        self.index(batch)
+
+    def search(self, query, prefix=False, limit=20, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Quote every token so user input can never be read as FTS5 syntax.
+        terms = [f'"{token}"' for token in tokens]
+        if prefix:
+            terms[-1] += '*'
+        weights = ', '.join(str(weight) for weight in WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'ORDER BY bm25({TABLE}, {weights}) LIMIT %s OFFSET %s',
+                [' '.join(terms), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class InMemoryBackend:
+    """
+    Pure-Python inverted index with BM25 ranking, used when FTS5 is not
+    available. It is loaded from the database on first use and then kept
+    up to date by the same signals that feed FTS5 (per process).
+    """
+
+    name = 'python'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.doc_length = {}
+        self._terms = None
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._index(documents())
+                    self._loaded = True
+
+    def rebuild(self):
+        with self._lock:
+            self.postings.clear()
+            self.doc_terms.clear()
+            self.doc_length.clear()
+            self._terms = None
+            self._loaded = False
+        self._ensure_loaded()
+
+    def index(self, docs):
+        # Until the first search loads everything from the database there is nothing to update.
+        if self._loaded:
+            self._index(docs)
+
+    def remove(self, product_ids):
+        if self._loaded:
+            with self._lock:
+                for pk in product_ids:
+                    self._remove(pk)
+
+    def _index(self, docs):
+        with self._lock:
+            for pk, *fields in docs:
+                self._remove(pk)
+                counts = Counter()
+                for weight, text in zip(WEIGHTS, fields):
+                    for token in tokenize(text):
+                        counts[token] += weight
+                for term, frequency in counts.items():
+                    self.postings[term][pk] = frequency
+                self.doc_terms[pk] = counts
+                self.doc_length[pk] = sum(counts.values())
+            self._terms = None
+
+    def _remove(self, pk):
+        for term in self.doc_terms.pop(pk, ()):
+            docs = self.postings[term]
+            docs.pop(pk, None)
+            if not docs:
+                del self.postings[term]
+        self.doc_length.pop(pk, None)
+
+    def _expand(self, token, prefix):
+        if not prefix:
+            return [token] if token in self.postings else []
+        if self._terms is None:
+            self._terms = sorted(self.postings)
+        start = bisect.bisect_left(self._terms, token)
+        end = bisect.bisect_left(self._terms, token + '\uffff')
+        return self._terms[start:end]
+
+    def search(self, query, prefix=False, limit=20, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            total = len(self.doc_length)
+            if not total:
+                return []
+            average = sum(self.doc_length.values()) / total
+            scores = None
+            for position, token in enumerate(tokens):
+                token_scores = defaultdict(float)
+                for term in self._expand(token, prefix and position == len(tokens) - 1):
+                    docs = self.postings[term]
+                    idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for pk, frequency in docs.items():
+                        norm = self.k1 * (1 - self.b + self.b * self.doc_length[pk] / average)
+                        token_scores[pk] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                # Every token has to match, as with FTS5's implicit AND.
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pk: score + token_scores[pk] for pk, score in scores.items() if pk in token_scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            return [pk for pk, _ in ranked[offset:offset + limit]]
+
+
+_fts5 = FTS5Backend()
+_python = InMemoryBackend()
+_fts5_tables = {}
+
+
+def fts5_available():
+    # Checked once per database file instead of introspecting on every call.
+    name = str(connection.settings_dict['NAME'])
+    if name not in _fts5_tables:
+        _fts5_tables[name] = connection.vendor == 'sqlite' and TABLE in connection.introspection.table_names()
+    return _fts5_tables[name]
+
+
+def get_backend():
+    choice = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if choice == 'python':
+        return _python
+    if choice == 'fts5' or fts5_available():
+        return _fts5
+    return _python
+
+
+def search_products(query, prefix=False, limit=20, offset=0):
+    return get_backend().search(query, prefix=prefix, limit=limit, offset=offset)
+
+
+def index_products(product_ids):
+    if product_ids:
+        get_backend().index(documents(product_ids))
+
+
+def remove_products(product_ids):
+    if product_ids:
+        get_backend().remove(product_ids)
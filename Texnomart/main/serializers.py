@@ -1,27 +1,66 @@
-from django.db.models import Avg
+from django.conf import settings
+from django.http import QueryDict
 from rest_framework import serializers
+from .bulk import PRICE_MODES
+from .filters import ProductFilter
 from .models import Category, Product, Image, Comment, ProductAttribute, AttributeKey, AttributeValue
+from .attributes import keys, values, render_attributes
+from .categories import get_category_tree
+from .likes import get_liked_product_ids
+from .thumbnails import thumbnail_urls
 
 
 
 
+def absolute_url(context, url):
+    """Prefix ``url`` with the request's scheme and host, computed once per serializer tree."""
+    request = context.get('request')
+    if request is None or url.startswith(('http://', 'https://')):
+        return url
+    if 'absolute_base_url' not in context:
+        context['absolute_base_url'] = request.build_absolute_uri('/').rstrip('/')
+    return context['absolute_base_url'] + url
+
+
+def thumbnails(context, field_file):
+    """Derivative URLs with width hints; empty until they are generated, so clients fall back to the original."""
+    return [{**thumbnail, 'url': absolute_url(context, thumbnail['url'])} for thumbnail in thumbnail_urls(field_file)]
+
+
 class CategorySerializer(serializers.ModelSerializer):
     full_image_url = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
+    parent = serializers.SlugRelatedField(slug_field='slug', queryset=Category.objects.all(), required=False,
+                                          allow_null=True)
+    breadcrumbs = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ['id', 'title', 'full_image_url', 'slug']
+        fields = ['id', 'title', 'full_image_url', 'thumbnails', 'slug', 'parent', 'breadcrumbs']
 
     def create(self, validated_data):
         return Category.objects.create(**validated_data)
 
+    def validate_parent(self, parent):
+        if self.instance is not None and self.instance.placed_under(parent):
+            raise serializers.ValidationError('A category cannot be placed under itself or its descendants.')
+        return parent
+
+    def get_breadcrumbs(self, instance):
+        """Root-to-category trail from the cached tree (async views put it in the context beforehand)."""
+        if 'category_tree' not in self.context:
+            self.context['category_tree'] = get_category_tree()
+        tree = self.context['category_tree']
+        return tree.breadcrumbs(instance.pk) if instance.pk in tree.nodes else []
+
     def get_full_image_url(self, instance):
         if instance.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(instance.image.url)
+            return absolute_url(self.context, instance.image.url)
         return None
 
+    def get_thumbnails(self, instance):
+        return thumbnails(self.context, instance.image)
+
 
 
 
@@ -45,28 +84,40 @@ class ProductAttributeSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         context = super(ProductAttributeSerializer, self).to_representation(instance)
-        context['key_id'] = instance.attr_key.id
-        context['key_name'] = instance.attr_key.key_name
+        # Names come from the interned tables, so no join on attr_key/attr_value is needed.
+        context['key_id'] = instance.attr_key_id
+        context['key_name'] = keys.name(instance.attr_key_id)
 
-        context['value_id'] = instance.attr_value.id
-        context['value_name'] = instance.attr_value.value_name
+        context['value_id'] = instance.attr_value_id
+        context['value_name'] = values.name(instance.attr_value_id)
         return context
 
 
 class ProductListSerializer(serializers.ModelSerializer):
     primary_image = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'price', 'primary_image']
+        fields = ['id', 'name', 'price', 'primary_image', 'thumbnails']
+
+    def primary_image_instance(self, obj):
+        # Filled by Product.objects.with_primary_image(); fall back to a query otherwise.
+        images = getattr(obj, 'primary_images', None)
+        if images is None:
+            images = obj.images.filter(is_primary=True).order_by('pk')[:1]
+        return images[0] if images else None
 
     def get_primary_image(self, obj):
-        primary_image_instance = obj.images.filter(is_primary=True).first()
+        primary_image_instance = self.primary_image_instance(obj)
         if primary_image_instance and primary_image_instance.image:
-            request = self.context.get('request')
-            return request.build_absolute_uri(primary_image_instance.image.url)
+            return absolute_url(self.context, primary_image_instance.image.url)
         return None
 
+    def get_thumbnails(self, obj):
+        primary_image_instance = self.primary_image_instance(obj)
+        return thumbnails(self.context, primary_image_instance.image) if primary_image_instance else []
+
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -74,10 +125,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
 
     def get_all_images(self, instance):
-        request = self.context.get('request')
-        if instance.images.exists():
-            return [request.build_absolute_uri(image.image.url) for image in instance.images.all()]
-        return []
+        return [absolute_url(self.context, image.image.url) for image in instance.images.all() if image.image]
 
     class Meta:
         model = Product
@@ -99,40 +147,46 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
 
 class ProductSerializer(serializers.ModelSerializer):
-    attributes = ProductAttributeSerializer(many=True,read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    attributes = serializers.SerializerMethodField()
+    comments = serializers.SerializerMethodField()
     all_images = serializers.SerializerMethodField()
     users_like = serializers.SerializerMethodField()
     avg_rating = serializers.SerializerMethodField()
 
+    def get_attributes(self, instance):
+        return render_attributes(instance.attribute_data)
+
+    def get_comments(self, instance):
+        # The latest few only (Product.objects.with_comment_preview()); the rest are paged separately.
+        preview = getattr(instance, 'comment_preview', None)
+        if preview is None:
+            preview = instance.comments.order_by('-created_at', '-pk')[:settings.COMMENT_PREVIEW_SIZE]
+        return CommentSerializer(preview, many=True, context=self.context).data
+
     def get_avg_rating(self, instance):
-        instance = instance.comments.all().aggregate(avg_rating=Avg('rating', default=0))
-        return round(instance['avg_rating'])
+        return round(instance.avg_rating)
 
     def get_users_like(self, product):
-        user = self.context.get('request').user
-        if not user.is_authenticated:
-            return False
-        if user in product.users_like.all():
-            return True
-
-        return False
+        # Resolved once per request; every item of a list shares the root context.
+        if 'liked_product_ids' not in self.context:
+            request = self.context.get('request')
+            self.context['liked_product_ids'] = get_liked_product_ids(request.user if request else None)
+        return product.id in self.context['liked_product_ids']
 
     def get_all_images(self, instance):
-        request = self.context.get('request')
-        if request:
-            images = [request.build_absolute_uri(image.image.url) for image in instance.images.all()]
-            return images
+        if self.context.get('request'):
+            return [absolute_url(self.context, image.image.url) for image in instance.images.all() if image.image]
         return []
 
     def to_representation(self, product):
         context = super(ProductSerializer, self).to_representation(product)
-        context['comments_count'] = product.comments.count()
+        context['comments_count'] = product.comment_count
         return context
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['attribute_data']
+        read_only_fields = ['comment_count', 'rating_sum', 'rating_count', 'like_count']
 
 
 class AttributeKeySerializer(serializers.ModelSerializer):
@@ -147,11 +201,48 @@ class AttributeValueSerializer(serializers.ModelSerializer):
         fields = ['id', 'value_name']
 
 
-
-
-
-
-
-
-
-
+class ProductSelectionSerializer(serializers.Serializer):
+    """
+    Products picked by explicit ``ids`` and/or a ``filter`` object holding
+    ProductFilter parameters (``{"category": "phones", "price_max": 100}``).
+    One of them is required so a bulk operation never hits the whole catalog by accident.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = serializers.DictField(required=False, allow_empty=False)
+
+    def validate(self, attrs):
+        if 'ids' not in attrs and 'filter' not in attrs:
+            raise serializers.ValidationError('Pass "ids", "filter" or both.')
+        queryset = Product.objects.all()
+        if 'ids' in attrs:
+            queryset = queryset.filter(pk__in=attrs['ids'])
+        if 'filter' in attrs:
+            params = QueryDict(mutable=True)
+            for name, value in attrs['filter'].items():
+                params.setlist(name, [str(item) for item in value] if isinstance(value, list) else [str(value)])
+            filterset = ProductFilter(params, queryset=queryset)
+            if not filterset.is_valid():
+                raise serializers.ValidationError({'filter': filterset.errors})
+            queryset = filterset.qs
+        attrs['queryset'] = queryset
+        return attrs
+
+
+class BulkPriceSerializer(ProductSelectionSerializer):
+    mode = serializers.ChoiceField(choices=PRICE_MODES)
+    value = serializers.FloatField()
+
+    def validate(self, attrs):
+        if attrs['mode'] == 'absolute' and attrs['value'] < 0:
+            raise serializers.ValidationError({'value': 'An absolute price cannot be negative.'})
+        if attrs['mode'] == 'percent' and attrs['value'] <= -100:
+            raise serializers.ValidationError({'value': 'A percentage change must be greater than -100.'})
+        return super().validate(attrs)
+
+
+class BulkCategorySerializer(ProductSelectionSerializer):
+    category = serializers.SlugRelatedField(slug_field='slug', queryset=Category.objects.all())
+
+
+class BulkCategoryDeleteSerializer(serializers.Serializer):
+    slugs = serializers.ListField(child=serializers.SlugField(), allow_empty=False)
@@ -1,44 +1,266 @@
-from django.db.models.signals import pre_delete
+from django.db.models import F, QuerySet
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete, m2m_changed
+from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Product, Category
-import os
-import json
-from datetime import datetime
+from django.utils.crypto import get_random_string
+from rest_framework.authtoken.models import Token
+from .models import Product, Category, Comment, Image, ProductAttribute, AttributeKey, AttributeValue, ProductFacet, \
+    APIKey
+from .authentication import forget_user
+from .likes import invalidate_liked_product_ids, refresh_like_counts
+from .archive import archiver
+from . import attributes
+from .facets import sync_facet
+from .search import index_products, remove_products
+from .thumbnails import schedule as schedule_thumbnails
+from .cache import CATALOG, CATEGORIES, bump_versions, category_ns, product_ns
 
-DELETED_ITEMS_DIR = 'deleted_items'
 
-if not os.path.exists(DELETED_ITEMS_DIR):
-    os.makedirs(DELETED_ITEMS_DIR)
+@receiver(pre_delete, sender=Product)
+def save_deleted_product(sender, instance, **kwargs):
+    archiver.archive(instance, 'product')
+
+
+@receiver(pre_delete, sender=Category)
+def save_deleted_category(sender, instance, **kwargs):
+    archiver.archive(instance, 'category')
+
+
+def update_rating_aggregates(old=None, new=None):
+    """Move a comment's contribution from its ``old`` to its ``new`` (product_id, rating) state."""
+    deltas = {}
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        product_id, rating = state
+        count, total, rated = deltas.get(product_id, (0, 0, 0))
+        count += sign
+        if rating is not None:
+            total += sign * rating
+            rated += sign
+        deltas[product_id] = (count, total, rated)
+
+    for product_id, (count, total, rated) in deltas.items():
+        if count or total or rated:
+            Product.objects.filter(pk=product_id).update(
+                comment_count=F('comment_count') + count,
+                rating_sum=F('rating_sum') + total,
+                rating_count=F('rating_count') + rated,
+            )
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_rating(sender, instance, raw=False, **kwargs):
+    instance._rating_state = None
+    if instance.pk and not raw:
+        instance._rating_state = Comment.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_rating_state', None)
+    update_rating_aggregates(old, (instance.product_id, instance.rating))
+
+
+def deleted_with_product(origin):
+    """True when a delete was started on a product/category, so the product itself is going away."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Product, Category)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if deleted_with_product(origin):
+        return
+    update_rating_aggregates((instance.product_id, instance.rating), None)
 
 
-def serialize_datetime(obj):
-    """Convert datetime objects to string format."""
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    raise TypeError("Type not serializable")
+@receiver(m2m_changed, sender=Product.users_like.through)
+def product_likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        related = instance.liked_products if reverse else instance.users_like
+        instance._cleared_like_ids = list(related.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    related_ids = getattr(instance, '_cleared_like_ids', []) if action == 'post_clear' else pk_set or []
+    user_ids, product_ids = ([instance.pk], related_ids) if reverse else (related_ids, [instance.pk])
+    invalidate_liked_product_ids(user_ids)
+    refresh_like_counts(product_ids)
 
 
-def save_deleted_item_to_json(instance, item_type):
-    file_name = f'{DELETED_ITEMS_DIR}/{item_type}_{instance.id}.json'
+@receiver(pre_delete, sender=User)
+def remember_liked_products(sender, instance, **kwargs):
+    instance._liked_product_ids = list(instance.liked_products.values_list('pk', flat=True))
 
-    data = instance.__dict__.copy()
 
-    data.pop('created_at', None)
-    data.pop('updated_at', None)
+@receiver(post_delete, sender=User)
+def recount_liked_products(sender, instance, **kwargs):
+    # The cascade removes the user's likes without m2m_changed.
+    refresh_like_counts(getattr(instance, '_liked_product_ids', []))
 
-    for key, value in data.items():
-        if isinstance(value, datetime):
-            data[key] = value.isoformat()
 
-    with open(file_name, 'w') as file:
-        json.dump(data, file, default=serialize_datetime, indent=4)
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, raw=False, **kwargs):
+    instance._old_category_id = None
+    if instance.pk and not raw:
+        instance._old_category_id = Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def invalidate_saved_product(sender, instance, **kwargs):
+    old_category_id = getattr(instance, '_old_category_id', None) or instance.category_id
+    bump_versions(product_ns(instance.pk), category_ns(instance.category_id), category_ns(old_category_id))
 
 
 @receiver(pre_delete, sender=Product)
-def save_deleted_product(sender, instance, **kwargs):
-    save_deleted_item_to_json(instance, 'product')
+def invalidate_deleted_product(sender, instance, **kwargs):
+    bump_versions(product_ns(instance.pk), category_ns(instance.category_id))
+
+
+@receiver(post_save, sender=Category)
+def invalidate_saved_category(sender, instance, **kwargs):
+    bump_versions(category_ns(instance.pk), CATEGORIES)
 
 
 @receiver(pre_delete, sender=Category)
-def save_deleted_category(sender, instance, **kwargs):
-    save_deleted_item_to_json(instance, 'category')
+def invalidate_deleted_category(sender, instance, **kwargs):
+    bump_versions(category_ns(instance.pk), CATEGORIES)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=ProductAttribute)
+def invalidate_product_detail(sender, instance, **kwargs):
+    if instance.product_id:
+        bump_versions(product_ns(instance.product_id))
+
+
+@receiver([post_save, post_delete], sender=Image)
+def invalidate_product_images(sender, instance, **kwargs):
+    if instance.product_id:
+        category_id = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True).first()
+        bump_versions(product_ns(instance.product_id), category_ns(category_id))
+
+
+@receiver([post_save, post_delete], sender=AttributeKey)
+@receiver([post_save, post_delete], sender=AttributeValue)
+def invalidate_catalog(sender, instance, **kwargs):
+    bump_versions(CATALOG)
+
+
+@receiver(post_save, sender=ProductAttribute)
+def index_product_attribute(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_facet(instance)
+
+
+@receiver(post_save, sender=AttributeKey)
+def intern_attribute_key(sender, instance, **kwargs):
+    attributes.keys.set(instance.pk, instance.key_name)
+
+
+@receiver(post_save, sender=AttributeValue)
+def intern_attribute_value(sender, instance, **kwargs):
+    attributes.values.set(instance.pk, instance.value_name)
+
+
+@receiver(post_delete, sender=AttributeKey)
+def forget_attribute_key(sender, instance, **kwargs):
+    attributes.keys.discard(instance.pk)
+
+
+@receiver(post_delete, sender=AttributeValue)
+def forget_attribute_value(sender, instance, **kwargs):
+    attributes.values.discard(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ProductAttribute)
+def refresh_product_attribute_data(sender, instance, raw=False, origin=None, **kwargs):
+    if instance.product_id and not raw and not deleted_with_product(origin):
+        attributes.refresh_attribute_data([instance.product_id])
+
+
+@receiver(post_save, sender=AttributeKey)
+def rename_facet_key(sender, instance, created, **kwargs):
+    if not created:
+        ProductFacet.objects.filter(attribute__attr_key=instance).update(key=instance.key_name or '')
+
+
+@receiver(post_save, sender=AttributeValue)
+def rename_facet_value(sender, instance, created, **kwargs):
+    if not created:
+        ProductFacet.objects.filter(attribute__attr_value=instance).update(value=instance.value_name or '')
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_title(sender, instance, raw=False, **kwargs):
+    instance._old_title = None
+    if instance.pk and not raw:
+        instance._old_title = Category.objects.filter(pk=instance.pk).values_list('title', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    # The title is the only category column in the index.
+    old_title = getattr(instance, '_old_title', None)
+    if not created and not raw and old_title is not None and old_title != instance.title:
+        index_products(list(instance.product_set.values_list('pk', flat=True)))
+
+
+@receiver([post_save, post_delete], sender=ProductAttribute)
+def reindex_attribute_product(sender, instance, raw=False, origin=None, **kwargs):
+    if instance.product_id and not raw and not deleted_with_product(origin):
+        index_products([instance.product_id])
+
+
+@receiver(post_save, sender=AttributeValue)
+def reindex_attribute_value_products(sender, instance, created, **kwargs):
+    if not created:
+        index_products(list(ProductAttribute.objects.filter(attr_value=instance)
+                            .values_list('product_id', flat=True).distinct()))
+
+
+@receiver(post_save, sender=Category)
+def generate_category_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image:
+        schedule_thumbnails([instance.image.name],
+                            on_done=lambda: bump_versions(category_ns(instance.pk), CATEGORIES))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Image)
+def generate_product_thumbnails(sender, instance, raw=False, **kwargs):
+    product_id = instance.pk if sender is Product else instance.product_id
+    if not raw and instance.image:
+        schedule_thumbnails([instance.image.name], on_done=lambda: bump_versions(product_ns(product_id), CATALOG))
+
+
+@receiver(post_save, sender=User)
+def create_api_key(sender, instance, created, **kwargs):
+    if created:
+        api_key = get_random_string(32)
+        APIKey.objects.create(user=instance, key=api_key)
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_user_identity(sender, instance, **kwargs):
+    # Deactivation, password changes and deletions must not outlive the auth cache.
+    forget_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Token)
+@receiver([post_save, post_delete], sender=APIKey)
+def forget_credential_identity(sender, instance, **kwargs):
+    forget_user(instance.user_id)
@@ -0,0 +1,59 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# ``<prefix>/ab/<sha256>.<ext>`` as produced by HashedUploadTo; such names
+# never change content, so they can be cached forever and shared.
+HASHED_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{64}(?:\.[\w]+|/\d+w\.\w+)$')
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name.replace('\\', '/')))
+
+
+@deconstructible
+class HashedUploadTo:
+    """
+    ``upload_to`` that names a file after the SHA-256 of its bytes:
+    ``<prefix>/<first two hex>/<sha256><ext>``. Identical uploads map to the
+    same name, which HashedFileSystemStorage stores only once.
+    """
+
+    def __init__(self, prefix, field='image'):
+        self.prefix = prefix.strip('/')
+        self.field = field
+
+    def __call__(self, instance, filename):
+        content = getattr(instance, self.field).file
+        digest = hashlib.sha256()
+        if hasattr(content, 'chunks'):
+            for chunk in content.chunks():
+                digest.update(chunk)
+        else:
+            content.seek(0)
+            for chunk in iter(lambda: content.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content.seek(0)
+        ext = os.path.splitext(filename)[1].lower()
+        hexdigest = digest.hexdigest()
+        return f'{self.prefix}/{hexdigest[:2]}/{hexdigest}{ext}'
+
+    def __eq__(self, other):
+        return isinstance(other, HashedUploadTo) and (self.prefix, self.field) == (other.prefix, other.field)
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage that keeps content-hashed names as-is and skips writing bytes it already has."""
+
+    def get_available_name(self, name, max_length=None):
+        if is_hashed_name(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if is_hashed_name(name) and self.exists(name):
+            return name
+        return super()._save(name, content)
@@ -0,0 +1,151 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from .replicas import read_queryset
+
+STREAM_QUERY_PARAM = 'stream'
+CONTENT_TYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+
+def stream_format(params):
+    """``'json'``/``'ndjson'`` when ``?stream=`` asks for a streamed list, else None."""
+    value = params.get(STREAM_QUERY_PARAM)
+    return value if value in CONTENT_TYPES else None
+
+
+def stream_queryset(queryset):
+    # Unordered querysets would stream in whatever order the database picks.
+    return queryset if queryset.ordered else queryset.order_by('pk')
+
+
+def serialized_rows(serializer):
+    """
+    ``serializer.data`` as a plain list, with the serializer's own references
+    to the rows and instances dropped. Serializers and their fields form
+    reference cycles, so anything they still point to would otherwise wait
+    for the cyclic garbage collector instead of being freed with the chunk.
+    """
+    rows = list(serializer.data)
+    serializer.__dict__.pop('_data', None)
+    serializer.instance = None
+    return rows
+
+
+def release(instances, names=()):
+    # Prefetched related objects point back at their instance; break that cycle too.
+    for instance in instances:
+        instance.__dict__.pop('_prefetched_objects_cache', None)
+        for name in names:
+            instance.__dict__.pop(name, None)
+
+
+def prefetch_attributes(queryset):
+    """The ``to_attr`` names of ``queryset``'s Prefetch lookups."""
+    return [lookup.to_attr for lookup in queryset._prefetch_related_lookups
+            if isinstance(lookup, Prefetch) and lookup.to_attr]
+
+
+def chunks(queryset, serialize, chunk_size=None):
+    """Serialize ``queryset`` ``chunk_size`` rows at a time; only one chunk of models is alive at once."""
+    chunk_size = chunk_size or settings.STREAMING_LIST_CHUNK_SIZE
+    names = prefetch_attributes(queryset)
+    batch = []
+    for obj in stream_queryset(queryset).iterator(chunk_size=chunk_size):
+        batch.append(obj)
+        if len(batch) == chunk_size:
+            yield serialize(batch)
+            release(batch, names)
+            batch = []
+    if batch:
+        yield serialize(batch)
+        release(batch, names)
+
+
+async def achunks(queryset, serialize, chunk_size=None):
+    """chunks() for async views; serialization runs in a thread as it may query."""
+    chunk_size = chunk_size or settings.STREAMING_LIST_CHUNK_SIZE
+    serialize = sync_to_async(serialize)
+    names = prefetch_attributes(queryset)
+    batch = []
+    async for obj in stream_queryset(queryset).aiterator(chunk_size=chunk_size):
+        batch.append(obj)
+        if len(batch) == chunk_size:
+            yield await serialize(batch)
+            release(batch, names)
+            batch = []
+    if batch:
+        yield await serialize(batch)
+        release(batch, names)
+
+
+class ChunkEncoder:
+    """Encode lists of serialized rows as pieces of one JSON array, or as NDJSON lines."""
+
+    def __init__(self, file_format):
+        self.file_format = file_format
+        # Same output as DRF's JSONRenderer with its default settings.
+        self.encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        self.first = True
+
+    def start(self):
+        return b'[' if self.file_format == 'json' else b''
+
+    def encode(self, rows):
+        if not rows:
+            return b''
+        if self.file_format == 'ndjson':
+            return ''.join(self.encoder.encode(row) + '\n' for row in rows).encode()
+        body = ','.join(self.encoder.encode(row) for row in rows)
+        prefix = '' if self.first else ','
+        self.first = False
+        return (prefix + body).encode()
+
+    def end(self):
+        return b']' if self.file_format == 'json' else b''
+
+
+def streaming_response(chunk_iterator, file_format):
+    encoder = ChunkEncoder(file_format)
+
+    def content():
+        yield encoder.start()
+        for rows in chunk_iterator:
+            yield encoder.encode(rows)
+        yield encoder.end()
+
+    async def acontent():
+        yield encoder.start()
+        async for rows in chunk_iterator:
+            yield encoder.encode(rows)
+        yield encoder.end()
+
+    body = acontent() if hasattr(chunk_iterator, '__aiter__') else content()
+    return StreamingHttpResponse(body, content_type=CONTENT_TYPES[file_format])
+
+
+class StreamingListMixin:
+    """
+    For ListAPIViews: ``?stream=json`` or ``?stream=ndjson`` returns the whole
+    filtered list through a StreamingHttpResponse instead of one rendered
+    body. Rows are read with ``iterator(chunk_size=...)`` and serialized a
+    chunk at a time, so memory does not grow with the number of rows.
+    Pagination parameters are ignored when streaming.
+    """
+    stream_chunk_size = None
+
+    def list(self, request, *args, **kwargs):
+        file_format = stream_format(request.query_params)
+        if file_format is None:
+            return super().list(request, *args, **kwargs)
+        queryset = read_queryset(self.filter_queryset(self.get_queryset()))
+        serializer_class = self.get_serializer_class()
+        # One context for every chunk, so per-request lookups (liked products) run once.
+        context = self.get_serializer_context()
+
+        def serialize(rows):
+            return serialized_rows(serializer_class(rows, many=True, context=context))
+
+        return streaming_response(chunks(queryset, serialize, self.stream_chunk_size), file_format)
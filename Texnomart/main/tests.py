@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import glob
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .archive import read_archive
+from .attributes import NameTable
+from .authentication import CACHES as AUTH_CACHES
+from .bulk import PRODUCT_DEPENDENTS
+from .cache import category_ns, get_versions, product_ns
+from .benchmark import CatalogBenchmark, compare
+from .catalog_data import generate_catalog
+from .categories import get_category_tree
+from .importtime import BOOT_TIME_BUDGET, aggregate, profile_boot
+from .metrics import HISTOGRAMS
+from .pagination import KeysetPagination
+from .replicas import reset_failures
+from .serializers import CategorySerializer, ProductAttributeSerializer, ProductListSerializer
+from .thumbnails import derivative_name
+from .likes import get_liked_product_ids, like_buffer, write_likes
+from .search import InMemoryBackend, get_backend, search_products
+from .models import Category, Product, Image, Comment, AttributeKey, AttributeValue, ProductAttribute, ProductFacet, \
+    APIKey
+
+
+def make_product(category, name='Phone', price=100, **kwargs):
+    product = Product.objects.create(name=name, category=category, description='desc', price=price, **kwargs)
+    key, _ = AttributeKey.objects.get_or_create(key_name='RAM')
+    value, _ = AttributeValue.objects.get_or_create(value_name='16GB')
+    ProductAttribute.objects.create(product=product, attr_key=key, attr_value=value)
+    Image.objects.create(product=product, image='image/product/test.jpg', is_primary=True)
+    Comment.objects.create(product=product, message='ok', rating=4)
+    return product
+
+
+class ProductListQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(title='Phones')
+        self.user = User.objects.create_user('buyer', password='pass')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('all-products'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_products(self):
+        make_product(self.category)
+        few = self.count_queries()
+        for i in range(10):
+            make_product(self.category, name=f'Phone {i}')
+        self.assertEqual(self.count_queries(), few)
+        self.assertLessEqual(few, 4)
+
+    def test_liked_flag_for_authenticated_user(self):
+        liked = make_product(self.category)
+        make_product(self.category, name='Other')
+        liked.users_like.add(self.user)
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(reverse('all-products'))
+        flags = {item['id']: item['users_like'] for item in response.json()}
+        self.assertEqual(sum(flags.values()), 1)
+        self.assertTrue(flags[liked.id])
+        self.assertEqual(response.json()[0]['comments_count'], 1)
+        self.assertEqual(response.json()[0]['avg_rating'], 4)
+
+    def test_liked_ids_cached_and_invalidated(self):
+        product = make_product(self.category)
+        self.client.force_authenticate(self.user)
+        self.count_queries()
+        # The liked-id set now comes from the cache: only the product queries remain.
+        self.client.logout()
+        anonymous = self.count_queries()
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.count_queries(), anonymous)
+
+        self.user.liked_products.add(product)
+        response = self.client.get(reverse('all-products'))
+        self.assertTrue(response.json()[0]['users_like'])
+        product.users_like.clear()
+        response = self.client.get(reverse('all-products'))
+        self.assertFalse(response.json()[0]['users_like'])
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(title='Phones')
+        for i in range(7):
+            Product.objects.create(name=f'P{i}', category=self.category, description='d', price=i // 2)
+
+    def collect(self, url):
+        seen = []
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(item['id'] for item in data['results'])
+            url = data['next']
+        return seen
+
+    def test_walks_price_ties_without_gaps(self):
+        ids = self.collect(reverse('all-products') + '?ordering=price&page_size=2')
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_filters_apply_to_pages(self):
+        ids = self.collect(reverse('all-products') + '?ordering=-price&page_size=2&price_min=2')
+        expected = list(Product.objects.filter(price__gte=2).order_by('-price', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_unpaginated_without_params(self):
+        response = self.client.get(reverse('category-products', args=[self.category.slug]))
+        self.assertEqual(len(response.json()), 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('all-products') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+class RatingAggregateTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title='Phones')
+        self.product = Product.objects.create(name='P', category=self.category, description='d', price=1)
+
+    def assertAggregates(self, comments, total, rated):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.comment_count, self.product.rating_sum, self.product.rating_count),
+                         (comments, total, rated))
+
+    def test_create_edit_delete(self):
+        first = Comment.objects.create(product=self.product, rating=5)
+        Comment.objects.create(product=self.product, rating=None)
+        self.assertAggregates(2, 5, 1)
+
+        first.rating = 2
+        first.save()
+        self.assertAggregates(2, 2, 1)
+
+        first.delete()
+        self.assertAggregates(1, 0, 0)
+
+    def test_rebuild_command(self):
+        Comment.objects.create(product=self.product, rating=3)
+        Comment.objects.create(product=self.product, rating=4)
+        Product.objects.update(comment_count=0, rating_sum=0, rating_count=0)
+
+        call_command('rebuild_product_ratings', stdout=StringIO())
+        self.assertAggregates(2, 7, 2)
+        self.assertEqual(round(self.product.avg_rating), 4)
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(title='Phones')
+        self.product = make_product(self.category)
+        self.url = reverse('product-detail', args=[self.product.id])
+
+    def test_detail_served_from_cache_until_product_changes(self):
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(first.json(), second.json())
+
+        Comment.objects.create(product=self.product, message='more', rating=2)
+        third = self.client.get(self.url)
+        self.assertEqual(third.json()['comments_count'], 2)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.product.name = 'Renamed'
+        self.product.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_liked_flag_is_per_user(self):
+        user = User.objects.create_user('fan', password='pass')
+        self.product.users_like.add(user)
+        self.assertFalse(self.client.get(self.url).json()['users_like'])
+        self.client.force_authenticate(user)
+        self.assertTrue(self.client.get(self.url).json()['users_like'])
+
+    def test_category_listing_follows_product_moves(self):
+        other = Category.objects.create(title='Tablets')
+        url = reverse('category-products', args=[other.slug])
+        self.assertEqual(self.client.get(url).json(), [])
+        self.product.category = other
+        self.product.save()
+        self.assertEqual(len(self.client.get(url).json()), 1)
+        self.assertEqual(self.client.get(reverse('category-products', args=[self.category.slug])).json(), [])
+
+
+class TempArchiveMixin:
+    """Archive deleted items synchronously into a throwaway directory."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive_dir = directory.name
+        overrides = override_settings(DELETED_ITEMS_DIR=self.archive_dir, DELETED_ITEMS_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class DeletedItemArchiveTest(TempArchiveMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_cascade_is_archived_and_restorable(self):
+        category = Category.objects.create(title='Phones')
+        product = make_product(category)
+        product.users_like.add(User.objects.create_user('fan', password='pass'))
+        category.delete()
+
+        records = list(read_archive(self.archive_dir))
+        self.assertEqual(sorted(record['type'] for record in records), ['category', 'product'])
+
+        call_command('restore_deleted_items', stdout=StringIO())
+        restored = Product.objects.get(pk=product.pk)
+        self.assertEqual(restored.name, product.name)
+        self.assertEqual(restored.category.slug, 'phones')
+        self.assertEqual(restored.created_at, product.created_at)
+        # The cascade removed the attribute rows, so the blob must not bring them back.
+        self.assertEqual(restored.attribute_data, [])
+        self.assertEqual(restored.like_count, 0)
+        self.assertEqual(self.client.get(reverse('product-detail', args=[product.pk])).json()['attributes'], [])
+
+
+class BulkImportExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='pass'))
+
+    def upload(self, text, name='feed.csv'):
+        return self.client.post(reverse('import-products'),
+                                {'file': SimpleUploadedFile(name, text.encode()), 'batch_size': 2},
+                                format='multipart')
+
+    def test_import_upserts_by_sku_and_exports(self):
+        feed = ('sku,name,category,description,price,images,attributes\n'
+                'A1,Phone,phones,d,10,a.jpg|b.jpg,RAM:8GB|Color:Black\n'
+                'A2,Tablet,tablets,d,20,,RAM:8GB\n'
+                'A3,Broken,phones,d,not-a-price,,\n')
+        report = self.upload(feed).json()
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        phone = Product.objects.get(sku='A1')
+        self.assertEqual(phone.images.count(), 2)
+        self.assertEqual(phone.attributes.count(), 2)
+        self.assertEqual(AttributeKey.objects.filter(key_name='RAM').count(), 1)
+
+        report = self.upload('{"sku": "A1", "name": "Phone 2", "category": "phones", "price": 15, '
+                             '"attributes": {"RAM": "16GB"}}\n', name='feed.jsonl').json()
+        self.assertEqual(report['updated'], 1)
+        phone.refresh_from_db()
+        self.assertEqual((phone.name, phone.price), ('Phone 2', 15))
+        self.assertEqual([a.attr_value.value_name for a in phone.attributes.all()], ['16GB'])
+        self.assertEqual(phone.images.count(), 2)
+
+        response = self.client.get(reverse('export-products') + '?file_format=jsonl')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual({row['sku'] for row in rows}, {'A1', 'A2'})
+
+    def test_missing_columns_keep_stored_values(self):
+        phone = Product.objects.create(sku='B1', name='Phone', category=Category.objects.create(title='Phones'),
+                                       description='Great phone', image='image/product/x.png', price=10)
+        self.upload('sku,name,category,price\nB1,Phone,phones,12\n')
+        phone.refresh_from_db()
+        self.assertEqual((phone.price, phone.description, phone.image.name), (12, 'Great phone', 'image/product/x.png'))
+
+        self.upload('sku,name,category,price,description\nB1,Phone,phones,12,\n')
+        phone.refresh_from_db()
+        self.assertEqual((phone.description, phone.image.name), ('', 'image/product/x.png'))
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(User.objects.create_user('shopper', password='pass'))
+        self.assertEqual(self.client.get(reverse('export-products')).status_code, 403)
+
+
+class FacetFilterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        phones = Category.objects.create(title='Phones')
+        self.black = self.make(phones, 'Black phone', RAM='16GB', Color='Black')
+        self.white = self.make(phones, 'White phone', RAM='16GB', Color='White')
+        self.small = self.make(phones, 'Small phone', RAM='8GB', Color='Black')
+
+    def make(self, category, name, **attributes):
+        product = Product.objects.create(name=name, category=category, description='d', price=1)
+        for key, value in attributes.items():
+            ProductAttribute.objects.create(product=product,
+                                            attr_key=AttributeKey.objects.get_or_create(key_name=key)[0],
+                                            attr_value=AttributeValue.objects.get_or_create(value_name=value)[0])
+        return product
+
+    def ids(self, query):
+        return {item['id'] for item in self.client.get(reverse('all-products') + query).json()}
+
+    def test_filter_and_counts(self):
+        self.assertEqual(self.ids('?attr=RAM:16GB&attr=Color:Black'), {self.black.id})
+        self.assertEqual(self.ids('?attr=Color:Black&attr=Color:White'), {self.black.id, self.white.id, self.small.id})
+
+        with CaptureQueriesContext(connection) as ctx:
+            counts = self.client.get(reverse('product-facets') + '?attr=RAM:16GB').json()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(counts['Color'], [{'value': 'Black', 'count': 1}, {'value': 'White', 'count': 1}])
+
+    def test_index_follows_renames_and_deletes(self):
+        white = AttributeValue.objects.get(value_name='White')
+        white.value_name = 'Pearl'
+        white.save()
+        self.assertEqual(self.ids('?attr=Color:Pearl'), {self.white.id})
+
+        self.white.attributes.filter(attr_key__key_name='Color').delete()
+        self.assertEqual(self.ids('?attr=Color:Pearl'), set())
+
+
+class ProductSearchTest(TempArchiveMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        phones = Category.objects.create(title='Smartphones')
+        self.iphone = Product.objects.create(name='Apple iPhone 15 Pro', category=phones, description='Titanium', price=1)
+        self.case = Product.objects.create(name='Leather case', category=phones, description='Fits iPhone 15', price=1)
+        self.fridge = Product.objects.create(name='Fridge', category=Category.objects.create(title='Kitchen'),
+                                             description='Cold', price=1)
+
+    def search(self, query):
+        return [item['id'] for item in self.client.get(reverse('search-products') + query).json()]
+
+    def test_ranked_prefix_and_incremental(self):
+        self.assertEqual(self.search('?q=iphone'), [self.iphone.id, self.case.id])
+        self.assertEqual(self.search('?q=iph&prefix=1'), [self.iphone.id, self.case.id])
+        self.assertEqual(self.search('?q=smartphones fridge'), [])
+        self.assertEqual(self.search('?q="OR*'), [])
+
+        self.fridge.name = 'iPhone fridge magnet'
+        self.fridge.save()
+        self.assertIn(self.fridge.id, self.search('?q=iphone'))
+        self.iphone.delete()
+        self.assertNotIn(self.iphone.id, self.search('?q=iphone'))
+
+    def test_category_saves_reindex_only_on_title_change(self):
+        kitchen = Category.objects.get(title='Kitchen')
+        with mock.patch('main.signals.index_products') as index:
+            kitchen.save()
+            kitchen.slug = 'kitchen-appliances'
+            kitchen.save()
+            index.assert_not_called()
+        kitchen.title = 'Appliances'
+        kitchen.save()
+        self.assertEqual(self.search('?q=appliances'), [self.fridge.id])
+
+    def test_python_backend_matches_fts(self):
+        self.assertEqual(get_backend().name, 'fts5')
+        backend = InMemoryBackend()
+        self.assertEqual(backend.search('iphone'), [self.iphone.id, self.case.id])
+        self.assertEqual(backend.search('cold fri', prefix=True), [self.fridge.id])
+        backend.remove([self.case.id])
+        self.assertEqual(backend.search('iphone'), [self.iphone.id])
+
+
+class IndexUsageTest(TestCase):
+    """The hot listing queries must be answered from an index, not a table scan or temp sort."""
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn('USE TEMP B-TREE', plan)
+
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN output is SQLite specific')
+        self.assertUsesIndex(Image.objects.filter(product_id=1, is_primary=True), 'image_product_primary_idx')
+        self.assertUsesIndex(Product.objects.filter(category_id=1, price__gte=10).order_by('price'),
+                             'product_category_price_idx')
+        self.assertUsesIndex(Product.objects.filter(price__gte=10, price__lte=20), 'product_price_id_idx')
+        self.assertUsesIndex(Product.objects.order_by('-like_count', '-id')[:20], 'product_like_count_id_idx')
+        self.assertUsesIndex(Product.objects.order_by('-created_at', '-id')[:20], 'product_created_id_idx')
+        self.assertUsesIndex(Comment.objects.filter(product_id=1).order_by('-created_at'),
+                             'comment_product_created_idx')
+        self.assertIn('category_path_idx', Product.objects.in_category('1/').explain())
+
+    def test_keyset_pages_seek_instead_of_scanning(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN output is SQLite specific')
+        paginator = KeysetPagination()
+        paginator.field, paginator.descending = 'price', False
+        plan = Product.objects.filter(paginator.seek(5, 3)).order_by('price', 'id')[:20].explain()
+        self.assertIn('SEARCH main_product USING INDEX product_price_id_idx', plan)
+
+        paginator.field, paginator.descending = 'created_at', True
+        queryset = Product.objects.filter(category_id=1).filter(paginator.seek(timezone.now(), 3))
+        plan = queryset.order_by('-created_at', '-id')[:20].explain()
+        self.assertIn('SEARCH main_product USING INDEX product_category_created_idx', plan)
+
+
+class PrimaryImageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(title='Phones')
+
+    def count_queries(self):
+        url = reverse('category-products', args=[self.category.slug])
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url, HTTP_CACHE_CONTROL='no-cache').json()
+        cache.clear()
+        return len(ctx.captured_queries), data
+
+    def test_constant_queries_and_absolute_urls(self):
+        make_product(self.category)
+        few, _ = self.count_queries()
+        for i in range(10):
+            make_product(self.category, name=f'Phone {i}')
+        many, data = self.count_queries()
+        self.assertEqual(few, many)
+        self.assertTrue(all(item['primary_image'] == 'http://testserver/media/image/product/test.jpg'
+                            for item in data))
+
+    def test_serializer_without_request(self):
+        product = make_product(self.category)
+        data = ProductListSerializer(Product.objects.with_primary_image().get(pk=product.pk)).data
+        self.assertEqual(data['primary_image'], '/media/image/product/test.jpg')
+
+
+@override_settings(THUMBNAIL_ASYNC=False)
+class ThumbnailTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.category = Category.objects.create(title='Phones')
+
+    def upload(self, name='photo.png', size=(1200, 800)):
+        buffer = io.BytesIO()
+        PILImage.new('RGBA', size, (200, 30, 30, 255)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_derivatives_are_rendered_and_serialized(self):
+        product = Product.objects.create(name='Phone', category=self.category, description='desc', price=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            image = Image.objects.create(product=product, image=self.upload(), is_primary=True)
+
+        thumbnail = os.path.join(self.media.name, derivative_name(image.image.name, 320, 'webp'))
+        with PILImage.open(thumbnail) as rendered:
+            self.assertEqual(rendered.size, (320, 213))
+            self.assertEqual(rendered.format, 'WEBP')
+
+        product = Product.objects.with_primary_image().get(pk=product.pk)
+        storage = image.image.storage
+        # One directory listing per image, not a stat per derivative.
+        with mock.patch.object(storage, 'exists', wraps=storage.exists) as exists, \
+                mock.patch.object(storage, 'listdir', wraps=storage.listdir) as listdir:
+            data = ProductListSerializer(product).data
+        self.assertEqual((exists.call_count, listdir.call_count), (0, 1))
+        widths = {(item['format'], item['width']) for item in data['thumbnails']}
+        self.assertEqual(widths, {(ext, width) for ext in ('webp', 'jpg') for width in (160, 320, 640)})
+
+    def test_same_content_is_rendered_once(self):
+        product = Product.objects.create(name='Phone', category=self.category, description='desc', price=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            Image.objects.create(product=product, image=self.upload('a.png'))
+            Image.objects.create(product=product, image=self.upload('b.png'))
+        cache_dir = os.path.join(self.media.name, 'thumbnails', '.by-hash')
+        self.assertEqual(len(glob.glob(os.path.join(cache_dir, '*', '*'))), 1)
+
+    def test_missing_derivatives_fall_back_to_original(self):
+        data = CategorySerializer(Category.objects.create(title='TV', image='image/category/none.png')).data
+        self.assertEqual(data['thumbnails'], [])
+        self.assertEqual(data['full_image_url'], '/media/image/category/none.png')
+
+
+class MediaServingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.category = Category.objects.create(title='Phones')
+        self.payload = bytes(range(256)) * 8
+
+    def upload(self, name):
+        return SimpleUploadedFile(name, self.payload, content_type='image/png')
+
+    def test_identical_uploads_share_one_hashed_file(self):
+        first = Category.objects.create(title='A', image=self.upload('one.PNG'))
+        second = Category.objects.create(title='B', image=self.upload('two.png'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^image/category/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(len(glob.glob(os.path.join(self.media.name, 'image', 'category', '*', '*'))), 1)
+
+    def test_conditional_get_and_caching_headers(self):
+        url = Category.objects.create(title='A', image=self.upload('a.png')).image.url
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_range_requests(self):
+        url = Category.objects.create(title='A', image=self.upload('a.png')).image.url
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.payload)}')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[10:20])
+        self.assertEqual(b''.join(self.client.get(url, HTTP_RANGE='bytes=-4').streaming_content), self.payload[-4:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=99999-').status_code, 416)
+        stale = self.client.get(url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+    @override_settings(MEDIA_OFFLOAD='x-accel-redirect')
+    def test_offload_to_web_server(self):
+        name = Category.objects.create(title='A', image=self.upload('a.png')).image.name
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(response.content, b'')
+
+    def test_missing_and_traversal(self):
+        self.assertEqual(self.client.get('/media/nope.png').status_code, 404)
+        self.assertIn(self.client.get('/media/../manage.py').status_code, (400, 404))
+
+
+@override_settings(ASYNC_CATALOG_CONCURRENT_QUERIES=False)
+class AsyncCatalogTest(TempArchiveMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.category = Category.objects.create(title='Phones')
+        self.products = [make_product(self.category, name=f'Phone {i}', price=100 + i) for i in range(3)]
+        make_product(Category.objects.create(title='Smartphones', parent=self.category), name='Smartphone')
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.products[0].users_like.add(self.user)
+        self.paths = [
+            reverse('all-products'),
+            reverse('all-products') + '?page_size=2&ordering=price',
+            reverse('all-categories'),
+            reverse('category-tree'),
+            reverse('category-products', args=[self.category.slug]),
+            reverse('product-detail', args=[self.products[0].pk]),
+            reverse('all-attribute-keys') + '?page_size=1',
+            reverse('all-attribute-values'),
+        ]
+
+    async def test_async_views_match_sync_views(self):
+        client = AsyncClient()
+        for path in self.paths:
+            response = await client.get(path)
+            self.assertEqual(response.resolver_match.func.view_class.__module__, 'main.async_views', path)
+            sync = await sync_to_async(self.client.get)(path, HTTP_ACCEPT='application/json')
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(response.json(), sync.json(), path)
+
+    async def test_detail_personalizes_and_404s(self):
+        token = await sync_to_async(lambda: Token.objects.create(user=self.user).key)()
+        client = AsyncClient()
+        auth = {'Authorization': f'Token {token}'}
+        response = await client.get(reverse('product-detail', args=[self.products[0].pk]), headers=auth)
+        self.assertTrue(response.json()['users_like'])
+        self.assertEqual(len(response.json()['attributes']), 1)
+        self.assertEqual((await client.get(reverse('product-detail', args=[999999]))).status_code, 404)
+        bad = await client.get(reverse('all-products'), headers={'Authorization': 'Token nope'})
+        self.assertEqual(bad.status_code, 401)
+
+    async def test_writes_reach_the_drf_views(self):
+        client = AsyncClient()
+        path = reverse('product-detail', args=[self.products[1].pk])
+        response = await client.put(path, {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((await client.delete(path)).status_code, 204)
+        self.assertFalse(await Product.objects.filter(pk=self.products[1].pk).aexists())
+        self.assertEqual((await client.get(path)).status_code, 404)
+
+    def test_loadtest_in_process(self):
+        out = StringIO()
+        call_command('loadtest', requests=3, concurrency=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 2 * 5)
+        self.assertTrue(all(line.split()[-1] == '0' for line in lines[1:]))
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_SLOW_REQUEST_SECONDS=None, METRICS_TOKEN=None)
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for histogram in HISTOGRAMS:
+            histogram.clear()
+        self.category = Category.objects.create(title='Phones')
+        make_product(self.category)
+
+    def scrape(self):
+        return self.client.get('/metrics').content.decode()
+
+    def test_records_queries_serialization_and_size(self):
+        response = self.client.get(reverse('all-products'))
+        body = self.scrape()
+        self.assertIn('catalog_request_duration_seconds_count{view="all-products"} 1', body)
+        # Same budget as ProductListQueryCountTest.
+        self.assertRegex(body, r'catalog_db_queries_sum\{view="all-products"\} [1-4]\.0\n')
+        self.assertIn('catalog_serialize_duration_seconds_count{view="all-products"} 1', body)
+        self.assertIn(f'catalog_response_size_bytes_sum{{view="all-products"}} {float(len(response.content))}', body)
+
+    async def test_async_views_are_measured(self):
+        await AsyncClient().get(reverse('all-products'))
+        body = await sync_to_async(self.scrape)()
+        self.assertRegex(body, r'catalog_db_queries_sum\{view="all-products"\} [1-9]\d*\.0\n')
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=0)
+    def test_slow_request_log_includes_sql(self):
+        with self.assertLogs('main.metrics.slow', 'WARNING') as logs:
+            self.client.get(reverse('all-products'))
+        self.assertIn('main_product', logs.output[0])
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_off_records_nothing(self):
+        self.client.get(reverse('all-products'))
+        self.assertNotIn('view="all-products"', self.scrape())
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_protects_endpoint(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+@override_settings(LIKE_BUFFER_ASYNC=False)
+class CatalogBenchmarkTest(TempArchiveMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_generate_catalog(self):
+        out = StringIO()
+        call_command('generate_catalog', categories=3, products=40, users=5, stdout=out)
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Category.objects.count(), 3)
+        product = Product.objects.filter(comment_count__gt=0).first()
+        self.assertEqual(product.comment_count, product.comments.count())
+        self.assertEqual(ProductFacet.objects.count(), ProductAttribute.objects.count())
+        self.assertIn('40 products', out.getvalue())
+
+    def test_benchmark_covers_every_route(self):
+        generate_catalog(categories=2, products=20, users=3)
+        report = CatalogBenchmark(iterations=1).run()
+        self.assertEqual(report['skipped'], [])
+        for label, row in report['results'].items():
+            self.assertTrue(all(status < 400 for status in row['status']), (label, row['status']))
+            self.assertGreaterEqual(row['queries_mean'], 0)
+        self.assertEqual(report['results']['POST add-category']['status'], [201])
+
+    def test_compare_flags_regressions(self):
+        old = {'results': {'GET x': {'queries_mean': 2, 'p50_ms': 10.0, 'p99_ms': 20.0, 'peak_memory_kb': 100}}}
+        new = {'results': {'GET x': {'queries_mean': 3, 'p50_ms': 10.5, 'p99_ms': 40.0, 'peak_memory_kb': 100}}}
+        regressed = {field for _, field, _, _, flagged in compare(old, new) if flagged}
+        self.assertEqual(regressed, {'queries_mean', 'p99_ms'})
+
+
+class AttributeBlobTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(title='Phones')
+        self.product = make_product(self.category)
+
+    def detail(self):
+        response = self.client.get(reverse('product-detail', args=[self.product.pk]), HTTP_CACHE_CONTROL='no-cache')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['attributes']
+
+    def test_blob_matches_model_serializer(self):
+        attribute = self.product.attributes.get()
+        expected = dict(ProductAttributeSerializer(attribute).data)
+        self.assertEqual(self.detail(), [expected])
+        self.assertEqual(expected['key_name'], 'RAM')
+
+    def test_detail_does_not_join_attribute_tables(self):
+        self.detail()
+        with CaptureQueriesContext(connection) as ctx:
+            self.detail()
+        self.assertFalse([q for q in ctx.captured_queries if 'main_productattribute' in q['sql']])
+
+    def test_blob_follows_writes_and_renames(self):
+        color = AttributeKey.objects.create(key_name='Color')
+        black = AttributeValue.objects.create(value_name='Black')
+        ProductAttribute.objects.create(product=self.product, attr_key=color, attr_value=black)
+        self.assertEqual([a['value_name'] for a in self.detail()], ['16GB', 'Black'])
+
+        black.value_name = 'Midnight'
+        black.save()
+        self.assertEqual([a['value_name'] for a in self.detail()], ['16GB', 'Midnight'])
+
+        self.product.attributes.filter(attr_key=color).delete()
+        self.assertEqual([a['key_name'] for a in self.detail()], ['RAM'])
+
+    def test_names_are_unique_and_import_reuses_them(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AttributeKey.objects.create(key_name='RAM')
+        feed = 'sku,name,category,price,attributes\nX1,Phone X,phones,10,RAM:16GB|Color:Red\n'
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='pass'))
+        response = self.client.post(reverse('import-products'),
+                                    {'file': SimpleUploadedFile('feed.csv', feed.encode())}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AttributeKey.objects.filter(key_name='RAM').count(), 1)
+        product = Product.objects.get(sku='X1')
+        self.assertEqual([(k, v) for k, v, *_ in product.attribute_data],
+                         list(product.attributes.order_by('pk').values_list('attr_key_id', 'attr_value_id')))
+
+    def test_unknown_ids_reload_the_name_table_once(self):
+        names = NameTable(AttributeKey, 'key_name')
+        with self.assertNumQueries(2):
+            self.assertIsNone(names.name(-1))
+        with self.assertNumQueries(0):
+            self.assertIsNone(names.name(-1))
+        color = AttributeKey.objects.create(key_name='Color')
+        with self.assertNumQueries(1):
+            self.assertEqual(names.name(color.pk), 'Color')
+        with self.assertNumQueries(0):
+            self.assertIsNone(names.name(-1))
+
+
+@override_settings(STREAMING_LIST_CHUNK_SIZE=2)
+class StreamingListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(title='Phones')
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.products = [make_product(self.category, name=f'Phone {i}', price=100 + i) for i in range(5)]
+        self.products[1].users_like.add(self.user)
+
+    def buffered(self, url):
+        return sorted(self.client.get(url, HTTP_ACCEPT='application/json').json(), key=lambda row: row['id'])
+
+    def test_json_and_ndjson_match_buffered_list(self):
+        self.client.force_login(self.user)
+        for url in (reverse('all-products'), reverse('all-attribute-values')):
+            response = self.client.get(url + '?stream=json&page_size=1')
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(json.loads(b''.join(response.streaming_content)), self.buffered(url))
+
+            response = self.client.get(url + '?stream=ndjson')
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+            self.assertEqual([json.loads(line) for line in lines], self.buffered(url))
+        liked = [row['id'] for row in self.buffered(reverse('all-products')) if row['users_like']]
+        self.assertEqual(liked, [self.products[1].pk])
+
+    def test_filters_apply_and_empty_list_is_valid(self):
+        response = self.client.get(reverse('all-products') + '?stream=json&price_min=103')
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 2)
+        response = self.client.get(reverse('all-products') + '?stream=json&price_min=1000')
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    async def test_async_view_streams(self):
+        url = reverse('all-products') + '?stream=ndjson'
+        response = await AsyncClient().get(url)
+        self.assertEqual(response.resolver_match.func.view_class.__module__, 'main.async_views')
+        body = b''.join([part async for part in response.streaming_content])
+        sync = await sync_to_async(lambda: b''.join(self.client.get(url).streaming_content))()
+        self.assertEqual(body, sync)
+
+
+class BulkOperationsTest(TempArchiveMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='pass'))
+        self.phones = Category.objects.create(title='Phones')
+        self.tablets = Category.objects.create(title='Tablets')
+        self.products = [make_product(self.phones, name=f'Phone {i}', price=100 * (i + 1)) for i in range(3)]
+        self.tablet = make_product(self.tablets, name='Tablet', price=1000)
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, format='json')
+
+    def prices(self):
+        return sorted(Product.objects.filter(category=self.phones).values_list('price', flat=True))
+
+    def test_price_updates_in_one_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post('bulk-update-prices', {'filter': {'category': 'phones'}, 'mode': 'percent',
+                                                        'value': 10})
+        self.assertEqual(response.json(), {'updated': 3})
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual([round(price, 2) for price in self.prices()], [110, 220, 330])
+
+        response = self.post('bulk-update-prices', {'ids': [self.products[0].pk], 'filter': {'price_max': 500},
+                                                    'mode': 'absolute', 'value': 50})
+        self.assertEqual(response.json(), {'updated': 1})
+        self.assertEqual(Product.objects.get(pk=self.tablet.pk).price, 1000)
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.post('bulk-update-prices', {'mode': 'percent', 'value': 5}).status_code, 400)
+        self.assertEqual(self.post('bulk-update-prices', {'ids': [1], 'mode': 'percent', 'value': -100}).status_code,
+                         400)
+        self.assertEqual(self.post('bulk-update-prices', {'filter': {'price_min': 'x'}, 'mode': 'absolute',
+                                                          'value': 1}).status_code, 400)
+        self.client.force_authenticate(User.objects.create_user('shopper', password='pass'))
+        self.assertEqual(self.post('bulk-delete-products', {'ids': [self.tablet.pk]}).status_code, 403)
+
+    def test_reassign_updates_search_and_cache(self):
+        self.client.get(reverse('category-products', args=['tablets']))
+        response = self.post('bulk-reassign-category', {'filter': {'category': 'phones', 'attr': ['RAM:16GB']},
+                                                        'category': 'tablets'})
+        self.assertEqual(response.json(), {'updated': 3})
+        listed = self.client.get(reverse('category-products', args=['tablets'])).json()
+        self.assertEqual(len(listed), 4)
+        self.assertEqual(self.post('bulk-reassign-category', {'ids': [1], 'category': 'nope'}).status_code, 400)
+
+    def test_delete_products_archives_in_one_batch(self):
+        user = User.objects.create_user('buyer', password='pw')
+        self.products[0].users_like.add(user)
+        get_liked_product_ids(user)
+        ids = [product.pk for product in self.products[:2]]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post('bulk-delete-products', {'ids': ids})
+        self.assertEqual(response.json()['deleted'], 2)
+        self.assertEqual(response.json()['rows']['main.Comment'], 2)
+        self.assertFalse(Product.objects.filter(pk__in=ids).exists())
+        self.assertFalse(ProductAttribute.objects.filter(product_id__in=ids).exists())
+        self.assertEqual(sorted(record['id'] for record in read_archive(self.archive_dir)), ids)
+        self.assertFalse(set(ids) & set(search_products('phone')))
+        self.assertEqual(get_liked_product_ids(user), frozenset())
+
+    def test_delete_categories(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post('bulk-delete-categories', {'slugs': ['phones', 'missing']})
+        self.assertEqual(response.json()['deleted'], 1)
+        self.assertEqual(response.json()['rows']['main.Product'], 3)
+        self.assertEqual(list(Product.objects.values_list('pk', flat=True)), [self.tablet.pk])
+        self.assertEqual({record['type'] for record in read_archive(self.archive_dir)}, {'product', 'category'})
+
+    def test_dependents_cover_every_cascade(self):
+        cascading = {rel.related_model for rel in Product._meta.related_objects}
+        cascading |= {Product.users_like.through}
+        self.assertEqual(cascading, set(PRODUCT_DEPENDENTS))
+
+
+class CachedAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for identities in AUTH_CACHES:
+            identities.clear()
+        self.category = Category.objects.create(title='Phones')
+        self.product = make_product(self.category)
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.product.users_like.add(self.user)
+        self.url = reverse('product-detail', args=[self.product.pk])
+
+    def get(self, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, headers=headers)
+        identity_queries = [q for q in ctx.captured_queries
+                            if any(table in q['sql'] for table in ('auth_user', 'authtoken_token', 'main_apikey'))]
+        return response, identity_queries
+
+    def assert_cached(self, **headers):
+        response, queries = self.get(**headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['users_like'])
+        self.assertTrue(queries)
+        response, queries = self.get(**headers)
+        self.assertTrue(response.json()['users_like'])
+        self.assertEqual(queries, [])
+
+    def test_token_and_jwt_lookups_are_cached(self):
+        self.assert_cached(Authorization=f'Token {Token.objects.create(user=self.user).key}')
+        access = self.client.post(reverse('token_obtain'), {'username': 'buyer', 'password': 'pw'}).json()['access']
+        self.assert_cached(Authorization=f'Bearer {access}')
+
+    def test_api_key_rotation_and_deactivation(self):
+        api_key = APIKey.objects.get(user=self.user)
+        old = api_key.key
+        self.assert_cached(X_API_KEY=old)
+        self.assertEqual(self.get(Authorization=f'Api-Key {old}')[0].status_code, 200)
+
+        api_key.rotate()
+        self.assertEqual(self.get(X_API_KEY=old)[0].status_code, 401)
+        self.assert_cached(X_API_KEY=api_key.key)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(X_API_KEY=api_key.key)[0].status_code, 401)
+
+
+@override_settings(COMMENT_PREVIEW_SIZE=2)
+class ProductCommentsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(title='Phones')
+        self.product = make_product(self.category)
+        for rating in (5, None, 1, 3, None, 5, 2):
+            Comment.objects.create(product=self.product, message=f'rated {rating}', rating=rating)
+        self.url = reverse('product-comments', args=[self.product.pk])
+
+    def walk(self, query):
+        ids, url = [], self.url + query
+        while url:
+            page = self.client.get(url).json()
+            ids.extend(comment['id'] for comment in page['results'])
+            url = page['next']
+        return ids
+
+    def test_pages_cover_every_comment_once(self):
+        comments = Comment.objects.filter(product=self.product)
+        newest = list(comments.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self.walk('?page_size=3'), newest)
+        by_rating = self.walk('?page_size=2&ordering=-rating')
+        self.assertEqual(sorted(by_rating), sorted(newest))
+        ratings = [Comment.objects.get(pk=pk).rating for pk in by_rating]
+        self.assertEqual(ratings, [5, 5, 4, 3, 2, 1, None, None])
+
+    def test_paginated_without_parameters_and_404(self):
+        page = self.client.get(self.url).json()
+        self.assertEqual(len(page['results']), 8)
+        self.assertIsNone(page['next'])
+        self.assertEqual(self.client.get(reverse('product-comments', args=[999999])).status_code, 404)
+
+    def test_product_payloads_embed_a_bounded_preview(self):
+        newest = list(Comment.objects.filter(product=self.product).order_by('-created_at', '-pk')
+                      .values_list('pk', flat=True)[:2])
+        detail = self.client.get(reverse('product-detail', args=[self.product.pk])).json()
+        self.assertEqual([comment['id'] for comment in detail['comments']], newest)
+        self.assertEqual(detail['comments_count'], 8)
+
+        for i in range(5):
+            other = make_product(self.category, name=f'Phone {i}')
+            Comment.objects.create(product=other, message='more', rating=3)
+        with CaptureQueriesContext(connection) as ctx:
+            listed = self.client.get(reverse('all-products')).json()
+        self.assertTrue(all(len(product['comments']) <= 2 for product in listed))
+        self.assertEqual(len([q for q in ctx.captured_queries if 'main_comment' in q['sql']]), 1)
+
+
+class LikeBufferTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(like_buffer.flush)
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(title='Phones')
+        self.phone, self.tablet = make_product(category, name='Phone'), make_product(category, name='Tablet')
+
+    def tap(self, product, method='post'):
+        response = getattr(self.client, method)(reverse('product-like', args=[product.pk]))
+        self.assertEqual(response.status_code, 202)
+
+    def liked(self):
+        return sorted(row['name'] for row in self.client.get(reverse('all-products') + '?is_liked=true').json())
+
+    def like_counts(self):
+        return dict(Product.objects.order_by('name').values_list('name', 'like_count'))
+
+    @override_settings(LIKE_BUFFER_ASYNC=True)
+    def test_taps_are_coalesced_and_written_in_bulk(self):
+        Like = Product.users_like.through
+        with mock.patch.object(like_buffer, '_start'):
+            for method in ('post', 'delete', 'post', 'post'):
+                self.tap(self.phone, method)
+            self.tap(self.tablet)
+            self.assertFalse(Like.objects.exists())
+            # Buffered taps already show for this user.
+            self.assertEqual(self.liked(), ['Phone', 'Tablet'])
+            self.assertTrue(self.client.get(reverse('product-detail', args=[self.phone.pk])).json()['users_like'])
+
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(like_buffer.flush(), 2)
+            inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+            self.assertEqual(len(inserts), 1)
+            self.assertEqual(Like.objects.count(), 2)
+            self.assertEqual(self.like_counts(), {'Phone': 1, 'Tablet': 1})
+
+            self.tap(self.phone, 'delete')
+            self.assertEqual(self.liked(), ['Tablet'])
+            like_buffer.flush()
+        self.assertEqual(self.like_counts(), {'Phone': 0, 'Tablet': 1})
+        self.assertEqual(self.liked(), ['Tablet'])
+        self.assertEqual(sorted(row['name'] for row in self.client.get(
+            reverse('all-products') + '?is_liked=false').json()), ['Phone'])
+
+    @override_settings(LIKE_BUFFER_ASYNC=True)
+    def test_read_racing_a_flush_does_not_recache_stale_ids(self):
+        def stale_read(user_id):
+            # Loaded before the flush commits; cached after it invalidated.
+            like_buffer.flush()
+            return []
+
+        with mock.patch.object(like_buffer, '_start'):
+            self.tap(self.phone)
+            with mock.patch('main.likes._liked_ids_queryset', side_effect=stale_read):
+                self.assertEqual(get_liked_product_ids(self.user), frozenset())
+        self.assertEqual(get_liked_product_ids(self.user), {self.phone.pk})
+
+    def test_cache_versions_move_after_the_counts_commit(self):
+        namespaces = [product_ns(self.phone.pk), category_ns(self.phone.category_id)]
+        before = get_versions(namespaces)
+        with self.captureOnCommitCallbacks(execute=True):
+            write_likes({self.user.pk: {self.phone.pk: True}})
+            self.assertEqual(get_versions(namespaces), before)
+        self.assertNotEqual(get_versions(namespaces)[0], before[0])
+        self.assertNotEqual(get_versions(namespaces)[1], before[1])
+
+    def test_like_count_ordering_and_direct_m2m_changes(self):
+        others = [User.objects.create_user(f'fan{i}') for i in range(2)]
+        self.tablet.users_like.add(*others)
+        self.phone.users_like.add(others[0])
+        self.assertEqual(self.like_counts(), {'Phone': 1, 'Tablet': 2})
+        page = self.client.get(reverse('all-products') + '?page_size=5&ordering=-like_count').json()
+        self.assertEqual([row['like_count'] for row in page['results']], [2, 1])
+
+        others[0].delete()
+        self.assertEqual(self.like_counts(), {'Phone': 0, 'Tablet': 1})
+        self.assertEqual(self.client.post(reverse('product-like', args=[999999])).status_code, 404)
+        self.assertEqual(APIClient().post(reverse('product-like', args=[self.phone.pk])).status_code, 401)
+
+
+# SQLite cannot back up a database with an open write transaction, so the
+# primary's rows must be committed before they are copied to the replica.
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    # Resolved in setUpClass, once the replica alias below exists.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.replica_path = Path(cls.directory.name) / 'replica.sqlite3'
+        # A mirror, so the test runner neither creates nor flushes it.
+        connections.settings['replica'] = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        cls.use_replica_file(cls.replica_path)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.directory.cleanup()
+
+    @staticmethod
+    def use_replica_file(path):
+        connections['replica'].close()
+        connections.settings['replica']['NAME'] = f'{path.as_uri()}?mode=ro'
+
+    def setUp(self):
+        cache.clear()
+        reset_failures()
+        self.addCleanup(reset_failures)
+        self.addCleanup(self.use_replica_file, self.replica_path)
+        category = Category.objects.create(title='Phones')
+        make_product(category, name='Copied')
+        call_command('sync_sqlite_replicas', str(self.replica_path), stdout=StringIO())
+        make_product(category, name='Not replicated')
+        self.admin = User.objects.create_superuser('admin', password='pass')
+
+    def names(self, client, query='', **headers):
+        response = client.get(reverse('all-products') + query, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        rows = response.json() if not response.streaming else json.loads(b''.join(response.streaming_content))
+        return sorted(row['name'] for row in rows)
+
+    def test_reads_come_from_replica_until_the_client_writes(self):
+        client = APIClient()
+        self.assertEqual(self.names(client), ['Copied'])
+        self.assertEqual(self.names(client, '?stream=json'), ['Copied'])
+
+        response = client.post(reverse('add-category'), {'title': 'Tablets'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('db_pin', response.cookies)
+        self.assertEqual(self.names(client), ['Copied', 'Not replicated'])
+        self.assertEqual(self.names(APIClient()), ['Copied'])
+
+    def test_token_clients_are_pinned_by_user(self):
+        client = APIClient()
+        auth = {'Authorization': f'Token {Token.objects.create(user=self.admin).key}'}
+        response = client.post(reverse('bulk-update-prices'), {'filter': {'category': 'phones'},
+                                                                'mode': 'percent', 'value': 10},
+                                format='json', headers=auth)
+        self.assertEqual(response.status_code, 200)
+        client.cookies.clear()
+        self.assertEqual(self.names(client, **auth), ['Copied', 'Not replicated'])
+        self.assertEqual(self.names(client), ['Copied'])
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        self.use_replica_file(self.replica_path.with_name('missing.sqlite3'))
+        self.assertEqual(self.names(APIClient()), ['Copied', 'Not replicated'])
+        self.assertFalse(self.replica_path.with_name('missing.sqlite3').exists())
+
+        # Skipped without reconnecting until REPLICA_RETRY_SECONDS pass, even once it is back.
+        self.use_replica_file(self.replica_path)
+        self.assertEqual(self.names(APIClient()), ['Copied', 'Not replicated'])
+        reset_failures()
+        self.assertEqual(self.names(APIClient()), ['Copied'])
+
+    def test_liked_ids_are_read_from_the_primary(self):
+        # Liked after the copy: only the primary knows, and a buffered like never pins the client.
+        Product.users_like.through.objects.create(user=self.admin, product=Product.objects.get(name='Copied'))
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        self.assertEqual(self.names(client, '?is_liked=true'), ['Copied'])
+
+
+
+class CategoryTreeTest(TempArchiveMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='pass'))
+        self.electronics = Category.objects.create(title='Electronics')
+        self.phones = Category.objects.create(title='Phones', parent=self.electronics)
+        self.smartphones = Category.objects.create(title='Smartphones', parent=self.phones)
+        self.kitchen = Category.objects.create(title='Kitchen')
+        self.phone = make_product(self.phones, name='Phone')
+        self.smartphone = make_product(self.smartphones, name='Smartphone')
+        self.kettle = make_product(self.kitchen, name='Kettle')
+
+    def names(self, slug, **query):
+        response = self.client.get(reverse('category-products', args=[slug]), query)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return sorted(product['name'] for product in (data['results'] if 'results' in data else data))
+
+    def test_paths_follow_moves(self):
+        e, p, s = self.electronics.pk, self.phones.pk, self.smartphones.pk
+        self.smartphones.refresh_from_db()
+        self.assertEqual(self.smartphones.path, f'{e}/{p}/{s}/')
+
+        response = self.client.patch(reverse('edit-category', args=['phones']), {'parent': 'kitchen'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.smartphones.refresh_from_db()
+        self.assertEqual(self.smartphones.path, f'{self.kitchen.pk}/{p}/{s}/')
+        self.assertEqual(self.names('electronics'), [])
+        self.assertEqual(self.names('kitchen'), ['Kettle', 'Phone', 'Smartphone'])
+
+        response = self.client.patch(reverse('edit-category', args=['phones']), {'parent': 'smartphones'},
+                                     format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.json())
+
+    def test_move_with_update_fields_saves_the_path(self):
+        stale_kitchen = Category.objects.get(pk=self.kitchen.pk)
+        self.kitchen.parent = self.electronics
+        self.kitchen.save(update_fields=['parent'])
+        self.kitchen.refresh_from_db()
+        self.assertEqual(self.kitchen.path, f'{self.electronics.pk}/{self.kitchen.pk}/')
+
+        # The prefix comes from the parent's row, not a stale instance.
+        self.phones.parent = stale_kitchen
+        self.phones.save(update_fields=['parent'])
+        self.smartphones.refresh_from_db()
+        self.assertEqual(self.smartphones.path,
+                         f'{self.electronics.pk}/{self.kitchen.pk}/{self.phones.pk}/{self.smartphones.pk}/')
+        self.assertEqual(Category.objects.get(pk=self.phones.pk).path,
+                         f'{self.electronics.pk}/{self.kitchen.pk}/{self.phones.pk}/')
+
+    def test_subtree_listing_and_invalidation(self):
+        self.assertEqual(self.names('electronics'), ['Phone', 'Smartphone'])
+        self.assertEqual(self.names('phones'), ['Phone', 'Smartphone'])
+        self.assertEqual(self.names('smartphones'), ['Smartphone'])
+        self.assertEqual(self.names('missing'), [])
+        self.assertEqual(len(self.client.get(reverse('all-products'), {'category': 'electronics'}).json()), 2)
+
+        # The cached parent page depends on its subcategories.
+        make_product(self.smartphones, name='Flagship')
+        self.assertEqual(self.names('electronics'), ['Flagship', 'Phone', 'Smartphone'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.names('phones', page_size=5)
+        product_queries = [q['sql'] for q in ctx.captured_queries if 'FROM "main_product"' in q['sql']]
+        self.assertEqual(len(product_queries), 1)
+        self.assertIn('"main_category"."path" >=', product_queries[0])
+
+    def test_tree_and_breadcrumbs_come_from_the_snapshot(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+        self.assertEqual([crumb['slug'] for crumb in tree.breadcrumbs(self.smartphones.pk)],
+                         ['electronics', 'phones', 'smartphones'])
+
+        response = self.client.get(reverse('category-tree'))
+        self.assertEqual([(node['slug'], [child['slug'] for child in node['children']])
+                          for node in response.json()], [('electronics', ['phones']), ('kitchen', [])])
+        categories = {category['slug']: category for category in self.client.get(reverse('all-categories')).json()}
+        self.assertEqual(categories['smartphones']['parent'], 'phones')
+        self.assertEqual([crumb['title'] for crumb in categories['smartphones']['breadcrumbs']],
+                         ['Electronics', 'Phones', 'Smartphones'])
+
+        Category.objects.create(title='Tablets', parent=self.electronics)
+        self.assertEqual(get_category_tree().nested()[0]['children'][1]['slug'], 'tablets')
+
+    def test_deleting_a_department_takes_its_subtree(self):
+        response = self.client.post(reverse('bulk-delete-categories'), {'slugs': ['electronics']}, format='json')
+        self.assertEqual(response.json()['deleted'], 3)
+        self.assertEqual(list(Category.objects.values_list('slug', flat=True)), ['kitchen'])
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Kettle'])
+
+    def test_imported_categories_get_paths(self):
+        feed = 'sku,name,category,price\nI1,Phone X,gadgets,10\nI2,Laptop X,computers,20\nI3,TV X,screens,30\n'
+        self.client.post(reverse('import-products'), {'file': SimpleUploadedFile('feed.csv', feed.encode())},
+                         format='multipart')
+        gadgets = Category.objects.get(slug='gadgets')
+        self.assertEqual(gadgets.path, f'{gadgets.pk}/')
+
+        response = self.client.patch(reverse('edit-category', args=['screens']), {'parent': 'gadgets'},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names('gadgets'), ['Phone X', 'TV X'])
+        self.assertEqual(len(self.client.get(reverse('all-products'), {'category': 'gadgets'}).json()), 2)
+
+        response = self.client.post(reverse('bulk-delete-categories'), {'slugs': ['computers']}, format='json')
+        self.assertEqual(response.json()['deleted'], 1)
+        self.assertEqual(Category.objects.filter(slug__in=['gadgets', 'screens']).count(), 2)
+        self.assertEqual(Product.objects.filter(sku__startswith='I').count(), 2)
+
+        with self.assertRaises(ValueError):
+            Category.objects.subtree('')
+
+
+class WorkerBootTest(SimpleTestCase):
+    LAZY_MODULES = ['rest_framework_simplejwt', 'rest_framework.authtoken.views', 'django.test', 'main.user',
+                    'main.jwt_auth', 'concurrent.futures.process']
+
+    def test_boot_stays_within_budget_without_lazy_modules(self):
+        seconds, modules, imports = min((profile_boot() for _ in range(3)), key=lambda run: run[0])
+        self.assertLess(seconds, BOOT_TIME_BUDGET)
+        for name in self.LAZY_MODULES:
+            self.assertNotIn(name, modules)
+        groups = {group for group, _, _ in aggregate(imports)}
+        self.assertTrue({'main', 'django', 'stdlib', 'rest_framework'} <= groups)
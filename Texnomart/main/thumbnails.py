@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and save options per derivative extension.
+FORMATS = {
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def derivative_dir(source):
+    """``image/product/x.png`` -> ``thumbnails/image/product/x``, holding all its derivatives."""
+    stem, _ = os.path.splitext(source)
+    return f'{settings.THUMBNAIL_DIR}/{stem}'
+
+
+def derivative_name(source, width, ext):
+    """``image/product/x.png`` -> ``thumbnails/image/product/x/320w.webp``; no I/O needed."""
+    return f'{derivative_dir(source)}/{width}w.{ext}'
+
+
+def derivative_names(source):
+    return [derivative_name(source, width, ext)
+            for width in settings.THUMBNAIL_WIDTHS for ext in settings.THUMBNAIL_FORMATS]
+
+
+def render(source_path, targets, cache_dir, widths, formats):
+    """
+    Write every ``(width, ext)`` derivative of ``source_path`` to ``targets``.
+
+    Runs in a worker process, so it takes plain paths and must not touch
+    Django settings or models. Renders are cached under ``cache_dir`` by the
+    SHA-256 of the source bytes: re-uploads of the same picture are linked
+    from the cache instead of being decoded and encoded again.
+    """
+    from PIL import Image as PILImage, ImageOps
+
+    digest = hashlib.sha256()
+    with open(source_path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+    cached_dir = os.path.join(cache_dir, digest.hexdigest()[:2], digest.hexdigest())
+
+    picture = None
+    for width in widths:
+        for ext in formats:
+            cached = os.path.join(cached_dir, f'{width}w.{ext}')
+            if not os.path.exists(cached):
+                if picture is None:
+                    picture = ImageOps.exif_transpose(PILImage.open(source_path))
+                    picture.load()
+                _encode(picture, width, ext, cached)
+            _publish(cached, targets[(width, ext)])
+    return digest.hexdigest()
+
+
+def _encode(picture, width, ext, path):
+    from PIL import Image as PILImage
+
+    pil_format, options = FORMATS[ext]
+    copy = picture.copy()
+    copy.thumbnail((width, width * 4))
+    if pil_format == 'JPEG' and copy.mode not in ('RGB', 'L'):
+        background = PILImage.new('RGB', copy.size, 'white')
+        background.paste(copy, mask=copy.convert('RGBA').getchannel('A'))
+        copy = background
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    copy.save(tmp, pil_format, **options)
+    os.replace(tmp, path)
+
+
+def _publish(cached, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f'{target}.{os.getpid()}.tmp'
+    try:
+        os.link(cached, tmp)
+    except OSError:
+        shutil.copyfile(cached, tmp)
+    os.replace(tmp, target)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Imported here: most workers never render a thumbnail.
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn rather than fork: the web process has threads (e.g. the archiver).
+            _executor = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def existing_derivatives(name, storage=default_storage):
+    """Names of the derivatives of ``name`` already in storage, from one listing of their directory."""
+    directory = derivative_dir(name)
+    try:
+        _, files = storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return set()
+    return {f'{directory}/{file}' for file in files}
+
+
+def missing(name, storage=default_storage):
+    existing = existing_derivatives(name, storage)
+    return [derivative for derivative in derivative_names(name) if derivative not in existing]
+
+
+def generate(name, storage=default_storage):
+    """Render the derivatives of stored file ``name`` in this process."""
+    args = _render_args(name, storage)
+    return render(*args) if args else None
+
+
+def _render_args(name, storage):
+    try:
+        source_path = storage.path(name)
+    except NotImplementedError:
+        logger.warning('Thumbnails need local file storage; skipping %s', name)
+        return None
+    if not os.path.exists(source_path):
+        return None
+    targets = {(width, ext): storage.path(derivative_name(name, width, ext))
+               for width in settings.THUMBNAIL_WIDTHS for ext in settings.THUMBNAIL_FORMATS}
+    return (source_path, targets, storage.path(settings.THUMBNAIL_CACHE_DIR),
+            tuple(settings.THUMBNAIL_WIDTHS), tuple(settings.THUMBNAIL_FORMATS))
+
+
+def schedule(names, on_done=None, storage=default_storage):
+    """
+    Generate derivatives for ``names`` once the current transaction commits.
+
+    With THUMBNAIL_ASYNC the work goes to a process pool and ``on_done`` runs
+    when it finishes (used to invalidate cached responses); otherwise it is
+    done inline.
+    """
+    names = [name for name in dict.fromkeys(names) if name]
+    if not names:
+        return
+
+    def run():
+        pending = [name for name in names if missing(name, storage)]
+        if not pending:
+            return
+        if not settings.THUMBNAIL_ASYNC:
+            for name in pending:
+                try:
+                    generate(name, storage)
+                except Exception:
+                    logger.exception('Failed to generate thumbnails for %s', name)
+            if on_done:
+                on_done()
+            return
+        for name in pending:
+            args = _render_args(name, storage)
+            if args:
+                future = get_executor().submit(render, *args)
+                future.add_done_callback(lambda future, name=name: _finished(future, name, on_done))
+
+    transaction.on_commit(run)
+
+
+def _finished(future, name, on_done):
+    if future.exception() is not None:
+        logger.error('Failed to generate thumbnails for %s', name, exc_info=future.exception())
+    elif on_done:
+        on_done()
+
+
+def thumbnail_urls(field_file):
+    """``[{'url', 'width', 'format'}]`` for the derivatives of ``field_file`` that exist so far."""
+    if not field_file:
+        return []
+    storage = field_file.storage
+    existing = existing_derivatives(field_file.name, storage)
+    return [{'url': storage.url(derivative_name(field_file.name, width, ext)), 'width': width, 'format': ext}
+            for ext in settings.THUMBNAIL_FORMATS for width in settings.THUMBNAIL_WIDTHS
+            if derivative_name(field_file.name, width, ext) in existing]
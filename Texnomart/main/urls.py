@@ -1,35 +1,47 @@
 from django.urls import path
 
-from . import user
-
-from .views import *
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from .lazy import lazy_api_view
+from .views import ProductListView, ProductFacetView, ProductSearchView, CategoryListView, CategoryTreeView, \
+    CategoryCreateView, CategoryBulkDeleteView, CategoryProductListView, CategoryDeleteView, CategoryUpdateView, \
+    ProductDetailView, ProductCommentListView, ProductLikeView, ProductUpdateView, ProductDeleteView, \
+    ProductImportView, ProductExportView, ProductBulkPriceView, ProductBulkCategoryView, ProductBulkDeleteView, \
+    AttributeKeyListView, AttributeValueListView
 
 urlpatterns = [
     path('', ProductListView.as_view(), name='all-products'),
+    path('facets/', ProductFacetView.as_view(), name='product-facets'),
+    path('search/', ProductSearchView.as_view(), name='search-products'),
 
     # Categories
     path('categories/', CategoryListView.as_view(), name='all-categories'),
-    path('category/<slug:category_slug>/', CategoryProductListView.as_view(), name='category-products'),
+    path('categories/tree/', CategoryTreeView.as_view(), name='category-tree'),
     path('category/add-category/', CategoryCreateView.as_view(), name='add-category'),
+    path('category/bulk/delete/', CategoryBulkDeleteView.as_view(), name='bulk-delete-categories'),
+    path('category/<slug:category_slug>/', CategoryProductListView.as_view(), name='category-products'),
     path('category/<slug:category_slug>/delete/', CategoryDeleteView.as_view(), name='delete-category'),
     path('category/<slug:slug>/edit/', CategoryUpdateView.as_view(), name='edit-category'),
 
 
     path('product/detail/<int:product_id>/', ProductDetailView.as_view(), name='product-detail'),
+    path('product/<int:product_id>/comments/', ProductCommentListView.as_view(), name='product-comments'),
+    path('product/<int:product_id>/like/', ProductLikeView.as_view(), name='product-like'),
     path('product/<int:id>/edit/', ProductUpdateView.as_view(), name='edit-product'),
     path('product/<int:product_id>/delete/', ProductDeleteView.as_view(), name='delete-product'),
+    path('product/import/', ProductImportView.as_view(), name='import-products'),
+    path('product/export/', ProductExportView.as_view(), name='export-products'),
+    path('product/bulk/price/', ProductBulkPriceView.as_view(), name='bulk-update-prices'),
+    path('product/bulk/category/', ProductBulkCategoryView.as_view(), name='bulk-reassign-category'),
+    path('product/bulk/delete/', ProductBulkDeleteView.as_view(), name='bulk-delete-products'),
 
     path('attribute-key/', AttributeKeyListView.as_view(), name='all-attribute-keys'),
     path('attribute-value/', AttributeValueListView.as_view(), name='all-attribute-values'),
 
-    path('token-auth/', CustomAuthToken.as_view(), name='token-auth'),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    # Auth views are rarely hit, so they (and simplejwt) load on first use.
+    path('token-auth/', lazy_api_view('main.user.CustomAuthToken'), name='token-auth'),
+    path('api/token/', lazy_api_view('rest_framework_simplejwt.views.TokenObtainPairView'), name='token_obtain'),
+    path('api/token/refresh/', lazy_api_view('rest_framework_simplejwt.views.TokenRefreshView'),
+         name='token_refresh'),
 
-    path('login/', user.UserLoginApiView.as_view(), name='login'),
-    path('logout/', user.UserLogoutApiView.as_view(), name='logout'),
+    path('login/', lazy_api_view('main.user.UserLoginApiView'), name='login'),
+    path('logout/', lazy_api_view('main.user.UserLogoutApiView'), name='logout'),
 ]
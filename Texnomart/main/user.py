@@ -6,6 +6,9 @@ from rest_framework.permissions import AllowAny
 from rest_framework.authentication import SessionAuthentication
 from django.contrib.auth import logout
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.decorators import api_view
 
 
 
@@ -36,3 +39,29 @@ class UserLogoutApiView(APIView):
     def post(self, request):
         logout(request)
         return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_api_key(request):
+    user = request.user
+
+    if hasattr(user, 'api_key'):
+        api_key = user.api_key.key
+        return Response({"api_key": api_key})
+    else:
+        return Response({"error": "API key not found for the user"}, status=404)
+
+
+class CustomAuthToken(ObtainAuthToken):
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data,
+                                           context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        return Response({
+            'token': token.key,
+            'user_id': user.pk,
+            'email': user.email,
+            'created': created
+        })
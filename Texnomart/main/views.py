@@ -1,21 +1,31 @@
+import io
+
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import generics, status
+from rest_framework.generics import ListAPIView, CreateAPIView, UpdateAPIView, RetrieveUpdateAPIView
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework import status, serializers
-from .models import Category, Product, AttributeKey, AttributeValue
+
+from .models import Category, Product, Comment, AttributeKey, AttributeValue
 from .serializers import CategorySerializer, ProductSerializer, ProductListSerializer, AttributeKeySerializer, \
-    AttributeValueSerializer, ProductDetailSerializer
-from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.authtoken.models import Token
-from rest_framework import generics
+    AttributeValueSerializer, ProductDetailSerializer, CommentSerializer, ProductSelectionSerializer, BulkPriceSerializer, \
+    BulkCategorySerializer, BulkCategoryDeleteSerializer
 from .filters import ProductFilter, CategoryFilter
-from rest_framework.generics import ListAPIView, CreateAPIView, DestroyAPIView, UpdateAPIView, RetrieveUpdateAPIView
-from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from django.utils.crypto import get_random_string
-from .models import APIKey, User
+from .pagination import KeysetPagination, IdKeysetPagination, CommentKeysetPagination
+from .cache import CachedListMixin, cached_response, category_ns, product_ns, CATEGORIES
+from .categories import get_category_tree
+from .likes import get_liked_product_ids, like_buffer
+from .bulk import FORMATS, ProductImporter, export_lines, read_rows, update_prices, reassign_category, \
+    delete_products, delete_categories
+from .facets import facet_counts
+from .search import search_products
+from .metrics import MetricsMixin
+from .replicas import ReplicaReadMixin
+from .streaming import StreamingListMixin
 
 
 
@@ -26,12 +36,20 @@ from .models import APIKey, User
 
 
 
-class CategoryProductListView(ListAPIView):
+class CategoryProductListView(MetricsMixin, ReplicaReadMixin, CachedListMixin, ListAPIView):
     serializer_class = ProductListSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        slug = self.kwargs['category_slug']
-        return Product.objects.filter(category__slug=slug)
+        # Parent categories list their whole subtree.
+        queryset = Product.objects.with_primary_image()
+        return get_category_tree().filter_products(queryset, self.kwargs['category_slug'])
+
+    def get_cache_namespaces(self):
+        tree = get_category_tree()
+        category = tree.by_slug.get(self.kwargs['category_slug'])
+        subtree = tree.subtree_ids(category['id']) if category else []
+        return [CATEGORIES, *map(category_ns, subtree)]
 
 
 
@@ -51,14 +69,19 @@ class CategoryCreateView(CreateAPIView):
 
 
 
-class ProductDetailView(APIView):
+class ProductDetailView(MetricsMixin, ReplicaReadMixin, APIView):
     def get(self, request, product_id):
-        try:
-            product = Product.objects.get(id=product_id)
+        def build():
+            try:
+                product = Product.objects.with_related().get(id=product_id)
+            except Product.DoesNotExist:
+                return Response(status=status.HTTP_404_NOT_FOUND)
             serializer = ProductSerializer(product, context={'request': request})
-            return Response(serializer.data)
-        except Product.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+            return serializer.data, product.updated_at
+
+        liked = product_id in get_liked_product_ids(request.user)
+        return cached_response(request, [product_ns(product_id)], build, variant=int(liked),
+                               personalize=lambda data: {**data, 'users_like': liked})
 
 
     def put(self, request, product_id):
@@ -85,19 +108,22 @@ class ProductDetailView(APIView):
 
 
 
-class CategoryDetailView(APIView):
+class CategoryDetailView(MetricsMixin, ReplicaReadMixin, APIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
 
 
     def get(self, request, slug):
-        try:
-            category = Category.objects.get(slug=slug)
+        def build():
+            try:
+                category = Category.objects.get(slug=slug)
+            except Category.DoesNotExist:
+                return Response(status=status.HTTP_404_NOT_FOUND)
             serializer = CategorySerializer(category)
-            return Response(serializer.data)
-        except Category.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+            return serializer.data, None
+
+        return cached_response(request, [CATEGORIES], build)
 
     def put(self, request, slug):
         try:
@@ -161,73 +187,180 @@ class ProductDeleteView(APIView):
 
 
 
-class ProductListView(generics.ListAPIView):
-    queryset = Product.objects.all()
-    serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = ProductFilter
+class ProductImportView(APIView):
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
 
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload a CSV or JSONL file as 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or ('jsonl' if upload.name.endswith('.jsonl') else 'csv')
+        if file_format not in FORMATS:
+            return Response({"error": f"file_format must be one of {FORMATS}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = int(request.data.get('batch_size', 1000))
+        except ValueError:
+            return Response({"error": "batch_size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
 
-class CategoryListView(generics.ListAPIView):
-    queryset = Category.objects.all()
-    serializer_class = CategorySerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = CategoryFilter
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        report = ProductImporter(batch_size=max(batch_size, 1)).run(read_rows(stream, file_format))
+        return Response(report.as_dict())
 
 
+class ProductExportView(APIView):
+    permission_classes = [IsAdminUser]
 
-class AttributeKeyListView(ListAPIView):
-    queryset = AttributeKey.objects.all()
-    serializer_class = AttributeKeySerializer
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in FORMATS:
+            return Response({"error": f"file_format must be one of {FORMATS}"}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_lines(file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
 
 
+class ProductCommentListView(MetricsMixin, ReplicaReadMixin, CachedListMixin, ListAPIView):
+    """A product's comments, keyset-paginated, newest first or by ``?ordering=[-]rating|created_at``."""
+    serializer_class = CommentSerializer
+    pagination_class = CommentKeysetPagination
 
-class AttributeValueListView(ListAPIView):
-    queryset = AttributeValue.objects.all()
-    serializer_class = AttributeValueSerializer
+    def get_queryset(self):
+        product = get_object_or_404(Product.objects.only('pk'), pk=self.kwargs['product_id'])
+        return Comment.objects.filter(product=product)
 
+    def get_cache_namespaces(self):
+        return [product_ns(self.kwargs['product_id'])]
 
 
+class ProductLikeView(APIView):
+    """
+    POST likes a product, DELETE unlikes it. Taps go to the like buffer and
+    reach the database (and ``like_count``) with its next flush, hence 202.
+    """
+    permission_classes = [IsAuthenticated]
 
-@receiver(post_save, sender=User)
-def create_api_key(sender, instance, created, **kwargs):
-    if created:
-        api_key = get_random_string(32)
-        APIKey.objects.create(user=instance, key=api_key)
+    def post(self, request, product_id):
+        return self.record(request, product_id, True)
 
-@api_view(['GET'])
-def get_api_key(request):
-    user = request.user
+    def delete(self, request, product_id):
+        return self.record(request, product_id, False)
 
-    if hasattr(user, 'api_key'):
-        api_key = user.api_key.key
-        return Response({"api_key": api_key})
-    else:
-        return Response({"error": "API key not found for the user"}, status=404)
+    def record(self, request, product_id, liked):
+        if not Product.objects.filter(pk=product_id).exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        like_buffer.record(request.user.pk, product_id, liked)
+        return Response({'product_id': product_id, 'liked': liked}, status=status.HTTP_202_ACCEPTED)
 
 
-class CustomAuthToken(ObtainAuthToken):
-    def post(self, request, *args, **kwargs):
-        serializer = self.serializer_class(data=request.data,
-                                           context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data['user']
-        token, created = Token.objects.get_or_create(user=user)
-        return Response({
-            'token': token.key,
-            'user_id': user.pk,
-            'email': user.email,
-            'created': created
-        })
+class ProductBulkPriceView(APIView):
+    """Set (``absolute``) or adjust (``percent``) the price of every selected product in one UPDATE."""
+    permission_classes = [IsAdminUser]
 
+    def post(self, request):
+        serializer = BulkPriceSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        return Response({"updated": update_prices(data['queryset'], data['mode'], data['value'])})
+
+
+class ProductBulkCategoryView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = BulkCategorySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        return Response({"updated": reassign_category(data['queryset'], data['category'])})
+
+
+class ProductBulkDeleteView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = ProductSelectionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        counts = delete_products(serializer.validated_data['queryset'])
+        return Response({"deleted": counts[Product._meta.label], "rows": counts})
 
 
+class CategoryBulkDeleteView(APIView):
+    permission_classes = [IsAdminUser]
 
+    def post(self, request):
+        serializer = BulkCategoryDeleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        counts = delete_categories(Category.objects.filter(slug__in=serializer.validated_data['slugs']))
+        return Response({"deleted": counts[Category._meta.label], "rows": counts})
 
 
+class ProductFacetView(MetricsMixin, ReplicaReadMixin, APIView):
+    def get(self, request):
+        filterset = ProductFilter(request.query_params, queryset=Product.objects.all(), request=request)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(facet_counts(filterset.qs))
 
 
+class ProductSearchView(MetricsMixin, ReplicaReadMixin, ListAPIView):
+    serializer_class = ProductListSerializer
 
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '')
+        prefix = request.query_params.get('prefix') in ('1', 'true')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({"error": "limit and offset must be integers"}, status=status.HTTP_400_BAD_REQUEST)
 
+        ids = search_products(query, prefix=prefix, limit=limit, offset=offset)
+        products = Product.objects.with_primary_image().in_bulk(ids)
+        ranked = [products[pk] for pk in ids if pk in products]
+        return Response(self.get_serializer(ranked, many=True).data)
 
 
+class ProductListView(MetricsMixin, ReplicaReadMixin, StreamingListMixin, generics.ListAPIView):
+    serializer_class = ProductSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProductFilter
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        # Built per request: the comment preview size is read from settings.
+        return Product.objects.with_related()
+
+
+class CategoryListView(MetricsMixin, ReplicaReadMixin, CachedListMixin, generics.ListAPIView):
+    queryset = Category.objects.select_related('parent')
+    serializer_class = CategorySerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CategoryFilter
+
+    def get_cache_namespaces(self):
+        return [CATEGORIES]
+
+
+class CategoryTreeView(MetricsMixin, APIView):
+    """The whole category hierarchy, nested, from the cached tree snapshot."""
+
+    def get(self, request):
+        return cached_response(request, [CATEGORIES], lambda: (get_category_tree().nested(), None))
+
+
+class AttributeKeyListView(MetricsMixin, ReplicaReadMixin, StreamingListMixin, ListAPIView):
+    queryset = AttributeKey.objects.all()
+    serializer_class = AttributeKeySerializer
+    pagination_class = IdKeysetPagination
+
+
+
+class AttributeValueListView(MetricsMixin, ReplicaReadMixin, StreamingListMixin, ListAPIView):
+    queryset = AttributeValue.objects.all()
+    serializer_class = AttributeValueSerializer
+    pagination_class = IdKeysetPagination